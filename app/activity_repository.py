@@ -1,11 +1,44 @@
 # app/activity_repository.py
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+import json
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timezone
+from sqlalchemy import select, tuple_, func
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.database import UserActivity, User, Document, Question
+from app.database import UserActivity, User, Document, Question, UserDailyRollup
+from app.config import PAGE_SIZE_DEFAULT
+from app.pagination import timestamp_key, decode_cursor, split_page
+from app.user_counters import (
+    ACTIVITY_COUNTERS, increment_counters, aincrement_counters, get_user_counters, aget_user_counters
+)
+from app.activity_writer import activity_writer
+from app.history_archive import read_archive
 from utils.logger import log_event
 
+def activity_row(
+    user_id: int,
+    activity_type: str,
+    description: str,
+    document_id: Optional[str] = None,
+    question_id: Optional[int] = None,
+    extra_data: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Build the column values of an activity row, timestamped now (UTC)"""
+    return {
+        "user_id": user_id,
+        "activity_type": activity_type,
+        "description": description,
+        "document_id": document_id,
+        "question_id": question_id,
+        "extra_data": extra_data,
+        # Set here rather than by the column default, since queued rows are
+        # written later; naive UTC to the second, like CURRENT_TIMESTAMP
+        "created_at": datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    }
+
 def log_activity(
     db: Session,
     user_id: int,
@@ -13,11 +46,15 @@ def log_activity(
     description: str,
     document_id: Optional[str] = None,
     question_id: Optional[int] = None,
-    extra_data: Optional[Dict[str, Any]] = None
-) -> UserActivity:
+    extra_data: Optional[Dict[str, Any]] = None,
+    sync: bool = False
+) -> Optional[UserActivity]:
     """
     Log a user activity
     
+    The activity is queued for the background activity writer when it is
+    running; otherwise, or with sync=True, it is written before returning.
+    
     Args:
         db: Database session
         user_id: User ID
@@ -26,24 +63,24 @@ def log_activity(
         document_id: Optional document ID
         question_id: Optional question ID
         extra_data: Optional additional data
+        sync: Write the activity now, e.g. when the caller needs its ID
         
     Returns:
-        The created activity record
+        The created activity record, or None if it was queued
     """
     try:
+        row = activity_row(user_id, activity_type, description, document_id, question_id, extra_data)
+        if not sync and activity_writer.submit(row):
+            log_event(f"Activity queued: {activity_type} for user {user_id}", "info")
+            return None
+        
         # Create activity record
-        activity = UserActivity(
-            user_id=user_id,
-            activity_type=activity_type,
-            description=description,
-            document_id=document_id,
-            question_id=question_id,
-            extra_data=extra_data,
-            created_at=datetime.now()
-        )
+        activity = UserActivity(**row)
         
         # Add to database
         db.add(activity)
+        if activity_type in ACTIVITY_COUNTERS:
+            increment_counters(db, user_id, **{ACTIVITY_COUNTERS[activity_type]: 1})
         db.commit()
         db.refresh(activity)
         
@@ -126,32 +163,164 @@ def get_user_activity_count(db: Session, user_id: int) -> Dict[str, int]:
         Dictionary with activity counts
     """
     try:
-        # Get document count
-        document_count = db.query(Document).filter(Document.owner_id == user_id).count()
+        # Read the materialized counters rather than counting rows
+        return get_user_counters(db, user_id)
+        
+    except Exception as e:
+        log_event(f"Error getting user activity count: {e}", "error")
+        raise e
+
+# Async versions, used by request handlers
+async def alog_activity(
+    db: AsyncSession,
+    user_id: int,
+    activity_type: str,
+    description: str,
+    document_id: Optional[str] = None,
+    question_id: Optional[int] = None,
+    extra_data: Optional[Dict[str, Any]] = None,
+    sync: bool = False
+) -> Optional[UserActivity]:
+    """Async version of log_activity"""
+    try:
+        row = activity_row(user_id, activity_type, description, document_id, question_id, extra_data)
+        if not sync and activity_writer.submit(row):
+            log_event(f"Activity queued: {activity_type} for user {user_id}", "info")
+            return None
         
-        # Get question count
-        question_count = db.query(Question).filter(Question.user_id == user_id).count()
+        activity = UserActivity(**row)
         
-        # Get activity counts by type
-        upload_count = db.query(UserActivity)\
-            .filter(UserActivity.user_id == user_id, UserActivity.activity_type == "document_upload")\
-            .count()
-            
-        question_asked_count = db.query(UserActivity)\
-            .filter(UserActivity.user_id == user_id, UserActivity.activity_type == "question")\
-            .count()
+        db.add(activity)
+        if activity_type in ACTIVITY_COUNTERS:
+            await aincrement_counters(db, user_id, **{ACTIVITY_COUNTERS[activity_type]: 1})
+        await db.commit()
+        
+        log_event(f"Activity logged: {activity_type} for user {user_id}", "info")
+        return activity
+        
+    except Exception as e:
+        log_event(f"Error logging activity: {e}", "error")
+        await db.rollback()
+        raise e
+
+async def aget_user_activities(
+    db: AsyncSession,
+    user_id: int,
+    activity_type: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
+    cursor: Optional[str] = None
+) -> Tuple[List[Row], Optional[str]]:
+    """
+    Get a page of a user's activities, newest first
+    
+    Args:
+        db: Database session
+        user_id: User ID
+        activity_type: Optional activity type filter
+        limit: Page size
+        cursor: Cursor returned with the previous page
+        
+    Returns:
+        Tuple of (rows with the columns format_activity_for_display uses,
+        cursor of the next page or None)
+    """
+    try:
+        created_key = timestamp_key(UserActivity.created_at)
+        query = select(
+            UserActivity.id, UserActivity.activity_type, UserActivity.description, UserActivity.created_at,
+            UserActivity.document_id, UserActivity.question_id, UserActivity.extra_data,
+            created_key.label("created_key")
+        ).where(UserActivity.user_id == user_id)
+        
+        if activity_type:
+            query = query.where(UserActivity.activity_type == activity_type)
+        
+        if cursor:
+            created, activity_id = decode_cursor(cursor, 2)
+            query = query.where(tuple_(created_key, UserActivity.id) < tuple_(created, activity_id))
             
-        return {
-            "documents": document_count,
-            "questions": question_count,
-            "uploads": upload_count,
-            "questions_asked": question_asked_count
-        }
+        result = await db.execute(query.order_by(created_key.desc(), UserActivity.id.desc()).limit(limit + 1))
+        return split_page(result.all(), limit, lambda row: (row.created_key, row.id))
+        
+    except Exception as e:
+        log_event(f"Error getting user activities: {e}", "error")
+        raise e
+
+async def aget_user_activity_count(db: AsyncSession, user_id: int) -> Dict[str, int]:
+    """Async version of get_user_activity_count"""
+    try:
+        return await aget_user_counters(db, user_id)
         
     except Exception as e:
         log_event(f"Error getting user activity count: {e}", "error")
         raise e
 
+async def aget_user_daily_activity(db: AsyncSession, user_id: int, since: str) -> List[Dict[str, Any]]:
+    """
+    Get a user's activity counts per day and type, newest day first
+    
+    Days past the retention window come from the daily rollups of archived
+    activities, recent days from the live table.
+    
+    Args:
+        db: Database session
+        user_id: User ID
+        since: First day to include, as YYYY-MM-DD
+        
+    Returns:
+        List of {"day", "counts": {activity type: count}}
+    """
+    try:
+        days: Dict[str, Dict[str, int]] = {}
+        
+        archived = await db.execute(
+            select(UserDailyRollup.day, UserDailyRollup.activity_type, UserDailyRollup.count)
+            .where(
+                UserDailyRollup.user_id == user_id,
+                UserDailyRollup.source == "user_activities",
+                UserDailyRollup.day >= since
+            )
+        )
+        live_day = func.date(UserActivity.created_at)
+        live = await db.execute(
+            select(live_day, UserActivity.activity_type, func.count())
+            .where(UserActivity.user_id == user_id, timestamp_key(UserActivity.created_at) >= since)
+            .group_by(live_day, UserActivity.activity_type)
+        )
+        
+        for day, activity_type, count in [*archived.all(), *live.all()]:
+            counts = days.setdefault(day, {})
+            counts[activity_type] = counts.get(activity_type, 0) + count
+            
+        return [{"day": day, "counts": days[day]} for day in sorted(days, reverse=True)]
+        
+    except Exception as e:
+        log_event(f"Error getting daily user activity: {e}", "error")
+        raise e
+
+def get_archived_user_activities(user_id: int, month: str) -> List[SimpleNamespace]:
+    """
+    Read a user's archived activities for a month, newest first
+    
+    Reads a compressed archive file, so call it off the event loop.
+    
+    Args:
+        user_id: User ID
+        month: Month as YYYY-MM
+        
+    Returns:
+        Activities with the attributes format_activity_for_display uses
+    """
+    activities = []
+    for row in reversed(read_archive("user_activities", month, user_id)):
+        extra_data = row["extra_data"]
+        activities.append(SimpleNamespace(**{
+            **row,
+            "created_at": datetime.fromisoformat(row["created_at"]),
+            "extra_data": json.loads(extra_data) if isinstance(extra_data, str) else extra_data
+        }))
+    return activities
+
 def format_activity_for_display(activity: UserActivity) -> Dict[str, Any]:
     """
     Format an activity for display in the UI
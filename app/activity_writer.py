@@ -0,0 +1,189 @@
+# app/activity_writer.py
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, UserActivity
+from app.config import ACTIVITY_BATCH_SIZE, ACTIVITY_FLUSH_INTERVAL_MS, ACTIVITY_QUEUE_SIZE
+from app.user_counters import ACTIVITY_COUNTERS, increment_counters
+from app.metrics import increment
+from utils.logger import log_event
+
+# Queued to stop the writer thread
+_STOP = object()
+
+class ActivityWriter:
+    """
+    Write-behind buffer for activity rows
+
+    Rows are queued by log_activity and inserted by a background thread in
+    batches, each in one transaction together with the usage counters they
+    affect, so requests do not wait for a commit per activity.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = ACTIVITY_BATCH_SIZE,
+        flush_interval_ms: int = ACTIVITY_FLUSH_INTERVAL_MS,
+        queue_size: int = ACTIVITY_QUEUE_SIZE
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopping.is_set()
+
+    def start(self) -> None:
+        """Start the writer thread"""
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="activity-writer", daemon=True)
+        self._thread.start()
+        log_event(
+            f"Activity writer started (batch size {self.batch_size}, flush interval {self.flush_interval * 1000:.0f} ms)",
+            "info"
+        )
+
+    def submit(self, row: Dict[str, Any]) -> bool:
+        """
+        Queue an activity row
+
+        Returns:
+            Whether the row was queued; if not, the caller must write it itself
+        """
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            increment("activity.queue_full")
+            return False
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until every row queued so far has been written
+
+        Returns:
+            Whether the writer caught up within the timeout
+        """
+        if not self.running:
+            return True
+        written = threading.Event()
+        try:
+            self._queue.put(written, timeout=timeout)
+        except queue.Full:
+            return False
+        return written.wait(timeout)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Write everything still queued and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            log_event("Activity queue full at shutdown; waiting for the writer to drain it", "warning")
+        self._thread.join(timeout)
+        self._thread = None
+        log_event("Activity writer stopped", "info")
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        deadline = 0.0
+
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()) if batch else None)
+            except queue.Empty:
+                # The oldest queued row has waited the flush interval
+                self._write(batch)
+                batch = []
+                continue
+
+            if item is _STOP:
+                # Rows queued around shutdown are written too
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        item.set()
+                    elif item is not _STOP:
+                        batch.append(item)
+                self._write(batch)
+                return
+
+            if isinstance(item, threading.Event):
+                self._write(batch)
+                batch = []
+                item.set()
+                continue
+
+            batch.append(item)
+            if len(batch) == 1:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+
+        db = SessionLocal()
+        try:
+            try:
+                insert_activities(db, rows)
+                db.commit()
+                increment("activity.batches_written")
+                increment("activity.rows_written", len(rows))
+                return
+            except Exception as e:
+                db.rollback()
+                log_event(f"Error writing batch of {len(rows)} activities, retrying one by one: {e}", "warning")
+
+            # Isolate rows that cannot be written (e.g. their document was deleted meanwhile)
+            for row in rows:
+                try:
+                    insert_activities(db, [row])
+                    db.commit()
+                    increment("activity.rows_written")
+                except Exception as e:
+                    db.rollback()
+                    increment("activity.rows_dropped")
+                    log_event(f"Dropping {row['activity_type']} activity of user {row['user_id']}: {e}", "error")
+        finally:
+            db.close()
+
+def insert_activities(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert activity rows and update the usage counters they affect (does not commit)
+
+    Args:
+        db: Database session
+        rows: Activity column values
+    """
+    db.execute(insert(UserActivity), rows)
+
+    counts = Counter(
+        (row["user_id"], ACTIVITY_COUNTERS[row["activity_type"]])
+        for row in rows if row["activity_type"] in ACTIVITY_COUNTERS
+    )
+    for (user_id, counter), count in counts.items():
+        increment_counters(db, user_id, **{counter: count})
+
+# Shared writer, started and stopped with the app; while it is not running
+# (e.g. in tools and scripts) activities are written synchronously
+activity_writer = ActivityWriter()
@@ -0,0 +1,160 @@
+# app/answer_cache.py
+import hashlib
+import re
+import numpy as np
+from typing import List, Optional
+from sqlalchemy.orm import Session
+
+from app.database import CachedAnswer
+from app.config import LLM_MODEL, QA_PROMPT_VERSION, ANSWER_CACHE_ENABLED, ANSWER_CACHE_SIMILARITY_THRESHOLD
+from app.metrics import increment
+from utils.logger import log_event
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for exact cache matching"""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?.! ").casefold()
+
+def answer_cache_key(document_id: str, question: str) -> str:
+    """Build the exact-match cache key for a question on a document"""
+    key = f"{document_id}\0{normalize_question(question)}\0{LLM_MODEL}\0{QA_PROMPT_VERSION}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def find_exact_answer(db: Session, document_id: str, question: str) -> Optional[str]:
+    """
+    Look up a cached answer to the same question on a document
+
+    Args:
+        db: Database session
+        document_id: Document ID
+        question: Question text
+
+    Returns:
+        The cached answer, or None on a miss
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None
+
+    try:
+        entry = db.query(CachedAnswer)\
+            .filter(CachedAnswer.cache_key == answer_cache_key(document_id, question))\
+            .first()
+
+        if entry is None:
+            return None
+
+        # Hits are counted in metrics only, so a hit stays a pure read
+        increment("qa.answer_cache_exact_hits")
+        return entry.answer_text
+
+    except Exception as e:
+        log_event(f"Error reading answer cache: {e}", "error")
+        db.rollback()
+        return None
+
+def find_similar_answer(db: Session, document_id: str, query_embedding: List[float]) -> Optional[str]:
+    """
+    Look up a cached answer to a semantically similar question on a document
+
+    Args:
+        db: Database session
+        document_id: Document ID
+        query_embedding: Embedding of the new question
+
+    Returns:
+        The cached answer of the most similar question above the threshold, or None
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None
+
+    try:
+        entries = db.query(CachedAnswer.id, CachedAnswer.question_embedding)\
+            .filter(
+                CachedAnswer.document_id == document_id,
+                CachedAnswer.model == LLM_MODEL,
+                CachedAnswer.prompt_version == QA_PROMPT_VERSION,
+                CachedAnswer.question_embedding.isnot(None)
+            )\
+            .all()
+
+        if not entries:
+            increment("qa.answer_cache_misses")
+            return None
+
+        # Cosine similarity against every cached question in one matrix product
+        matrix = np.stack([np.frombuffer(embedding, dtype=np.float32) for _, embedding in entries])
+        query = np.asarray(query_embedding, dtype=np.float32)
+        similarities = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+
+        best = int(np.argmax(similarities))
+        if similarities[best] < ANSWER_CACHE_SIMILARITY_THRESHOLD:
+            increment("qa.answer_cache_misses")
+            return None
+
+        answer_text = db.query(CachedAnswer.answer_text).filter(CachedAnswer.id == entries[best][0]).scalar()
+
+        increment("qa.answer_cache_semantic_hits")
+        log_event(f"Semantic answer cache hit (similarity {similarities[best]:.3f})", "info")
+        return answer_text
+
+    except Exception as e:
+        log_event(f"Error reading answer cache: {e}", "error")
+        db.rollback()
+        return None
+
+def store_cached_answer(
+    db: Session,
+    document_id: str,
+    question: str,
+    answer: str,
+    query_embedding: Optional[List[float]] = None
+) -> None:
+    """
+    Store a generated answer in the answer cache
+
+    Args:
+        db: Database session
+        document_id: Document ID
+        question: Question text
+        answer: Generated answer
+        query_embedding: Optional embedding of the question for the semantic tier
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return
+
+    try:
+        cache_key = answer_cache_key(document_id, question)
+        if db.query(CachedAnswer.id).filter(CachedAnswer.cache_key == cache_key).first():
+            return
+
+        db.add(CachedAnswer(
+            cache_key=cache_key,
+            document_id=document_id,
+            normalized_question=normalize_question(question),
+            model=LLM_MODEL,
+            prompt_version=QA_PROMPT_VERSION,
+            answer_text=answer,
+            question_embedding=(
+                np.asarray(query_embedding, dtype=np.float32).tobytes()
+                if query_embedding is not None else None
+            )
+        ))
+        db.commit()
+
+    except Exception as e:
+        log_event(f"Error writing answer cache: {e}", "error")
+        db.rollback()
+
+def invalidate_document_answers(db: Session, document_id: str) -> int:
+    """
+    Remove all cached answers for a document (does not commit)
+
+    Args:
+        db: Database session
+        document_id: Document ID
+
+    Returns:
+        Number of entries removed
+    """
+    return db.query(CachedAnswer)\
+        .filter(CachedAnswer.document_id == document_id)\
+        .delete(synchronize_session=False)
@@ -0,0 +1,146 @@
+# app/artifact_reaper.py
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import Optional, Set
+from sqlalchemy import select
+
+from app.database import SessionLocal, Document
+from app.config import UPLOAD_FOLDER, VECTOR_STORE_FOLDER, REAPER_SWEEP_INTERVAL_SECONDS, REAPER_MIN_AGE_SECONDS
+from app.metrics import increment
+from utils.logger import log_event
+
+# Queued to stop the reaper thread
+_STOP = object()
+
+def remove_document_artifacts(document_id: str, file_path: Optional[str] = None) -> None:
+    """
+    Remove the uploaded file and vector store of a document
+
+    Args:
+        document_id: Document ID
+        file_path: Path of the uploaded file, if known
+    """
+    if file_path and os.path.exists(file_path):
+        os.remove(file_path)
+
+    vector_store_path = os.path.join(VECTOR_STORE_FOLDER, document_id)
+    if os.path.isdir(vector_store_path):
+        shutil.rmtree(vector_store_path)
+
+    increment("reaper.documents_removed")
+    log_event(f"Removed files of deleted document {document_id}", "info")
+
+def _is_old(path: str, min_age_seconds: int) -> bool:
+    return time.time() - os.path.getmtime(path) >= min_age_seconds
+
+def sweep_orphaned_artifacts(min_age_seconds: int = REAPER_MIN_AGE_SECONDS) -> int:
+    """
+    Remove uploaded files and vector stores that no document refers to
+
+    Catches anything a scheduled removal missed, e.g. when the process
+    stopped before the reaper got to it.
+
+    Returns:
+        Number of files and vector stores removed
+    """
+    db = SessionLocal()
+    try:
+        known_ids: Set[str] = set(db.scalars(select(Document.id)))
+        known_files = {os.path.abspath(path) for path in db.scalars(select(Document.file_path)) if path}
+    finally:
+        db.close()
+
+    removed = 0
+
+    if os.path.isdir(VECTOR_STORE_FOLDER):
+        for name in os.listdir(VECTOR_STORE_FOLDER):
+            path = os.path.join(VECTOR_STORE_FOLDER, name)
+            if name not in known_ids and os.path.isdir(path) and _is_old(path, min_age_seconds):
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+
+    if os.path.isdir(UPLOAD_FOLDER):
+        for name in os.listdir(UPLOAD_FOLDER):
+            path = os.path.join(UPLOAD_FOLDER, name)
+            if os.path.abspath(path) not in known_files and os.path.isfile(path) and _is_old(path, min_age_seconds):
+                os.remove(path)
+                removed += 1
+
+    if removed:
+        increment("reaper.orphans_removed", removed)
+        log_event(f"Reaper removed {removed} orphaned files and vector stores", "info")
+    return removed
+
+class ArtifactReaper:
+    """
+    Background remover of document files
+
+    Deleting a document only removes its database rows; its uploaded file
+    and vector store are queued here and removed by a background thread,
+    which also sweeps for orphaned artifacts periodically.
+    """
+
+    def __init__(self, sweep_interval_seconds: int = REAPER_SWEEP_INTERVAL_SECONDS):
+        self.sweep_interval = sweep_interval_seconds
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the reaper thread"""
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="artifact-reaper", daemon=True)
+        self._thread.start()
+        log_event(f"Artifact reaper started (sweep every {self.sweep_interval}s)", "info")
+
+    def schedule(self, document_id: str, file_path: Optional[str] = None) -> None:
+        """Queue the files of a deleted document for removal; removed now if the reaper is not running"""
+        if self.running:
+            self._queue.put((document_id, file_path))
+        else:
+            self._remove(document_id, file_path)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Remove the files still queued and stop the reaper thread"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        log_event("Artifact reaper stopped", "info")
+
+    def _run(self) -> None:
+        next_sweep = time.monotonic() + self.sweep_interval
+
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, next_sweep - time.monotonic()))
+            except queue.Empty:
+                try:
+                    sweep_orphaned_artifacts()
+                except Exception as e:
+                    log_event(f"Error sweeping orphaned artifacts: {e}", "error")
+                next_sweep = time.monotonic() + self.sweep_interval
+                continue
+
+            if item is _STOP:
+                return
+            self._remove(*item)
+
+    @staticmethod
+    def _remove(document_id: str, file_path: Optional[str]) -> None:
+        try:
+            remove_document_artifacts(document_id, file_path)
+        except Exception as e:
+            # The periodic sweep retries anything left behind
+            log_event(f"Error removing files of document {document_id}: {e}", "error")
+
+# Shared reaper, started and stopped with the app
+artifact_reaper = ArtifactReaper()
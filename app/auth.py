@@ -6,12 +6,23 @@ from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from pydantic import BaseModel, EmailStr
 import bcrypt
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, exists, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from app.database import User, get_db
+from app.database import User, UserPayment, get_async_db
+from app.user_counters import aget_question_quota
+from app.metrics import increment
 from utils.logger import log_event
 from app.config import OPENAI_API_KEY  # Use this to ensure .env is loaded
+from app.config import (
+    PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_SIZE,
+    BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT
+)
 
 # JWT Settings
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretkey123456789abcdefghijklmn")
@@ -53,6 +64,73 @@ class TokenData(BaseModel):
     username: Optional[str] = None
     is_admin: Optional[bool] = False
 
+class Principal(BaseModel):
+    """The authenticated user as seen by request handlers; load the User row for anything else"""
+    id: int
+    username: str
+    is_active: bool
+    is_admin: bool
+    is_premium: bool
+
+# Principal cache: username -> (expiry, principal), in insertion order so the
+# oldest entries are evicted first
+_principal_cache: Dict[str, Any] = {}
+_principal_cache_lock = threading.Lock()
+
+def invalidate_principal(username: Optional[str] = None, user_id: Optional[int] = None) -> None:
+    """
+    Drop a user's cached principal, or every cached principal without arguments
+
+    Call this after changing anything a Principal holds (password, active
+    flag, admin flag, payments) so the next request reloads it.
+    """
+    with _principal_cache_lock:
+        if username is None and user_id is None:
+            _principal_cache.clear()
+            return
+        for key, (_, principal) in list(_principal_cache.items()):
+            if key == username or principal.id == user_id:
+                del _principal_cache[key]
+
+def _cached_principal(username: str) -> Optional[Principal]:
+    with _principal_cache_lock:
+        entry = _principal_cache.get(username)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del _principal_cache[username]
+            return None
+        return entry[1]
+
+def _cache_principal(principal: Principal) -> None:
+    if PRINCIPAL_CACHE_TTL_SECONDS <= 0:
+        return
+    with _principal_cache_lock:
+        _principal_cache.pop(principal.username, None)
+        while len(_principal_cache) >= PRINCIPAL_CACHE_SIZE:
+            del _principal_cache[next(iter(_principal_cache))]
+        _principal_cache[principal.username] = (time.monotonic() + PRINCIPAL_CACHE_TTL_SECONDS, principal)
+
+async def aload_principal(db: AsyncSession, username: str) -> Optional[Principal]:
+    """
+    Load the principal of a user with a single query
+
+    Returns:
+        The principal, or None if there is no such user
+    """
+    row = (await db.execute(
+        select(
+            User.id, User.username, User.is_active, User.is_admin,
+            exists().where(and_(UserPayment.user_id == User.id, UserPayment.is_premium == True))
+        ).where(User.username == username)
+    )).first()
+
+    if row is None:
+        return None
+    return Principal(
+        id=row[0], username=row[1], is_active=bool(row[2]), is_admin=bool(row[3]), is_premium=bool(row[4])
+    )
+
 # Authentication functions
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -85,13 +163,57 @@ def get_password_hash(password: str) -> str:
     """
     try:
         password_bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
         hashed = bcrypt.hashpw(password_bytes, salt)
         return hashed.decode('utf-8')
     except Exception as e:
         log_event(f"Error hashing password: {e}", "error")
         raise e
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Whether a bcrypt hash was made with a work factor other than BCRYPT_ROUNDS"""
+    try:
+        # $2b$<rounds>$<salt and hash>
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+# bcrypt takes a few hundred milliseconds of CPU per call and releases the
+# GIL while it runs, so hashing happens on these threads rather than on the
+# event loop. Calls waiting for a thread are bounded: past the limit a login
+# burst gets 503s instead of a queue that outlives the clients' timeouts.
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_pending_hashes = 0
+
+async def _run_password_hashing(func, *args):
+    global _pending_hashes
+    # Only touched from the event loop, so no lock is needed
+    if _pending_hashes >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT:
+        increment("auth.password_hashing_rejected")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress, please try again",
+            headers={"Retry-After": "1"}
+        )
+
+    _pending_hashes += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _pending_hashes -= 1
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """Async version of verify_password, run on the password hashing threads"""
+    return await _run_password_hashing(verify_password, plain_password, hashed_password)
+
+async def aget_password_hash(password: str) -> str:
+    """Async version of get_password_hash, run on the password hashing threads"""
+    return await _run_password_hashing(get_password_hash, password)
+
+def shutdown_password_hashing() -> None:
+    """Stop the password hashing threads"""
+    _hash_executor.shutdown(wait=False, cancel_futures=True)
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT access token
@@ -118,16 +240,19 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> Principal:
     """
     Get the current user from a JWT token
     
+    The principal is cached for PRINCIPAL_CACHE_TTL_SECONDS, so most requests
+    do not query the database here.
+    
     Args:
         token: The JWT token
         db: Database session
         
     Returns:
-        The user object
+        The user's principal
         
     Raises:
         HTTPException: If token is invalid or user not found
@@ -151,11 +276,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
         
-    # Get user from database
-    user = db.query(User).filter(User.username == token_data.username).first()
-    
-    if user is None:
-        raise credentials_exception
+    user = _cached_principal(token_data.username)
+    if user is not None:
+        increment("auth.principal_cache_hits")
+    else:
+        increment("auth.principal_cache_misses")
+        user = await aload_principal(db, token_data.username)
+        if user is None:
+            raise credentials_exception
+        _cache_principal(user)
         
     if not user.is_active:
         raise HTTPException(
@@ -165,7 +294,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         
     return user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     """
     Get the current active user
     
@@ -173,7 +302,7 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         current_user: The current user
         
     Returns:
-        The user object if active
+        The user's principal if active
         
     Raises:
         HTTPException: If user is inactive
@@ -185,7 +314,7 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         )
     return current_user
 
-async def is_admin(current_user: User = Depends(get_current_user)) -> bool:
+async def is_admin(current_user: Principal = Depends(get_current_user)) -> bool:
     """
     Check if the current user is an admin
     
@@ -206,7 +335,7 @@ async def is_admin(current_user: User = Depends(get_current_user)) -> bool:
     return True
 
 # User registration and authentication
-def register_user(db: Session, user: UserCreate) -> User:
+async def register_user(db: AsyncSession, user: UserCreate) -> User:
     """
     Register a new user
     
@@ -222,7 +351,7 @@ def register_user(db: Session, user: UserCreate) -> User:
     """
     try:
         # Check if email exists
-        db_user = db.query(User).filter(User.email == user.email).first()
+        db_user = await db.scalar(select(User).where(User.email == user.email))
         if db_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -230,7 +359,7 @@ def register_user(db: Session, user: UserCreate) -> User:
             )
             
         # Check if username exists
-        db_user = db.query(User).filter(User.username == user.username).first()
+        db_user = await db.scalar(select(User).where(User.username == user.username))
         if db_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -238,10 +367,10 @@ def register_user(db: Session, user: UserCreate) -> User:
             )
             
         # Create new user
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await aget_password_hash(user.password)
         
         # Is this the first user? Make them admin
-        is_first_user = db.query(User).count() == 0
+        is_first_user = await db.scalar(select(func.count()).select_from(User)) == 0
         
         db_user = User(
             email=user.email,
@@ -252,8 +381,8 @@ def register_user(db: Session, user: UserCreate) -> User:
         
         # Add to database
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         log_event(f"User registered: {user.username}", "info")
         return db_user
@@ -264,13 +393,13 @@ def register_user(db: Session, user: UserCreate) -> User:
         
     except Exception as e:
         log_event(f"Error registering user: {e}", "error")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error registering user"
         )
 
-def authenticate_user(db: Session, username: str, password: str) -> User:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> User:
     """
     Authenticate a user
     
@@ -287,15 +416,27 @@ def authenticate_user(db: Session, username: str, password: str) -> User:
     """
     try:
         # Get user from database
-        user = db.query(User).filter(User.username == username).first()
+        user = await db.scalar(select(User).where(User.username == username))
         
         # Check if user exists and password is correct
-        if not user or not verify_password(password, user.hashed_password):
+        if not user or not await averify_password(password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        
+        # Upgrade the hash to the current work factor while we have the password
+        if password_needs_rehash(user.hashed_password):
+            try:
+                user.hashed_password = await aget_password_hash(password)
+                await db.commit()
+                increment("auth.passwords_rehashed")
+            except Exception as e:
+                # The login still succeeds; the next one retries
+                log_event(f"Error rehashing password of user {username}: {e}", "warning")
+                await db.rollback()
+                await db.refresh(user)
             
         return user
         
@@ -309,12 +450,11 @@ def authenticate_user(db: Session, username: str, password: str) -> User:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error during authentication"
         )
-async def check_payment_status(user_id: int, db: Session):
+async def check_payment_status(user_id: int, db: AsyncSession):
     """Check if user needs to pay"""
-    payment = db.query(UserPayment).filter(UserPayment.user_id == user_id).first()
-    chat_count = db.query(Question).filter(Question.user_id == user_id).count()
+    chat_count, is_premium = await aget_question_quota(db, user_id)
     
-    if not payment or not payment.is_premium:
+    if not is_premium:
         if chat_count >= 3:  # Free tier limit
             raise HTTPException(
                 status_code=402,
@@ -1,13 +1,13 @@
 # app/auth_routes.py
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from typing import Dict, Any
 
-from app.database import get_db
+from app.database import get_async_db, User
 from app.auth import (
-    UserCreate, UserResponse, Token, get_current_active_user,
+    UserCreate, UserResponse, Token, Principal, get_current_active_user,
     authenticate_user, register_user, create_access_token,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
@@ -17,12 +17,12 @@ from utils.logger import log_event
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 @router.post("/register", response_model=UserResponse)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Register a new user
     """
     try:
-        db_user = register_user(db, user)
+        db_user = await register_user(db, user)
         return db_user
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -37,14 +37,14 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get an access token for the user
     """
     try:
         # Authenticate the user
-        user = authenticate_user(db, form_data.username, form_data.password)
+        user = await authenticate_user(db, form_data.username, form_data.password)
         
         # Create token data
         token_data = {
@@ -78,8 +78,12 @@ async def login_for_access_token(
         )
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user = Depends(get_current_active_user)):
+async def read_users_me(
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Get the current user's information
     """
-    return current_user
\ No newline at end of file
+    # The principal has no email; load the full user
+    return await db.get(User, current_user.id)
\ No newline at end of file
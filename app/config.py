@@ -8,26 +8,130 @@ load_dotenv()
 
 # API Keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Optional OpenAI-compatible endpoint, e.g. http://localhost:8100/v1 for tools/openai_stub_server.py
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
 # LLM Configuration
 LLM_MODEL = "gpt-4o"  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
 EMBEDDING_MODEL = "text-embedding-ada-002"
 
+# OpenAI Client Configuration
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+EMBEDDING_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "15"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))  # In-flight OpenAI calls per process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "16"))
+
+# Bump when the QA prompts in app/qa_engine.py change so cached answers are not reused
+QA_PROMPT_VERSION = 1
+
+# Summarization Configuration
+# Bump when the summary prompts in app/qa_engine.py change so cached summaries are not reused
+SUMMARY_PROMPT_VERSION = 1
+SUMMARY_GROUP_SIZE = 6  # Chunks summarized together in the map step
+SUMMARY_REDUCE_FANIN = 5  # Summaries combined per call in each reduce step
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))  # Parallel LLM calls per document
+
+# Answer Cache Configuration
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity between questions for a semantic cache hit
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+
+# Answer Timeout and Extractive Fallback Configuration
+# Generated answers taking longer than this are replaced by the extractive answer
+QA_ANSWER_TIMEOUT_SECONDS = float(os.getenv("QA_ANSWER_TIMEOUT_SECONDS", "30"))
+EXTRACTIVE_TOP_SENTENCES = 3  # Sentences quoted in an extractive answer
+EXTRACTIVE_MAX_CHUNKS = 5  # Chunks searched when vector retrieval is unavailable
+
+# Conversation Configuration
+CONVERSATION_RECENT_TURNS = 3  # Exchanges kept verbatim; older ones are folded into the summary
+CONVERSATION_HISTORY_TOKEN_BUDGET = 800  # Maximum estimated tokens of history in a QA prompt
+CONVERSATION_SUMMARY_TOKEN_BUDGET = 300  # Maximum estimated tokens of the rolling summary
+CONVERSATION_FOLD_TURNS = 8  # Older exchanges folded into the summary per LLM call
+CONVERSATION_FOLD_CALLS_PER_ASK = 2  # Summary calls one ask may make; a long backlog is folded over several asks
+
+# Precomputed Answer Configuration
+# Answer STANDARD_QUESTIONS for every document during background processing
+PRECOMPUTE_ANSWERS_ENABLED = os.getenv("PRECOMPUTE_ANSWERS_ENABLED", "false").lower() == "true"
+PRECOMPUTE_CONCURRENCY = int(os.getenv("PRECOMPUTE_CONCURRENCY", "2"))  # Parallel LLM calls per document
+# Minimum cosine similarity between a user question and a standard question to serve its answer.
+# Embedding similarities sit in a narrow high band, so related standard questions
+# ("term" vs "termination") can score above 0.9; this tier runs before the semantic
+# answer cache and is never looser than it
+PRECOMPUTED_ANSWER_SIMILARITY_THRESHOLD = max(
+    float(os.getenv("PRECOMPUTED_ANSWER_SIMILARITY_THRESHOLD", "0.97")),
+    ANSWER_CACHE_SIMILARITY_THRESHOLD
+)
+STANDARD_QUESTIONS = [
+    "Who are the parties to this agreement?",
+    "What is the effective date of this agreement?",
+    "What is the term of this agreement?",
+    "What are the termination rights under this agreement?",
+    "Which law governs this agreement?",
+    "What are the payment terms?",
+]
+
+# SQLite Configuration (applied to every connection)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # Wait for locks instead of failing
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # Bytes of the file memory-mapped
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # Page cache per connection
+
 # User Limits
-MAX_FREE_CHATS = 3
+MAX_FREE_CHATS = int(os.getenv("MAX_FREE_CHATS", "3"))
+
+# Activity Log Configuration
+# Activity rows are queued and inserted in batches by a background writer, every
+# ACTIVITY_BATCH_SIZE rows or ACTIVITY_FLUSH_INTERVAL_MS after the first queued row
+ACTIVITY_WRITE_BEHIND_ENABLED = os.getenv("ACTIVITY_WRITE_BEHIND_ENABLED", "true").lower() == "true"
+ACTIVITY_BATCH_SIZE = int(os.getenv("ACTIVITY_BATCH_SIZE", "100"))
+ACTIVITY_FLUSH_INTERVAL_MS = int(os.getenv("ACTIVITY_FLUSH_INTERVAL_MS", "200"))
+# When the queue is full, activities are written synchronously instead
+ACTIVITY_QUEUE_SIZE = int(os.getenv("ACTIVITY_QUEUE_SIZE", "10000"))
+
+# Artifact Reaper Configuration
+# Files and vector stores of deleted documents are removed in the background;
+# a periodic sweep also removes any left without a document row
+REAPER_SWEEP_INTERVAL_SECONDS = int(os.getenv("REAPER_SWEEP_INTERVAL_SECONDS", "3600"))
+# Younger files are skipped by the sweep, as their document row may not be committed yet
+REAPER_MIN_AGE_SECONDS = int(os.getenv("REAPER_MIN_AGE_SECONDS", "3600"))
+
+# History Compaction Configuration
+# Activities and questions older than their retention are rolled up into per-user
+# daily counts and moved to compressed archive files in ARCHIVE_FOLDER
+ACTIVITY_RETENTION_DAYS = int(os.getenv("ACTIVITY_RETENTION_DAYS", "90"))
+# Never shorter than ACTIVITY_RETENTION_DAYS, as deleting a question deletes its activities
+QUESTION_RETENTION_DAYS = int(os.getenv("QUESTION_RETENTION_DAYS", "365"))
+HISTORY_COMPACTION_INTERVAL_HOURS = float(os.getenv("HISTORY_COMPACTION_INTERVAL_HOURS", "24"))  # 0 disables
+HISTORY_COMPACTION_BATCH_SIZE = int(os.getenv("HISTORY_COMPACTION_BATCH_SIZE", "5000"))
+
+# Pagination Configuration (list endpoints)
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "200"))
 
 # Document Processing Configuration
 CHUNK_SIZE = 1500
 CHUNK_OVERLAP = 200
 ALLOWED_EXTENSIONS = ["pdf", "docx", "doc", "txt"]
 
+# Retrieval Re-ranking Configuration
+# Re-rank a larger candidate pool with maximal marginal relevance to avoid near-duplicate chunks
+RETRIEVAL_MMR_ENABLED = os.getenv("RETRIEVAL_MMR_ENABLED", "false").lower() == "true"
+RETRIEVAL_MMR_DIVERSITY = float(os.getenv("RETRIEVAL_MMR_DIVERSITY", "0.3"))  # 0 = relevance only, 1 = diversity only
+RETRIEVAL_MMR_POOL_SIZE = int(os.getenv("RETRIEVAL_MMR_POOL_SIZE", "20"))  # Candidates retrieved before re-ranking
+
+# Context Packing Configuration
+# Maximum estimated tokens of document context included in a QA prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+
 # Folder Paths
 UPLOAD_FOLDER = "data/uploaded_docs"
 VECTOR_STORE_FOLDER = "data/vector_store"
+ARCHIVE_FOLDER = "data/archive"
 LOG_FOLDER = "logs"
 
 # Ensure directories exist
-for folder in [UPLOAD_FOLDER, VECTOR_STORE_FOLDER, LOG_FOLDER]:
+for folder in [UPLOAD_FOLDER, VECTOR_STORE_FOLDER, ARCHIVE_FOLDER, LOG_FOLDER]:
     os.makedirs(folder, exist_ok=True)
 
 # Logging Configuration
@@ -47,6 +151,21 @@ LEGAL_ENTITY_CATEGORIES = {
     "OTHER": ["NORP", "FAC", "PRODUCT", "EVENT", "LANGUAGE"]
 }
 
+# Bump when entity extraction rules change so cached NER results are not reused
+NER_RULESET_VERSION = 1
+NER_CACHE_ENABLED = os.getenv("NER_CACHE_ENABLED", "true").lower() == "true"
+
 # Security Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey123456789abcdefghijklmn")
-TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
\ No newline at end of file
+TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+# Authenticated users are cached per process for this long (0 disables);
+# changes made without invalidating the cache show up after at most the TTL
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+# bcrypt work factor for new hashes; existing hashes with another cost are
+# rehashed when their user next logs in
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads hashing passwords, and logins allowed to wait for one before
+# further logins are turned away with 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))
\ No newline at end of file
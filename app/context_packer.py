@@ -0,0 +1,129 @@
+# app/context_packer.py
+import hashlib
+import math
+from typing import List, Tuple, Dict
+from app.config import CHUNK_OVERLAP, CONTEXT_TOKEN_BUDGET
+
+# Consecutive chunks share about CHUNK_OVERLAP characters; search a little further to be safe
+MAX_OVERLAP_SEARCH = CHUNK_OVERLAP * 2
+
+# Shorter suffix/prefix matches are treated as coincidence rather than chunk overlap
+MIN_OVERLAP = 20
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens in text
+
+    Uses the ~4 characters per token ratio of English text, which is close
+    enough for budgeting and costs nothing compared to running a tokenizer.
+    """
+    return math.ceil(len(text) / 4)
+
+def overlap_length(previous: str, following: str) -> int:
+    """
+    Find how much text two consecutive chunks share
+
+    Args:
+        previous: Earlier chunk
+        following: The chunk right after it in the document
+
+    Returns:
+        Length of the longest suffix of previous that is a prefix of following,
+        or 0 if it is too short to be chunk overlap
+    """
+    for length in range(min(len(previous), len(following), MAX_OVERLAP_SEARCH), MIN_OVERLAP - 1, -1):
+        if previous.endswith(following[:length]):
+            return length
+    return 0
+
+def join_consecutive_chunks(chunks: List[str]) -> str:
+    """
+    Join a run of consecutive document chunks, removing their shared overlap
+
+    Args:
+        chunks: Chunks in document order
+
+    Returns:
+        The joined text
+    """
+    text = ""
+    for i, chunk in enumerate(chunks):
+        shared = overlap_length(chunks[i - 1], chunk) if i else 0
+        if shared:
+            text += chunk[shared:]
+        else:
+            text += ("\n\n" if text else "") + chunk
+    return text
+
+def pack_context(
+    ranked: List[Tuple[int, float]],
+    chunks: List[str],
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> Tuple[List[Tuple[str, float]], int]:
+    """
+    Pack retrieved chunks into prompt context within a token budget
+
+    Chunks are taken in relevance order until the budget is spent. Duplicate
+    chunks are skipped, and chunks that are adjacent in the document are merged
+    into one passage with their shared overlap removed.
+
+    Args:
+        ranked: List of (chunk_index, score) tuples, most relevant first
+        chunks: The document chunks
+        token_budget: Maximum estimated tokens of context
+
+    Returns:
+        Tuple of (list of (passage, score) tuples in relevance order, estimated context tokens)
+    """
+    selected: Dict[int, Tuple[int, float]] = {}  # chunk index -> (rank, score)
+    texts: Dict[int, str] = {}
+    seen_hashes = set()
+    used_tokens = 0
+
+    for rank, (chunk_idx, score) in enumerate(ranked):
+        text = chunks[chunk_idx]
+
+        # Skip repeated boilerplate
+        digest = hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+        if digest in seen_hashes:
+            continue
+        seen_hashes.add(digest)
+
+        # Only text not already covered by a selected neighbour costs tokens
+        shared = 0
+        if chunk_idx - 1 in texts:
+            shared += overlap_length(texts[chunk_idx - 1], text)
+        if chunk_idx + 1 in texts:
+            shared += overlap_length(text, texts[chunk_idx + 1])
+        cost = estimate_tokens(text) - estimate_tokens(text[:shared])
+
+        if used_tokens + cost > token_budget:
+            if selected:
+                continue
+            # Always keep the most relevant chunk, cut down to the budget
+            text = text[:token_budget * 4]
+            cost = estimate_tokens(text)
+
+        selected[chunk_idx] = (rank, score)
+        texts[chunk_idx] = text
+        used_tokens += cost
+
+    # Merge runs of consecutive chunks into passages
+    passages = []
+    for chunk_idx in sorted(selected):
+        if passages and passages[-1]["last"] == chunk_idx - 1:
+            passage = passages[-1]
+            previous_text = texts[chunk_idx - 1]
+            shared = overlap_length(previous_text, texts[chunk_idx])
+            passage["text"] += texts[chunk_idx][shared:] if shared else "\n\n" + texts[chunk_idx]
+            passage["last"] = chunk_idx
+            passage["rank"], passage["score"] = min((passage["rank"], passage["score"]), selected[chunk_idx])
+        else:
+            rank, score = selected[chunk_idx]
+            passages.append({"text": texts[chunk_idx], "last": chunk_idx, "rank": rank, "score": score})
+
+    passages.sort(key=lambda p: p["rank"])
+    packed = [(p["text"], p["score"]) for p in passages]
+    context_tokens = sum(estimate_tokens(text) for text, _ in packed)
+
+    return packed, context_tokens
@@ -0,0 +1,213 @@
+# app/conversation.py
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import ConversationState, Question
+from app.config import (
+    CONVERSATION_RECENT_TURNS, CONVERSATION_HISTORY_TOKEN_BUDGET, CONVERSATION_SUMMARY_TOKEN_BUDGET,
+    CONVERSATION_FOLD_TURNS, CONVERSATION_FOLD_CALLS_PER_ASK
+)
+from app.context_packer import estimate_tokens
+from app.qa_engine import aquery_llm
+from app.metrics import increment
+from utils.logger import log_event
+
+CONVERSATION_SYSTEM_PROMPT = "You are an AI legal document assistant. You keep track of a conversation about a legal document precisely and concisely."
+
+def generate_conversation_summary_prompt(summary: str, turns: List[Question]) -> str:
+    """Create a prompt folding older exchanges into the rolling conversation summary"""
+    # Each exchange is capped, so the prompt stays within a fixed size
+    exchanges = "\n\n".join(
+        f"Q: {truncate_to_tokens(turn.question_text, 150)}\n"
+        f"A: {truncate_to_tokens(turn.answer_text or '', CONVERSATION_SUMMARY_TOKEN_BUDGET)}"
+        for turn in turns
+    )
+    earlier = f"Summary of the conversation so far:\n{summary}\n\n" if summary else ""
+    return f"""{earlier}Further exchanges:
+
+{exchanges}
+
+Write an updated summary of the whole conversation about the document. Keep the topics,
+clauses, parties, dates and amounts discussed and the conclusions reached, so later
+follow-up questions can be understood. Stay under {CONVERSATION_SUMMARY_TOKEN_BUDGET * 3 // 4} words."""
+
+def generate_standalone_query_prompt(history: str, question: str) -> str:
+    """Create a prompt rewriting a follow-up question into a standalone question"""
+    return f"""{history}
+
+Follow-up question: {question}
+
+Rewrite the follow-up question as a single standalone question about the document that can be
+understood without the conversation, resolving references such as "it", "that clause" or
+"what about". If it is already standalone, return it unchanged. Reply with the question only."""
+
+async def get_conversation_state(db: AsyncSession, document_id: str, user_id: int) -> ConversationState:
+    """
+    Get the conversation state of a user on a document, creating it if needed
+
+    Args:
+        db: Database session
+        document_id: Document ID
+        user_id: User ID
+
+    Returns:
+        The conversation state
+    """
+    state = await db.scalar(
+        select(ConversationState)
+        .where(ConversationState.document_id == document_id, ConversationState.user_id == user_id)
+    )
+
+    if state is None:
+        state = ConversationState(document_id=document_id, user_id=user_id, summary="", summarized_through_id=0)
+        db.add(state)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # A concurrent first ask created it
+            await db.rollback()
+            state = await db.scalar(
+                select(ConversationState)
+                .where(ConversationState.document_id == document_id, ConversationState.user_id == user_id)
+            )
+
+    return state
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to an estimated token count"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max(0, max_tokens * 4 - 3)].rstrip() + "..."
+
+def format_history(summary: str, turns: List[Question], token_budget: int = CONVERSATION_HISTORY_TOKEN_BUDGET) -> str:
+    """
+    Format the conversation history for a prompt within a token budget
+
+    The summary comes first, then the most recent exchanges; when they do not
+    fit, older exchanges are dropped and long answers are shortened.
+
+    Args:
+        summary: Rolling summary of earlier turns
+        turns: Recent exchanges, oldest first
+        token_budget: Maximum estimated tokens of the formatted history
+
+    Returns:
+        The formatted history, or an empty string if there is none
+    """
+    parts = []
+    remaining = token_budget
+
+    if summary:
+        summary_text = "Summary of the earlier conversation:\n" + truncate_to_tokens(summary, CONVERSATION_SUMMARY_TOKEN_BUDGET)
+        parts.append(summary_text)
+        remaining -= estimate_tokens(summary_text)
+
+    recent = []
+    for turn in reversed(turns):
+        question = f"Q: {turn.question_text}\nA: "
+        available = remaining - estimate_tokens(question)
+        # Not worth including an exchange whose answer would be cut to almost nothing
+        if available < 50:
+            break
+        exchange = question + truncate_to_tokens(turn.answer_text or "", available)
+        recent.append(exchange)
+        remaining -= estimate_tokens(exchange)
+
+    if recent:
+        parts.append("Most recent exchanges:\n" + "\n\n".join(reversed(recent)))
+
+    return "\n\n".join(parts)
+
+async def compress_conversation(db: AsyncSession, state: ConversationState) -> List[Question]:
+    """
+    Fold exchanges beyond the recent window into the rolling summary
+
+    Older exchanges are folded CONVERSATION_FOLD_TURNS at a time, saving the
+    state after each call, and at most CONVERSATION_FOLD_CALLS_PER_ASK calls
+    are made per ask; a long backlog (e.g. questions asked before conversation
+    mode was turned on) is caught up over several asks.
+
+    Args:
+        db: Database session
+        state: Conversation state to update
+
+    Returns:
+        The recent exchanges that are not part of the summary, oldest first
+    """
+    def unsummarized():
+        return select(Question).where(
+            Question.document_id == state.document_id,
+            Question.user_id == state.user_id,
+            Question.id > state.summarized_through_id
+        )
+
+    recent = list(await db.scalars(
+        unsummarized().order_by(Question.id.desc()).limit(CONVERSATION_RECENT_TURNS)
+    ))[::-1]
+    if len(recent) < CONVERSATION_RECENT_TURNS:
+        return recent
+
+    for _ in range(CONVERSATION_FOLD_CALLS_PER_ASK):
+        overflow = list(await db.scalars(
+            unsummarized().where(Question.id < recent[0].id).order_by(Question.id).limit(CONVERSATION_FOLD_TURNS)
+        ))
+        if not overflow:
+            break
+
+        try:
+            summary = await aquery_llm(
+                generate_conversation_summary_prompt(state.summary, overflow),
+                CONVERSATION_SYSTEM_PROMPT
+            )
+        except Exception as e:
+            # Keep the old summary; the next ask retries the same bounded chunk
+            log_event(f"Error compressing conversation: {e}", "warning")
+            break
+
+        state.summary = truncate_to_tokens(summary.strip(), CONVERSATION_SUMMARY_TOKEN_BUDGET)
+        state.summarized_through_id = overflow[-1].id
+        await db.commit()
+        increment("qa.conversation_compressions")
+
+    return recent
+
+async def prepare_conversation_turn(
+    db: AsyncSession,
+    document_id: str,
+    user_id: int,
+    question: str
+) -> Tuple[str, Optional[str]]:
+    """
+    Prepare a question asked in conversation mode
+
+    Args:
+        db: Database session
+        document_id: Document ID
+        user_id: User ID
+        question: The question as asked, possibly a follow-up
+
+    Returns:
+        Tuple of (standalone question for retrieval and answering, formatted
+        history for the prompt or None for the first turn)
+    """
+    state = await get_conversation_state(db, document_id, user_id)
+    recent = await compress_conversation(db, state)
+    history = format_history(state.summary, recent)
+
+    if not history:
+        return question, None
+
+    try:
+        standalone = (await aquery_llm(
+            generate_standalone_query_prompt(history, question),
+            CONVERSATION_SYSTEM_PROMPT
+        )).strip()
+        increment("qa.conversation_rewrites")
+    except Exception as e:
+        log_event(f"Error rewriting follow-up question: {e}", "warning")
+        standalone = question
+
+    log_event(f"Conversation follow-up rewritten as: {standalone}", "info")
+    return standalone or question, history
@@ -1,11 +1,14 @@
 # app/database.py
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, JSON
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, JSON, Index, LargeBinary
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
 import os
 from datetime import datetime, timedelta
 from utils.logger import log_event
+from app.config import SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB
+from app.migrations import run_migrations
 
 # Database path
 DB_PATH = "data/legal_assistant.db"
@@ -17,8 +20,31 @@ os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 
-# Create session factory
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """Apply the performance pragmas to a new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while a writer commits; NORMAL sync is safe with WAL
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")  # Negative values are in KiB
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    # Enforce foreign keys so deleting a document cascades to its rows in SQLite
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+event.listen(engine, "connect", configure_sqlite_connection)
+
+# Async engine for request handlers; aiosqlite runs each connection on its own thread
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+event.listen(async_engine.sync_engine, "connect", configure_sqlite_connection)
+
+# Create session factories; the sync one is used by background workers
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay usable after commit, since async sessions cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -43,6 +69,9 @@ class User(Base):
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_documents_owner_created", "owner_id", "created_at"),
+    )
 
     id = Column(String(50), primary_key=True) # UUID
     owner_id = Column(Integer, ForeignKey("users.id"))
@@ -58,26 +87,67 @@ class Document(Base):
 
     # Relationships
     owner = relationship("User", back_populates="documents")
-    entities = relationship("DocumentEntity", back_populates="document", cascade="all, delete")
-    questions = relationship("Question", back_populates="document", cascade="all, delete")
-    activities = relationship("UserActivity", back_populates="document", cascade="all, delete")
+    # Child rows are removed by ON DELETE CASCADE rather than loaded and deleted by the ORM
+    entities = relationship("DocumentEntity", back_populates="document", cascade="all, delete", passive_deletes=True)
+    questions = relationship("Question", back_populates="document", cascade="all, delete", passive_deletes=True)
+    activities = relationship("UserActivity", back_populates="document", cascade="all, delete", passive_deletes=True)
 
 class DocumentEntity(Base):
     __tablename__ = "document_entities"
+    __table_args__ = (
+        Index("ix_document_entities_document", "document_id", "category"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(String(50), ForeignKey("documents.id"))
+    document_id = Column(String(50), ForeignKey("documents.id", ondelete="CASCADE"))
     category = Column(String(50))  # PERSON, ORG, DATE, etc.
     text = Column(String(255))
+    mention_count = Column(Integer, default=1)  # Number of mentions in the document
+    first_offset = Column(Integer, nullable=True)  # Character offset of the first mention
 
     # Relationships
     document = relationship("Document", back_populates="entities")
 
+class SummaryCacheEntry(Base):
+    __tablename__ = "summary_cache"
+
+    key = Column(String(64), primary_key=True)  # SHA-256 of input text, model and prompt version
+    summary = Column(Text)
+    created_at = Column(DateTime, default=func.now())
+
+class EntityIndexEntry(Base):
+    __tablename__ = "entity_index"
+    __table_args__ = (
+        # Serves exact and prefix lookups of an owner's entities
+        Index("ix_entity_index_owner_text", "owner_id", "normalized_text", "category"),
+        Index("ix_entity_index_document", "document_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    document_id = Column(String(50), ForeignKey("documents.id", ondelete="CASCADE"))
+    category = Column(String(50))
+    normalized_text = Column(String(255))  # Casefolded, whitespace-collapsed entity text
+    display_text = Column(String(255))  # First original form seen in the document
+    mention_count = Column(Integer, default=1)
+
+class NerCacheEntry(Base):
+    __tablename__ = "ner_cache"
+
+    key = Column(String(64), primary_key=True)  # SHA-256 of segment text, model and rule set
+    entities = Column(JSON)  # [[entity_text, entity_label, start_offset], ...]
+    created_at = Column(DateTime, default=func.now())
+
 class Question(Base):
     __tablename__ = "questions"
+    __table_args__ = (
+        Index("ix_questions_document_user", "document_id", "user_id"),
+        Index("ix_questions_document_id", "document_id", "id"),
+        Index("ix_questions_user_created", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(String(50), ForeignKey("documents.id"))
+    document_id = Column(String(50), ForeignKey("documents.id", ondelete="CASCADE"))
     user_id = Column(Integer, ForeignKey("users.id"))
     question_text = Column(Text)
     answer_text = Column(Text)
@@ -86,12 +156,60 @@ class Question(Base):
     # Relationships
     document = relationship("Document", back_populates="questions")
     user = relationship("User", back_populates="questions")
-    activities = relationship("UserActivity", back_populates="question", cascade="all, delete")
+    activities = relationship("UserActivity", back_populates="question", cascade="all, delete", passive_deletes=True)
 
+class CachedAnswer(Base):
+    __tablename__ = "answer_cache"
+    __table_args__ = (
+        Index("ix_answer_cache_document", "document_id", "model", "prompt_version"),
+    )
 
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String(64), unique=True, index=True)  # SHA-256 of document, question, model, prompt version
+    document_id = Column(String(50), ForeignKey("documents.id", ondelete="CASCADE"))
+    normalized_question = Column(Text)
+    model = Column(String(50))
+    prompt_version = Column(Integer)
+    answer_text = Column(Text)
+    question_embedding = Column(LargeBinary, nullable=True)  # float32 bytes
+    hit_count = Column(Integer, default=0)  # No longer updated; hits are counted in /metrics
+    created_at = Column(DateTime, default=func.now())
+
+class ConversationState(Base):
+    __tablename__ = "conversation_states"
+    __table_args__ = (
+        Index("ix_conversation_states_document_user", "document_id", "user_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(String(50), ForeignKey("documents.id", ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    summary = Column(Text, default="")  # Rolling summary of turns up to summarized_through_id
+    summarized_through_id = Column(Integer, default=0)  # Last Question.id folded into the summary
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class PrecomputedAnswer(Base):
+    __tablename__ = "precomputed_answers"
+    __table_args__ = (
+        Index("ix_precomputed_answers_document", "document_id", "normalized_question"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(String(50), ForeignKey("documents.id", ondelete="CASCADE"))
+    question_text = Column(Text)  # Standard question as configured
+    normalized_question = Column(Text)
+    model = Column(String(50))
+    prompt_version = Column(Integer)
+    answer_text = Column(Text)
+    question_embedding = Column(LargeBinary, nullable=True)  # float32 bytes
+    hit_count = Column(Integer, default=0)  # No longer updated; hits are counted in /metrics
+    created_at = Column(DateTime, default=func.now())
 
 class UserPayment(Base):
     __tablename__ = "user_payments"
+    __table_args__ = (
+        Index("ix_user_payments_user", "user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -102,15 +220,42 @@ class UserPayment(Base):
     # Relationship
     user = relationship("User", back_populates="payment")
 
+class UserCounter(Base):
+    __tablename__ = "user_counters"
+
+    # Updated in the same transaction as the rows they count (see app/user_counters.py)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    documents = Column(Integer, default=0, nullable=False)
+    questions = Column(Integer, default=0, nullable=False)
+    uploads = Column(Integer, default=0, nullable=False)  # document_upload activities
+    questions_asked = Column(Integer, default=0, nullable=False)  # question activities
+
+class UserDailyRollup(Base):
+    __tablename__ = "user_daily_rollups"
+
+    # Counts of rows moved to the history archive (see app/history_archive.py)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(String(10), primary_key=True)  # YYYY-MM-DD
+    source = Column(String(50), primary_key=True)  # Archived table: user_activities or questions
+    activity_type = Column(String(50), primary_key=True, default="")  # Empty for questions
+    count = Column(Integer, default=0, nullable=False)
+
 class UserActivity(Base):
     __tablename__ = "user_activities"
+    __table_args__ = (
+        Index("ix_user_activities_user_created", "user_id", "created_at"),
+        Index("ix_user_activities_user_type_created", "user_id", "activity_type", "created_at"),
+        # Used by the cascades from documents and questions
+        Index("ix_user_activities_document", "document_id"),
+        Index("ix_user_activities_question", "question_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     activity_type = Column(String(50))  # document_upload, document_delete, question, etc.
     description = Column(Text)
-    document_id = Column(String(50), ForeignKey("documents.id"), nullable=True)
-    question_id = Column(Integer, ForeignKey("questions.id"), nullable=True)
+    document_id = Column(String(50), ForeignKey("documents.id", ondelete="CASCADE"), nullable=True)
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=True)
     extra_data = Column(JSON, nullable=True)  # Additional activity data
     created_at = Column(DateTime, default=func.now())
 
@@ -123,7 +268,8 @@ class UserActivity(Base):
 def init_db():
     try:
         Base.metadata.create_all(bind=engine)
-        log_event("Database initialized successfully", "info")
+        version = run_migrations(engine)
+        log_event(f"Database initialized successfully (schema version {version})", "info")
     except Exception as e:
         log_event(f"Error initializing database: {e}", "error")
 
@@ -135,5 +281,10 @@ def get_db():
     finally:
         db.close()
 
+# Get async database session for dependency injection in request handlers
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Initialize database
 init_db()
\ No newline at end of file
@@ -2,15 +2,15 @@
 import os
 import faiss
 import numpy as np
-import openai
 import pickle
 import json
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 from utils.logger import log_event
-from app.config import OPENAI_API_KEY, EMBEDDING_MODEL, VECTOR_STORE_FOLDER
-
-# Initialize OpenAI API
-openai.api_key = OPENAI_API_KEY
+from app.config import (
+    EMBEDDING_MODEL, EMBEDDING_TIMEOUT_SECONDS, VECTOR_STORE_FOLDER,
+    RETRIEVAL_MMR_ENABLED, RETRIEVAL_MMR_DIVERSITY, RETRIEVAL_MMR_POOL_SIZE
+)
+from app.llm_client import create_embedding, acreate_embedding
 
 def get_openai_embedding(text: str) -> List[float]:
     """
@@ -25,9 +25,10 @@ def get_openai_embedding(text: str) -> List[float]:
     try:
         # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
         # do not change this unless explicitly requested by the user
-        response = openai.embeddings.create(
+        response = create_embedding(
             model=EMBEDDING_MODEL,
-            input=text
+            input=text,
+            timeout=EMBEDDING_TIMEOUT_SECONDS
         )
         
         # Extract the embedding
@@ -39,6 +40,29 @@ def get_openai_embedding(text: str) -> List[float]:
         log_event(f"Error generating OpenAI embedding: {e}", "error")
         raise Exception(f"Error generating embedding: {str(e)}")
 
+async def aget_openai_embedding(text: str) -> List[float]:
+    """
+    Get embedding for a text string without blocking the event loop
+    
+    Args:
+        text: Text to embed
+        
+    Returns:
+        List of embedding values
+    """
+    try:
+        response = await acreate_embedding(
+            model=EMBEDDING_MODEL,
+            input=text,
+            timeout=EMBEDDING_TIMEOUT_SECONDS
+        )
+        
+        return response.data[0].embedding
+    
+    except Exception as e:
+        log_event(f"Error generating OpenAI embedding: {e}", "error")
+        raise Exception(f"Error generating embedding: {str(e)}")
+
 def get_batch_embeddings(texts: List[str], batch_size: int = 20) -> np.ndarray:
     """
     Get embeddings for a list of texts in batches
@@ -59,9 +83,13 @@ def get_batch_embeddings(texts: List[str], batch_size: int = 20) -> np.ndarray:
             
             log_event(f"Processing batch {i//batch_size + 1} of {len(texts)//batch_size + 1}", "info")
             
-            for text in batch:
-                embedding = get_openai_embedding(text)
-                embeddings.append(embedding)
+            # One request per batch over the pooled client
+            response = create_embedding(
+                model=EMBEDDING_MODEL,
+                input=batch,
+                timeout=EMBEDDING_TIMEOUT_SECONDS
+            )
+            embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
         
         return np.array(embeddings, dtype=np.float32)
     
@@ -144,7 +172,147 @@ def load_faiss_index(file_id: str) -> Tuple[Any, List[str]]:
         log_event(f"Error loading FAISS index: {e}", "error")
         raise Exception(f"Error loading FAISS index: {str(e)}")
 
-def search_similar_chunks(query: str, index: Any, chunks: List[str], top_k: int = 5) -> List[Tuple[str, float]]:
+def search_similar_chunk_ids(
+    query: str,
+    index: Any,
+    num_chunks: int,
+    top_k: int = 5,
+    query_embedding: Optional[List[float]] = None,
+    diversity: Optional[float] = None,
+    pool_size: Optional[int] = None
+) -> List[Tuple[int, float]]:
+    """
+    Search for chunks similar to the query, returning their positions in the document
+    
+    Args:
+        query: Query text
+        index: FAISS index
+        num_chunks: Number of chunks in the document
+        top_k: Number of results to return
+        query_embedding: Optional precomputed embedding of the query
+        diversity: MMR diversity weight; defaults to RETRIEVAL_MMR_DIVERSITY when
+            RETRIEVAL_MMR_ENABLED is set, otherwise results are not re-ranked
+        pool_size: Number of candidates re-ranked with MMR
+        
+    Returns:
+        List of (chunk_index, score) tuples, most similar first
+    """
+    # Get embedding for query
+    if query_embedding is None:
+        query_embedding = get_openai_embedding(query)
+    
+    return search_similar_chunk_ids_batch(
+        np.array([query_embedding], dtype=np.float32), index, num_chunks, top_k, diversity, pool_size
+    )[0]
+
+def search_similar_chunk_ids_batch(
+    query_embeddings: np.ndarray,
+    index: Any,
+    num_chunks: int,
+    top_k: int = 5,
+    diversity: Optional[float] = None,
+    pool_size: Optional[int] = None
+) -> List[List[Tuple[int, float]]]:
+    """
+    Search for chunks similar to several queries in one index pass
+    
+    Args:
+        query_embeddings: Array of query embeddings, one row per query
+        index: FAISS index
+        num_chunks: Number of chunks in the document
+        top_k: Number of results to return per query
+        diversity: MMR diversity weight (see search_similar_chunk_ids)
+        pool_size: Number of candidates re-ranked with MMR
+        
+    Returns:
+        For each query, a list of (chunk_index, score) tuples, most similar first
+    """
+    if diversity is None and RETRIEVAL_MMR_ENABLED:
+        diversity = RETRIEVAL_MMR_DIVERSITY
+    
+    query_embeddings = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+    search_k = max(top_k, pool_size or RETRIEVAL_MMR_POOL_SIZE) if diversity else top_k
+    distances, indices = index.search(query_embeddings, search_k)
+    
+    # FAISS pads missing results with -1
+    results = [
+        [
+            (int(chunk_idx), float(distance))
+            for chunk_idx, distance in zip(row_indices, row_distances)
+            if 0 <= chunk_idx < num_chunks
+        ]
+        for row_indices, row_distances in zip(indices, distances)
+    ]
+    
+    if diversity:
+        results = [
+            mmr_rerank(query_embedding, index, candidates, top_k, diversity)
+            for query_embedding, candidates in zip(query_embeddings, results)
+        ]
+    
+    return results
+
+def mmr_rerank(
+    query_embedding: np.ndarray,
+    index: Any,
+    candidates: List[Tuple[int, float]],
+    top_k: int,
+    diversity: float
+) -> List[Tuple[int, float]]:
+    """
+    Re-rank candidates with maximal marginal relevance
+    
+    Each pick maximizes (1 - diversity) * similarity to the query minus
+    diversity * the highest similarity to an already picked chunk, so
+    near-duplicate chunks (overlap, repeated clauses) are not picked together.
+    
+    Args:
+        query_embedding: Query embedding
+        index: FAISS index the candidate vectors are reconstructed from
+        candidates: (chunk_index, score) tuples from the index search
+        top_k: Number of results to return
+        diversity: Weight of the redundancy penalty, between 0 and 1
+        
+    Returns:
+        The picked (chunk_index, score) tuples in pick order
+    """
+    if len(candidates) <= 1:
+        return candidates[:top_k]
+    
+    ids = np.array([chunk_idx for chunk_idx, _ in candidates], dtype=np.int64)
+    vectors = np.vstack([index.reconstruct(int(chunk_idx)) for chunk_idx in ids])
+    
+    # Cosine similarities of candidates to the query and to each other
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    relevance = vectors @ query
+    pairwise = vectors @ vectors.T
+    
+    picked = [int(np.argmax(relevance))]
+    redundancy = pairwise[picked[0]].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[picked[0]] = False
+    
+    while len(picked) < min(top_k, len(candidates)):
+        scores = (1 - diversity) * relevance - diversity * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    
+    return [candidates[i] for i in picked]
+
+def search_similar_chunks(
+    query: str,
+    index: Any,
+    chunks: List[str],
+    top_k: int = 5,
+    query_embedding: Optional[List[float]] = None,
+    diversity: Optional[float] = None,
+    pool_size: Optional[int] = None
+) -> List[Tuple[str, float]]:
     """
     Search for chunks similar to the query
     
@@ -153,24 +321,16 @@ def search_similar_chunks(query: str, index: Any, chunks: List[str], top_k: int
         index: FAISS index
         chunks: Original text chunks
         top_k: Number of results to return
+        query_embedding: Optional precomputed embedding of the query
+        diversity: MMR diversity weight (see search_similar_chunk_ids)
+        pool_size: Number of candidates re-ranked with MMR
         
     Returns:
         List of (chunk, score) tuples
     """
     try:
-        # Get embedding for query
-        query_embedding = get_openai_embedding(query)
-        query_embedding_array = np.array([query_embedding], dtype=np.float32)
-        
-        # Search index
-        distances, indices = index.search(query_embedding_array, top_k)
-        
-        # Get results
-        results = []
-        for i in range(len(indices[0])):
-            chunk_idx = indices[0][i]
-            if chunk_idx < len(chunks):  # Safety check
-                results.append((chunks[chunk_idx], float(distances[0][i])))
+        ranked = search_similar_chunk_ids(query, index, len(chunks), top_k, query_embedding, diversity, pool_size)
+        results = [(chunks[chunk_idx], score) for chunk_idx, score in ranked]
         
         log_event(f"Found {len(results)} similar chunks for query", "info")
         return results
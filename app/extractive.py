@@ -0,0 +1,131 @@
+# app/extractive.py
+import re
+import zlib
+import numpy as np
+from typing import List, Optional, Tuple
+from app.config import EXTRACTIVE_TOP_SENTENCES, EXTRACTIVE_MAX_CHUNKS
+from app.metrics import increment
+from utils.logger import log_event
+
+# Dimension of the hashed term vectors sentences are compared in
+HASH_DIMENSION = 4096
+
+# Chunks scored per matrix when no retrieval results are available, bounding memory
+CHUNK_BATCH_SIZE = 256
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.;:!?])\s+(?=[A-Z0-9(\"'])|\n{2,}")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOPWORDS = frozenset(
+    "a an and any are as at be by do does for from has have how in is it its of on or shall "
+    "that the this to under was what when where which who will with".split()
+)
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, dropping fragments too short to be useful"""
+    return [
+        sentence for sentence in (" ".join(part.split()) for part in SENTENCE_BOUNDARY.split(text))
+        if len(sentence) >= 20
+    ]
+
+def _term_hashes(text: str) -> List[int]:
+    tokens = [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+    # Adjacent word pairs catch phrases like "governing law" and "effective date"
+    terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return [zlib.crc32(term.encode("utf-8")) % HASH_DIMENSION for term in terms]
+
+def term_matrix(texts: List[str]) -> np.ndarray:
+    """Build a (len(texts), HASH_DIMENSION) matrix of hashed term counts"""
+    rows, columns = [], []
+    for row, text in enumerate(texts):
+        hashes = _term_hashes(text)
+        rows.extend([row] * len(hashes))
+        columns.extend(hashes)
+
+    matrix = np.zeros((len(texts), HASH_DIMENSION), dtype=np.float32)
+    np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)), 1.0)
+    return matrix
+
+def rank_texts(query: str, texts: List[str]) -> np.ndarray:
+    """
+    Score texts against a query
+
+    Texts and query are TF-IDF weighted hashed term vectors, so scoring is
+    a single matrix-vector product and needs no model call.
+
+    Returns:
+        Cosine similarity of each text to the query
+    """
+    matrix = term_matrix(texts)
+    query_vector = term_matrix([query])[0]
+
+    # Terms found in many texts (clause boilerplate) count for less
+    document_frequency = np.count_nonzero(matrix, axis=0)
+    idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+    matrix = np.log1p(matrix) * idf
+    query_vector = np.log1p(query_vector) * idf
+
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector)
+    return (matrix @ query_vector) / np.maximum(norms, 1e-12)
+
+def select_chunks(query: str, chunks: List[str], limit: int = EXTRACTIVE_MAX_CHUNKS) -> List[int]:
+    """Pick the chunks most relevant to a query without the vector index"""
+    scores = np.concatenate([
+        rank_texts(query, chunks[start:start + CHUNK_BATCH_SIZE])
+        for start in range(0, len(chunks), CHUNK_BATCH_SIZE)
+    ])
+    best = np.argsort(-scores)[:limit]
+    return [int(i) for i in best if scores[i] > 0]
+
+def extractive_answer(
+    query: str,
+    chunks: List[str],
+    ranked: Optional[List[Tuple[int, float]]] = None,
+    top_n: int = EXTRACTIVE_TOP_SENTENCES
+) -> Optional[str]:
+    """
+    Answer a question by quoting the document sentences most relevant to it
+
+    Args:
+        query: The user's question
+        chunks: The document chunks
+        ranked: Optional retrieved (chunk_index, score) tuples; without them
+            (e.g. when the query could not be embedded) chunks are picked lexically
+        top_n: Number of sentences to quote
+
+    Returns:
+        The quoted passages, or None if nothing relevant was found
+    """
+    try:
+        if not chunks:
+            return None
+        chunk_ids = [chunk_idx for chunk_idx, _ in ranked] if ranked else select_chunks(query, chunks)
+
+        sentences, positions, seen = [], [], set()
+        for chunk_idx in chunk_ids:
+            for position, sentence in enumerate(split_sentences(chunks[chunk_idx])):
+                # Chunk overlap and repeated clauses produce duplicate sentences
+                if sentence in seen:
+                    continue
+                seen.add(sentence)
+                sentences.append(sentence)
+                positions.append((chunk_idx, position))
+
+        if not sentences:
+            return None
+
+        scores = rank_texts(query, sentences)
+        best = [int(i) for i in np.argsort(-scores)[:top_n] if scores[i] > 0]
+        if not best:
+            return None
+
+        # Quote in document order so the passages read naturally
+        best.sort(key=lambda i: positions[i])
+        increment("qa.extractive_answers")
+
+        quotes = "\n\n".join(f"\"{sentences[i]}\"" for i in best)
+        return f"The most relevant passages of the document are:\n\n{quotes}"
+
+    except Exception as e:
+        log_event(f"Error building extractive answer: {e}", "error")
+        return None
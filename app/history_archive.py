@@ -0,0 +1,259 @@
+# app/history_archive.py
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.config import (
+    ARCHIVE_FOLDER, ACTIVITY_RETENTION_DAYS, QUESTION_RETENTION_DAYS,
+    HISTORY_COMPACTION_INTERVAL_HOURS, HISTORY_COMPACTION_BATCH_SIZE
+)
+from app.metrics import increment
+from utils.logger import log_event
+
+# Archived tables and the columns kept in their archive files
+ARCHIVED_TABLES = {
+    "user_activities": [
+        "id", "user_id", "activity_type", "description", "document_id", "question_id", "extra_data", "created_at"
+    ],
+    "questions": ["id", "document_id", "user_id", "question_text", "answer_text", "created_at"],
+}
+
+MONTH_PATTERN = re.compile(r"^\d{4}-\d{2}$")
+
+# Adds the selected rows to the per-user daily counts; the grouping column
+# is the activity type for activities and empty for questions
+ROLLUP_SQL = {
+    "user_activities": (
+        "INSERT INTO user_daily_rollups (user_id, day, source, activity_type, count) "
+        "SELECT user_id, COALESCE(date(created_at), 'undated'), 'user_activities', COALESCE(activity_type, ''), COUNT(*) "
+        "FROM user_activities WHERE {where} GROUP BY 1, 2, 4 "
+        "ON CONFLICT (user_id, day, source, activity_type) DO UPDATE SET count = count + excluded.count"
+    ),
+    "questions": (
+        "INSERT INTO user_daily_rollups (user_id, day, source, activity_type, count) "
+        "SELECT user_id, COALESCE(date(created_at), 'undated'), 'questions', '', COUNT(*) "
+        "FROM questions WHERE {where} GROUP BY 1, 2 "
+        "ON CONFLICT (user_id, day, source, activity_type) DO UPDATE SET count = count + excluded.count"
+    ),
+}
+
+def archive_path(table: str, month: str) -> str:
+    """
+    Path of the archive file of a table for a month
+
+    Raises:
+        ValueError: If the table is not archived or the month is not YYYY-MM
+    """
+    if table not in ARCHIVED_TABLES or not (MONTH_PATTERN.match(month) or month == "undated"):
+        raise ValueError(f"No archive for {table} {month}")
+    return os.path.join(ARCHIVE_FOLDER, table, f"{month}.jsonl.gz")
+
+def append_to_archive(table: str, rows: List[Dict[str, Any]]) -> None:
+    """
+    Append rows to the monthly archive files of a table
+
+    Each call adds a gzip member to the end of the file, so archived data is
+    never rewritten. Files are synced before returning, so the rows can then
+    be deleted from the database.
+    """
+    by_month: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        month = str(row["created_at"])[:7] if row["created_at"] else "undated"
+        by_month.setdefault(month, []).append(row)
+
+    for month, month_rows in by_month.items():
+        path = archive_path(table, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = "".join(json.dumps(row, default=str) + "\n" for row in month_rows)
+        with open(path, "ab") as f:
+            f.write(gzip.compress(payload.encode("utf-8")))
+            f.flush()
+            os.fsync(f.fileno())
+
+def read_archive(table: str, month: str, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Read the archived rows of a table for a month
+
+    Args:
+        table: Archived table name
+        month: Month as YYYY-MM
+        user_id: Optional user ID to filter by
+
+    Returns:
+        Rows in ID order; rows archived twice (by a compaction run that failed
+        after archiving) are returned once
+    """
+    path = archive_path(table, month)
+    if not os.path.exists(path):
+        return []
+
+    rows = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if user_id is None or row["user_id"] == user_id:
+                rows[row["id"]] = row
+
+    return [rows[row_id] for row_id in sorted(rows)]
+
+def _compact_table(db: Session, table: str, cutoff: str, batch_size: int) -> int:
+    # Rows are visited in ID order, which follows creation order, so the scan
+    # stops at the first row inside the retention window instead of reading
+    # the whole table
+    select_sql = text(
+        f"SELECT {', '.join(ARCHIVED_TABLES[table])} FROM {table} WHERE id > :after ORDER BY id LIMIT :limit"
+    )
+    compacted = 0
+    after = 0
+
+    while True:
+        rows = [dict(row._mapping) for row in db.execute(select_sql, {"after": after, "limit": batch_size})]
+        if not rows:
+            break
+
+        old = []
+        for row in rows:
+            if row["created_at"] is not None and str(row["created_at"]) >= cutoff:
+                break
+            old.append(row)
+
+        if old:
+            bounds = {"first": old[0]["id"], "last": old[-1]["id"]}
+
+            # Deleting a question cascades to its activities; archive the ones
+            # still in the live table with it rather than lose them
+            dependents = []
+            if table == "questions":
+                dependents = [dict(row._mapping) for row in db.execute(text(
+                    f"SELECT {', '.join(ARCHIVED_TABLES['user_activities'])} FROM user_activities "
+                    "WHERE question_id BETWEEN :first AND :last"
+                ), bounds)]
+                if dependents:
+                    append_to_archive("user_activities", dependents)
+            append_to_archive(table, old)
+
+            if dependents:
+                selected = {"ids": [row["id"] for row in dependents]}
+                where = "id IN :ids"
+                db.execute(
+                    text(ROLLUP_SQL["user_activities"].format(where=where)).bindparams(bindparam("ids", expanding=True)),
+                    selected
+                )
+                db.execute(
+                    text(f"DELETE FROM user_activities WHERE {where}").bindparams(bindparam("ids", expanding=True)),
+                    selected
+                )
+            db.execute(text(ROLLUP_SQL[table].format(where="id BETWEEN :first AND :last")), bounds)
+            db.execute(text(f"DELETE FROM {table} WHERE id BETWEEN :first AND :last"), bounds)
+            db.commit()
+            compacted += len(old)
+            if dependents:
+                increment("history.dependent_activities_archived", len(dependents))
+
+        if len(old) < len(rows):
+            break
+        after = rows[-1]["id"]
+
+    return compacted
+
+def compact_history(
+    db: Session,
+    now: Optional[datetime] = None,
+    batch_size: int = HISTORY_COMPACTION_BATCH_SIZE
+) -> Dict[str, int]:
+    """
+    Move activities and questions older than their retention to the archive
+
+    Archived rows are counted in user_daily_rollups and deleted, so the live
+    tables only hold the retention window.
+
+    Args:
+        db: Database session
+        now: Current UTC time, for testing
+        batch_size: Rows archived per transaction
+
+    Returns:
+        Number of rows archived per table
+    """
+    # Stored timestamps are UTC (CURRENT_TIMESTAMP)
+    now = now or datetime.now(timezone.utc)
+    # Questions are kept at least as long as activities, since deleting a
+    # question cascades to its activities; any still live are archived with it
+    retention = {
+        "user_activities": ACTIVITY_RETENTION_DAYS,
+        "questions": max(QUESTION_RETENTION_DAYS, ACTIVITY_RETENTION_DAYS),
+    }
+
+    result = {}
+    for table, days in retention.items():
+        cutoff = (now - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            result[table] = _compact_table(db, table, cutoff, batch_size)
+        except Exception as e:
+            db.rollback()
+            log_event(f"Error compacting {table}: {e}", "error")
+            raise e
+
+        increment(f"history.{table}_archived", result[table])
+
+    log_event(f"History compaction archived {result}", "info")
+    return result
+
+class HistoryCompactor:
+    """
+    Background thread running compact_history periodically
+
+    Runs once shortly after start, then every interval; a zero interval
+    disables it (compaction can still be run with tools/compact_history.py).
+    """
+
+    def __init__(self, interval_hours: float = HISTORY_COMPACTION_INTERVAL_HOURS, initial_delay_seconds: float = 60.0):
+        self.interval = interval_hours * 3600
+        self.initial_delay = initial_delay_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the compaction thread"""
+        if self.running or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="history-compactor", daemon=True)
+        self._thread.start()
+        log_event(f"History compactor started (every {self.interval / 3600:g}h)", "info")
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Stop the compaction thread; a running batch is finished first"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        log_event("History compactor stopped", "info")
+
+    def _run(self) -> None:
+        delay = self.initial_delay
+        while not self._stop.wait(delay):
+            db = SessionLocal()
+            try:
+                compact_history(db)
+            except Exception:
+                # Logged by compact_history; retried on the next run
+                pass
+            finally:
+                db.close()
+            delay = self.interval
+
+# Shared compactor, started and stopped with the app
+history_compactor = HistoryCompactor()
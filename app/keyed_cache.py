@@ -0,0 +1,75 @@
+# app/keyed_cache.py
+from typing import Any, Dict, Iterable
+from sqlalchemy.orm import Session
+
+from utils.logger import log_event
+
+# Keep IN (...) lists below SQLite's bound-parameter limit
+LOOKUP_BATCH_SIZE = 500
+
+def get_cached_values(db: Session, model, column: str, keys: Iterable[str], name: str) -> Dict[str, Any]:
+    """
+    Look up entries of a cache table keyed by a string key column
+
+    Args:
+        db: Database session
+        model: Cache table model, with a key column
+        column: Name of the value column
+        keys: Cache keys
+        name: Cache name used in log messages
+
+    Returns:
+        Dictionary of key -> value for the keys found
+    """
+    try:
+        keys = list(dict.fromkeys(keys))
+        value_column = getattr(model, column)
+        result = {}
+
+        for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            batch = keys[i:i + LOOKUP_BATCH_SIZE]
+            rows = db.query(model.key, value_column)\
+                .filter(model.key.in_(batch))\
+                .all()
+            result.update(dict(rows))
+
+        return result
+
+    except Exception as e:
+        log_event(f"Error reading {name} cache: {e}", "error")
+        return {}
+
+def store_cached_values(db: Session, model, column: str, entries: Dict[str, Any], name: str) -> int:
+    """
+    Store new entries in a cache table keyed by a string key column
+
+    Args:
+        db: Database session
+        model: Cache table model, with a key column
+        column: Name of the value column
+        entries: Dictionary of key -> value
+        name: Cache name used in log messages
+
+    Returns:
+        Number of entries stored
+    """
+    if not entries:
+        return 0
+
+    try:
+        # Another worker may have cached the same input in the meantime
+        existing = get_cached_values(db, model, column, entries.keys(), name)
+        new_entries = [
+            model(key=key, **{column: value})
+            for key, value in entries.items()
+            if key not in existing
+        ]
+
+        db.add_all(new_entries)
+        db.commit()
+        return len(new_entries)
+
+    except Exception as e:
+        log_event(f"Error writing {name} cache: {e}", "error")
+        db.rollback()
+        return 0
@@ -0,0 +1,200 @@
+# app/llm_client.py
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+import openai
+
+from app.config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, LLM_TIMEOUT_SECONDS, LLM_MAX_RETRIES,
+    LLM_MAX_CONCURRENCY, LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS
+)
+from app.metrics import increment
+from utils.logger import log_event
+
+# Base delay of the exponential retry backoff, in seconds
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+_sync_client: Optional[openai.OpenAI] = None
+_async_client: Optional[openai.AsyncOpenAI] = None
+_client_lock = threading.Lock()
+
+# Request handlers and background workers each get LLM_MAX_CONCURRENCY in-flight calls
+_sync_semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_async_semaphore: Optional[asyncio.Semaphore] = None
+
+def _connection_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=30
+    )
+
+def get_sync_client() -> openai.OpenAI:
+    """Get the shared synchronous OpenAI client, used by background workers"""
+    global _sync_client
+    with _client_lock:
+        if _sync_client is None:
+            _sync_client = openai.OpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=OPENAI_BASE_URL,
+                timeout=LLM_TIMEOUT_SECONDS,
+                max_retries=0,  # Retries are handled here, with jitter
+                http_client=httpx.Client(limits=_connection_limits())
+            )
+        return _sync_client
+
+def get_async_client() -> openai.AsyncOpenAI:
+    """Get the shared asynchronous OpenAI client, used by request handlers"""
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            _async_client = openai.AsyncOpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=OPENAI_BASE_URL,
+                timeout=LLM_TIMEOUT_SECONDS,
+                max_retries=0,  # Retries are handled here, with jitter
+                http_client=httpx.AsyncClient(limits=_connection_limits())
+            )
+        return _async_client
+
+def _get_async_semaphore() -> asyncio.Semaphore:
+    global _async_semaphore
+    if _async_semaphore is None:
+        _async_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _async_semaphore
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed call should be retried (rate limits, server errors, timeouts)"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+def retry_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff delay for a retry attempt"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+def _call_with_retries(call, *args, **kwargs) -> Any:
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            with _sync_semaphore:
+                return call(*args, **kwargs)
+        except Exception as e:
+            if attempt == LLM_MAX_RETRIES or not is_retryable(e):
+                increment("llm.errors")
+                raise
+            increment("llm.retries")
+            delay = retry_delay(attempt)
+            log_event(f"OpenAI call failed ({e}), retrying in {delay:.2f}s", "warning")
+            time.sleep(delay)
+
+async def _acall_with_retries(call, *args, **kwargs) -> Any:
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            async with _get_async_semaphore():
+                return await call(*args, **kwargs)
+        except Exception as e:
+            if attempt == LLM_MAX_RETRIES or not is_retryable(e):
+                increment("llm.errors")
+                raise
+            increment("llm.retries")
+            delay = retry_delay(attempt)
+            log_event(f"OpenAI call failed ({e}), retrying in {delay:.2f}s", "warning")
+            await asyncio.sleep(delay)
+
+def create_chat_completion(timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    Create a chat completion with the shared client, retrying transient errors
+
+    Args:
+        timeout: Optional per-call timeout in seconds
+        **kwargs: Arguments for chat.completions.create
+
+    Returns:
+        The chat completion response
+    """
+    client = get_sync_client()
+    if timeout is not None:
+        client = client.with_options(timeout=timeout)
+    return _call_with_retries(client.chat.completions.create, **kwargs)
+
+def create_embedding(timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    Create embeddings with the shared client, retrying transient errors
+
+    Args:
+        timeout: Optional per-call timeout in seconds
+        **kwargs: Arguments for embeddings.create
+
+    Returns:
+        The embeddings response
+    """
+    client = get_sync_client()
+    if timeout is not None:
+        client = client.with_options(timeout=timeout)
+    return _call_with_retries(client.embeddings.create, **kwargs)
+
+async def acreate_chat_completion(timeout: Optional[float] = None, **kwargs) -> Any:
+    """Async version of create_chat_completion"""
+    client = get_async_client()
+    if timeout is not None:
+        client = client.with_options(timeout=timeout)
+    return await _acall_with_retries(client.chat.completions.create, **kwargs)
+
+async def acreate_embedding(timeout: Optional[float] = None, **kwargs) -> Any:
+    """Async version of create_embedding"""
+    client = get_async_client()
+    if timeout is not None:
+        client = client.with_options(timeout=timeout)
+    return await _acall_with_retries(client.embeddings.create, **kwargs)
+
+@asynccontextmanager
+async def astream_chat_completion(timeout: Optional[float] = None, **kwargs) -> AsyncIterator[Any]:
+    """
+    Open a streaming chat completion, holding a concurrency slot until it is closed
+
+    Only opening the stream is retried; once tokens flow, errors are raised to the caller.
+    Leaving the context closes the response, which aborts generation upstream.
+
+    Args:
+        timeout: Optional per-call timeout in seconds
+        **kwargs: Arguments for chat.completions.create (stream=True is added)
+    """
+    client = get_async_client()
+    if timeout is not None:
+        client = client.with_options(timeout=timeout)
+
+    async with _get_async_semaphore():
+        stream = None
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                stream = await client.chat.completions.create(stream=True, **kwargs)
+                break
+            except Exception as e:
+                if attempt == LLM_MAX_RETRIES or not is_retryable(e):
+                    increment("llm.errors")
+                    raise
+                increment("llm.retries")
+                await asyncio.sleep(retry_delay(attempt))
+
+        try:
+            yield stream
+        finally:
+            await stream.close()
+
+async def close_clients() -> None:
+    """Close the pooled connections of the shared clients"""
+    global _sync_client, _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
@@ -1,12 +1,14 @@
 # main.py — FastAPI entry point with integrated HTML UI
 from fastapi import FastAPI, Request, UploadFile, File, Form, BackgroundTasks, HTTPException, Depends
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import uvicorn
+import asyncio
 import os
 import uuid
 import time
@@ -15,18 +17,34 @@ import json
 
 from app.ingestion import extract_text, chunk_text
 from app.embeddings import build_faiss_index, load_faiss_index
-from app.qa_engine import answer_question, summarize_document
-from app.ner_extraction import extract_entities, categorize_legal_entities
-from app.config import ALLOWED_EXTENSIONS, MAX_FREE_CHATS
-from app.database import get_db, User, Question, UserPayment # Added UserPayment import
-from app.auth import get_current_active_user, Token, is_admin
+from app.embeddings import aget_openai_embedding, search_similar_chunk_ids
+from app.extractive import extractive_answer
+from app.qa_engine import agenerate_answer, answer_question_stream, summarize_document, precompute_answers
+from app.llm_client import close_clients
+from app.answer_cache import (
+    find_exact_answer, find_similar_answer, store_cached_answer, invalidate_document_answers
+)
+from app.conversation import prepare_conversation_turn
+from app.precomputed_answers import find_precomputed_answer, store_precomputed_answers, delete_precomputed_answers
+from app.ner_extraction import extract_entities, aggregate_legal_entities
+from app.config import (
+    ALLOWED_EXTENSIONS, MAX_FREE_CHATS, PRECOMPUTE_ANSWERS_ENABLED, STANDARD_QUESTIONS, QA_ANSWER_TIMEOUT_SECONDS,
+    PAGE_SIZE_DEFAULT, ACTIVITY_WRITE_BEHIND_ENABLED
+)
+from app.database import get_async_db, SessionLocal, AsyncSessionLocal
+from app.auth import get_current_active_user, Principal, Token, is_admin, shutdown_password_hashing
+from app.metrics import increment, get_metrics
+from app.user_counters import aget_question_quota
+from app.activity_writer import activity_writer
+from app.artifact_reaper import artifact_reaper
+from app.history_archive import history_compactor
+from app.pagination import clamp_page_size
 from app.auth_routes import router as auth_router
 from app.profile_routes import router as profile_router
 from app.repository import (
-    create_document, update_document_status, store_document_entities,
-    get_document, get_document_entities, get_user_documents,
-    delete_document as repo_delete_document,
-    store_question_answer, get_document_questions
+    update_document_status, store_document_entities,
+    acreate_document, aget_document, aget_document_entity_counts, aget_user_documents,
+    adelete_document, astore_question_answer, aget_document_questions, asearch_entity_index
 )
 from utils.logger import log_event
 
@@ -52,6 +70,47 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Set up Jinja2 templates
 templates = Jinja2Templates(directory="templates")
 
+@app.on_event("startup")
+async def start_activity_writer():
+    """Start the background writer that batches activity log inserts"""
+    if ACTIVITY_WRITE_BEHIND_ENABLED:
+        activity_writer.start()
+
+@app.on_event("shutdown")
+async def shutdown_llm_clients():
+    """Close pooled OpenAI connections on shutdown"""
+    await close_clients()
+
+@app.on_event("shutdown")
+async def stop_activity_writer():
+    """Write queued activities before exiting"""
+    await asyncio.to_thread(activity_writer.stop)
+
+@app.on_event("startup")
+async def start_artifact_reaper():
+    """Start the background remover of deleted documents' files"""
+    artifact_reaper.start()
+
+@app.on_event("shutdown")
+async def stop_artifact_reaper():
+    """Remove queued files before exiting"""
+    await asyncio.to_thread(artifact_reaper.stop)
+
+@app.on_event("shutdown")
+async def stop_password_hashing():
+    """Stop the password hashing threads"""
+    shutdown_password_hashing()
+
+@app.on_event("startup")
+async def start_history_compactor():
+    """Start the periodic archival of old activities and questions"""
+    history_compactor.start()
+
+@app.on_event("shutdown")
+async def stop_history_compactor():
+    """Let a running compaction batch finish before exiting"""
+    await asyncio.to_thread(history_compactor.stop)
+
 # Include authentication routes
 app.include_router(auth_router)
 
@@ -63,8 +122,8 @@ app.include_router(profile_router)
 async def upload_document(
     background_tasks: BackgroundTasks, 
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload a legal document and process it in the background
@@ -95,7 +154,7 @@ async def upload_document(
             f.write(file_content)
 
         # Create document record in database
-        document = create_document(
+        document = await acreate_document(
             db=db,
             user_id=current_user.id,
             filename=file.filename,
@@ -105,7 +164,7 @@ async def upload_document(
         )
 
         # Process document in background
-        background_tasks.add_task(process_document, document.id, file_path, db)
+        background_tasks.add_task(process_document, document.id, file_path)
 
         return {"document_id": document.id, "status": "processing"}
 
@@ -113,7 +172,7 @@ async def upload_document(
         log_event(f"Error uploading document: {e}", "error")
         raise HTTPException(status_code=500, detail=str(e))
 
-def process_document(document_id: str, file_path: str, db: Session):
+def process_document(document_id: str, file_path: str):
     """
     Process a document in the background
     - Extract text
@@ -121,8 +180,21 @@ def process_document(document_id: str, file_path: str, db: Session):
     - Build embeddings
     - Extract entities
     - Generate summary
+    - Optionally precompute answers to standard questions
     """
+    # Runs in a worker thread after the response is sent, so it uses its own sync session
+    db = SessionLocal()
+    try:
+        _process_document(document_id, file_path, db)
+    finally:
+        db.close()
+
+def _process_document(document_id: str, file_path: str, db: Session):
     try:
+        # Answers cached or precomputed for an earlier version of the document are stale
+        if invalidate_document_answers(db, document_id) + delete_precomputed_answers(db, document_id):
+            db.commit()
+
         # Update status to extracting text
         update_document_status(db, document_id, "extracting_text")
 
@@ -144,9 +216,10 @@ def process_document(document_id: str, file_path: str, db: Session):
         # Update status to extracting entities
         update_document_status(db, document_id, "extracting_entities")
 
-        # Extract entities
-        entities = extract_entities(text)
-        categorized_entities = categorize_legal_entities(entities)
+        # Extract entities, reusing cached results for previously seen segments
+        ner_stats = {}
+        entities = extract_entities(text, db=db, stats=ner_stats)
+        categorized_entities = aggregate_legal_entities(entities)
 
         # Store entities in database
         store_document_entities(db, document_id, categorized_entities)
@@ -155,30 +228,41 @@ def process_document(document_id: str, file_path: str, db: Session):
         update_document_status(db, document_id, "generating_summary")
 
         # Generate summary
-        summary = summarize_document(chunks)
+        summary = summarize_document(chunks, db=db)
 
         # Mark as complete with summary
         update_document_status(db, document_id, "complete", summary)
 
-        log_event(f"Document {document_id} processed successfully", "info")
+        increment("ingestion.documents_processed")
+        log_event(f"Document {document_id} processed successfully (NER: {ner_stats})", "info")
 
     except Exception as e:
+        increment("ingestion.documents_failed")
         log_event(f"Error processing document {document_id}: {e}", "error")
         # Update status to error
         update_document_status(db, document_id, "error")
+        return
+
+    # The document is usable already; answer the usual first questions in the background
+    if PRECOMPUTE_ANSWERS_ENABLED:
+        try:
+            answers = precompute_answers(STANDARD_QUESTIONS, index, chunks)
+            store_precomputed_answers(db, document_id, answers)
+        except Exception as e:
+            log_event(f"Error precomputing answers for document {document_id}: {e}", "warning")
 
 @app.get("/api/document/{document_id}/status")
 async def document_status(
     document_id: str,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Check the processing status of a document
     """
     try:
         # Get document with ownership check
-        document = get_document(db, document_id, current_user.id)
+        document = await aget_document(db, document_id, current_user.id)
 
         return {"document_id": document_id, "status": document.status}
 
@@ -189,8 +273,8 @@ async def document_status(
 @app.get("/api/document/{document_id}/analysis")
 async def document_analysis(
     document_id: str,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get the analysis of a processed document
@@ -199,7 +283,7 @@ async def document_analysis(
     """
     try:
         # Get document with ownership check
-        document = get_document(db, document_id, current_user.id)
+        document = await aget_document(db, document_id, current_user.id)
 
         # Check for error status
         if document.status == "error":
@@ -212,18 +296,21 @@ async def document_analysis(
                 "status": document.status,
                 "filename": document.original_filename,
                 "summary": "",
-                "entities": {}
+                "entities": {},
+                "entity_counts": {}
             }
 
-        # Get entities
-        entities = get_document_entities(db, document_id)
+        # Get entities with mention counts
+        entity_counts = await aget_document_entity_counts(db, document_id)
+        entities = {category: list(counts.keys()) for category, counts in entity_counts.items()}
 
         return {
             "document_id": document_id,
             "status": "complete",
             "filename": document.original_filename,
             "summary": document.summary or "",
-            "entities": entities
+            "entities": entities,
+            "entity_counts": entity_counts
         }
 
     except HTTPException:
@@ -234,67 +321,183 @@ async def document_analysis(
         log_event(f"Error getting document analysis: {e}", "error")
         raise HTTPException(status_code=500, detail=str(e))
 
-from app.config import MAX_FREE_CHATS
+async def check_question_allowed(db: AsyncSession, current_user: Principal, document_id: str, question: str):
+    """
+    Validate a question request and check the user's chat limit
+    
+    Returns:
+        The document being asked about
+        
+    Raises:
+        HTTPException: If the question is invalid, the limit is reached or the document is not ready
+    """
+    if not question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+        
+    if len(question) > 500:
+        raise HTTPException(status_code=400, detail="Question is too long (max 500 characters)")
+    # Premium users have no limit; for others re-check premium with the count,
+    # so a payment made since the principal was cached counts at once
+    if not current_user.is_premium:
+        chat_count, is_premium = await aget_question_quota(db, current_user.id)
+    else:
+        chat_count, is_premium = 0, True
+
+    if chat_count >= MAX_FREE_CHATS and not is_premium:
+        raise HTTPException(
+            status_code=402,
+            detail={
+                "message": "You have reached the free chat limit. Please upgrade to continue.",
+                "upgrade_url": "/upgrade"
+            }
+        )
+
+    # Get document with ownership check
+    document = await aget_document(db, document_id, current_user.id)
+
+    # Check for incomplete processing
+    if document.status != "complete":
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Document processing is not complete. Current status: {document.status}"
+        )
+
+    return document
+
+async def lookup_cached_answer(db: AsyncSession, document_id: str, question: str):
+    """
+    Look up a question in the exact answer cache, the precomputed standard
+    answers, then the semantic answer cache
+    
+    Returns:
+        Tuple of (answer, cache tier, question embedding); answer and tier are None on a miss.
+        The embedding is computed for the semantic tiers and reused for retrieval.
+    """
+    answer = await db.run_sync(find_exact_answer, document_id, question)
+    if answer is not None:
+        return answer, "exact", None
+
+    answer = await db.run_sync(find_precomputed_answer, document_id, question)
+    if answer is not None:
+        return answer, "precomputed", None
+
+    try:
+        query_embedding = await aget_openai_embedding(question)
+    except Exception:
+        # Retrieval will report the embedding failure
+        return None, None, None
+
+    answer = await db.run_sync(find_precomputed_answer, document_id, question, query_embedding)
+    if answer is not None:
+        return answer, "precomputed", query_embedding
+
+    answer = await db.run_sync(find_similar_answer, document_id, query_embedding)
+    if answer is not None:
+        return answer, "semantic", query_embedding
+
+    return None, None, query_embedding
+
+def build_extractive_answer(query: str, index, chunks: List[str], query_embedding: Optional[List[float]]) -> Optional[str]:
+    """
+    Quote the most relevant sentences of the document, without calling the LLM
+    
+    Chunks come from the vector index when the question embedding is available,
+    otherwise they are picked lexically so this works with the provider down.
+    """
+    ranked = None
+    if query_embedding is not None:
+        try:
+            ranked = search_similar_chunk_ids(query, index, len(chunks), 5, query_embedding)
+        except Exception as e:
+            log_event(f"Error retrieving chunks for extractive answer: {e}", "warning")
+    return extractive_answer(query, chunks, ranked)
+
+async def extractive_result(task: "asyncio.Task[Optional[str]]") -> Optional[str]:
+    """Wait for an extractive answer built in the background; None if it failed"""
+    try:
+        return await task
+    except Exception as e:
+        log_event(f"Error building extractive answer: {e}", "warning")
+        return None
 
 @app.post("/api/ask/")
 async def ask_question(
     document_id: str = Form(...), 
     question: str = Form(...),
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    conversation: bool = Form(False),
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Answer a question about a document using RAG
-    """
-    """
-    Answer a question about a document using RAG
+    - with conversation=true, follow-ups are answered in the context of earlier questions
+    - if generation fails or times out, the most relevant passages are returned instead (degraded=true)
     """
     try:
-        if not question.strip():
-            raise HTTPException(status_code=400, detail="Question cannot be empty")
-            
-        if len(question) > 500:
-            raise HTTPException(status_code=400, detail="Question is too long (max 500 characters)")
-        # Check chat limit
-        chat_count = db.query(Question).filter(
-            Question.user_id == current_user.id
-        ).count()
-
-        # Check user's premium status through UserPayment
-        user_payment = db.query(UserPayment).filter(
-            UserPayment.user_id == current_user.id,
-            UserPayment.is_premium == True
-        ).first()
-
-        if chat_count >= MAX_FREE_CHATS and not user_payment:
-            raise HTTPException(
-                status_code=402,
-                detail={
-                    "message": "You have reached the free chat limit. Please upgrade to continue.",
-                    "upgrade_url": "/upgrade"
-                }
+        await check_question_allowed(db, current_user, document_id, question)
+
+        # Follow-ups are rewritten into standalone questions for retrieval and caching
+        query, history = question, None
+        if conversation:
+            query, history = await prepare_conversation_turn(db, document_id, current_user.id, question)
+
+        # Serve repeated or near-identical questions from the answer cache
+        answer, cache_tier, query_embedding = await lookup_cached_answer(db, document_id, query)
+        prompt_stats = {"prompt_tokens": 0}
+        degraded = False
+
+        if answer is None:
+            # Load the index and chunks off the event loop
+            index, chunks = await asyncio.to_thread(load_faiss_index, document_id)
+
+            # Quote the document in a thread while the answer is generated, so
+            # the fallback is ready as soon as generation fails or times out
+            extractive_task = asyncio.create_task(
+                asyncio.to_thread(build_extractive_answer, query, index, chunks, query_embedding)
             )
 
-        # Get document with ownership check
-        document = get_document(db, document_id, current_user.id)
-
-        # Check for incomplete processing
-        if document.status != "complete":
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Document processing is not complete. Current status: {document.status}"
-            )
-
-        # Load the index and chunks
-        index, chunks = load_faiss_index(document_id)
-
-        # Answer the question
-        answer = answer_question(question, index, chunks)
+            # Answer the question
+            generation_error = None
+            try:
+                answer = await asyncio.wait_for(
+                    agenerate_answer(
+                        query, index, chunks, query_embedding=query_embedding, stats=prompt_stats, history=history
+                    ),
+                    timeout=QA_ANSWER_TIMEOUT_SECONDS
+                )
+            except Exception as e:
+                log_event(f"Error answering question: {e!r}", "error")
+                generation_error = e
+
+            if generation_error is None:
+                extractive_task.cancel()
+                # An answer that drew on the conversation is not a standalone answer to the query
+                if history is None:
+                    try:
+                        await db.run_sync(store_cached_answer, document_id, query, answer, query_embedding)
+                    except Exception as e:
+                        # The answer is good; only caching it failed
+                        log_event(f"Error caching answer: {e}", "warning")
+                        await db.rollback()
+            else:
+                # Fall back to quoting the document rather than returning an error
+                answer = await extractive_result(extractive_task)
+                degraded = answer is not None
+                if answer is None:
+                    answer = f"I encountered an error while trying to answer your question: {str(generation_error)}"
+                increment("qa.degraded_answers" if degraded else "qa.failed_answers")
 
         # Store question and answer in database
-        store_question_answer(db, document_id, current_user.id, question, answer)
+        await astore_question_answer(db, document_id, current_user.id, question, answer)
 
-        return {"answer": answer}
+        return {
+            "answer": answer,
+            "standalone_question": query if conversation else None,
+            "cached": cache_tier is not None,
+            "cache_tier": cache_tier,
+            "degraded": degraded,
+            "prompt_tokens": prompt_stats["prompt_tokens"]
+        }
 
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -304,18 +507,175 @@ async def ask_question(
         log_event(f"Error answering question: {e}", "error")
         raise HTTPException(status_code=500, detail=str(e))
 
+def format_sse(data: Dict, event: Optional[str] = None) -> str:
+    """Format a server-sent event"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+@app.post("/api/ask/stream")
+async def ask_question_stream(
+    request: Request,
+    document_id: str = Form(...),
+    question: str = Form(...),
+    conversation: bool = Form(False),
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Answer a question about a document using RAG, streaming the answer as server-sent events
+    - an "extractive" event carries the most relevant passages, quoted from the document, if
+      they are found before the first token
+    - data events carry {"token": ...} as the answer is generated
+    - a final "done" event carries the full answer once it has been stored; if generation
+      fails, it carries the extractive answer instead, with degraded=true
+    - an "error" event is sent if generation fails and there is no extractive answer
+    - with conversation=true, follow-ups are answered in the context of earlier questions
+    """
+    await check_question_allowed(db, current_user, document_id, question)
+
+    # Follow-ups are rewritten into standalone questions for retrieval and caching
+    query, history = question, None
+    if conversation:
+        query, history = await prepare_conversation_turn(db, document_id, current_user.id, question)
+
+    # Serve repeated or near-identical questions from the answer cache
+    cached_answer, cache_tier, query_embedding = await lookup_cached_answer(db, document_id, query)
+
+    # Load the index and chunks off the event loop
+    index, chunks = None, None
+    if cached_answer is None:
+        try:
+            index, chunks = await asyncio.to_thread(load_faiss_index, document_id)
+        except Exception as e:
+            log_event(f"Error answering question: {e}", "error")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    user_id = current_user.id
+
+    async def event_stream():
+        if cached_answer is not None:
+            async with AsyncSessionLocal() as stream_db:
+                question_record = await astore_question_answer(stream_db, document_id, user_id, question, cached_answer)
+                yield format_sse({"token": cached_answer})
+                yield format_sse({
+                    "answer": cached_answer,
+                    "question_id": question_record.id,
+                    "cached": True,
+                    "cache_tier": cache_tier,
+                    "degraded": False,
+                    "prompt_tokens": 0
+                }, "done")
+            return
+
+        # Quote the most relevant passages in a thread while generation starts;
+        # they are shown if they are ready before the first token
+        extractive_task = asyncio.create_task(
+            asyncio.to_thread(build_extractive_answer, query, index, chunks, query_embedding)
+        )
+        instant_answer = None
+        extractive_checked = False
+
+        prompt_stats = {"prompt_tokens": 0}
+        tokens = answer_question_stream(
+            query, index, chunks, query_embedding=query_embedding, stats=prompt_stats, history=history
+        )
+        next_token = None
+        answer_parts = []
+        completed = False
+        degraded = False
+
+        try:
+            while True:
+                if next_token is None:
+                    next_token = asyncio.ensure_future(tokens.__anext__())
+                waiting = {next_token} if extractive_checked else {next_token, extractive_task}
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+                if not extractive_checked and extractive_task in done:
+                    extractive_checked = True
+                    instant_answer = await extractive_result(extractive_task)
+                    if instant_answer is not None and not answer_parts:
+                        yield format_sse({"answer": instant_answer}, "extractive")
+
+                if next_token not in done:
+                    continue
+                try:
+                    token = next_token.result()
+                except StopAsyncIteration:
+                    completed = True
+                    break
+                next_token = None
+
+                if await request.is_disconnected():
+                    log_event(f"Client disconnected while streaming answer for document {document_id}", "info")
+                    break
+                answer_parts.append(token)
+                yield format_sse({"token": token})
+
+        except Exception as e:
+            log_event(f"Error streaming answer: {e}", "error")
+            if not extractive_checked:
+                extractive_checked = True
+                instant_answer = await extractive_result(extractive_task)
+            if instant_answer is None:
+                increment("qa.failed_answers")
+                yield format_sse({"message": f"I encountered an error while trying to answer your question: {str(e)}"}, "error")
+            else:
+                increment("qa.degraded_answers")
+                degraded = True
+
+        finally:
+            if not extractive_checked:
+                extractive_task.cancel()
+            if next_token is not None and not next_token.done():
+                next_token.cancel()
+                await asyncio.gather(next_token, return_exceptions=True)
+            # Closes the upstream response if the loop ended early
+            await tokens.aclose()
+
+        if completed or degraded:
+            answer = "".join(answer_parts) if completed else instant_answer
+
+            # The request session may already be closed, so store with a fresh one
+            async with AsyncSessionLocal() as stream_db:
+                # An answer that drew on the conversation is not a standalone answer to the query
+                if completed and history is None:
+                    try:
+                        await stream_db.run_sync(store_cached_answer, document_id, query, answer, query_embedding)
+                    except Exception as e:
+                        log_event(f"Error caching answer: {e}", "warning")
+                        await stream_db.rollback()
+                question_record = await astore_question_answer(stream_db, document_id, user_id, question, answer)
+                yield format_sse({
+                    "answer": answer,
+                    "question_id": question_record.id,
+                    "cached": False,
+                    "cache_tier": None,
+                    "degraded": degraded,
+                    "prompt_tokens": prompt_stats["prompt_tokens"]
+                }, "done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 @app.get("/api/documents/")
 async def list_documents(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    limit: int = PAGE_SIZE_DEFAULT,
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    List all documents for the current user
+    List the current user's documents, newest first
+    - pass the returned next_cursor as cursor to get the next page; it is null on the last page
     """
     try:
-        # Get documents for current user
-        documents = get_user_documents(db, current_user.id)
+        # Get a page of documents for current user
+        documents, next_cursor = await aget_user_documents(db, current_user.id, clamp_page_size(limit), cursor)
 
         # Format response
         result = []
@@ -328,7 +688,11 @@ async def list_documents(
                 "processed_at": doc.processed_at.isoformat() if doc.processed_at else None
             })
 
-        return {"documents": result}
+        return {"documents": result, "next_cursor": next_cursor}
+
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
 
     except Exception as e:
         log_event(f"Error listing documents: {e}", "error")
@@ -337,22 +701,15 @@ async def list_documents(
 @app.delete("/api/document/{document_id}")
 async def delete_document(
     document_id: str,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Delete a document and its associated data
     """
     try:
-        # Delete document with ownership check
-        repo_delete_document(db, document_id, current_user.id)
-
-        # Delete vector store if it exists
-        vector_store_path = os.path.join("data/vector_store", document_id)
-        if os.path.exists(vector_store_path):
-            for file in os.listdir(vector_store_path):
-                os.remove(os.path.join(vector_store_path, file))
-            os.rmdir(vector_store_path)
+        # Delete document with ownership check; its files are removed in the background
+        await adelete_document(db, document_id, current_user.id)
 
         return {"status": "success", "message": "Document deleted successfully"}
 
@@ -367,18 +724,21 @@ async def delete_document(
 @app.get("/api/document/{document_id}/questions")
 async def document_questions(
     document_id: str,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    limit: int = PAGE_SIZE_DEFAULT,
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get all questions for a document
+    Get the questions asked about a document, newest first
+    - pass the returned next_cursor as cursor to get the next page; it is null on the last page
     """
     try:
         # Get document with ownership check
-        get_document(db, document_id, current_user.id)
+        await aget_document(db, document_id, current_user.id)
 
         # Get questions
-        questions = get_document_questions(db, document_id)
+        questions, next_cursor = await aget_document_questions(db, document_id, clamp_page_size(limit), cursor)
 
         # Format response
         result = []
@@ -390,7 +750,7 @@ async def document_questions(
                 "created_at": q.created_at.isoformat() if q.created_at else None
             })
 
-        return {"questions": result}
+        return {"questions": result, "next_cursor": next_cursor}
 
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -400,6 +760,42 @@ async def document_questions(
         log_event(f"Error getting document questions: {e}", "error")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/entities/search")
+async def search_entities(
+    q: str,
+    mode: str = "exact",
+    category: Optional[str] = None,
+    limit: int = 50,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Find the current user's documents that mention an entity
+    - mode: "exact" or "prefix"
+    """
+    try:
+        if mode not in ("exact", "prefix"):
+            raise HTTPException(status_code=400, detail="Mode must be 'exact' or 'prefix'")
+
+        results = await asearch_entity_index(
+            db,
+            current_user.id,
+            q,
+            prefix=(mode == "prefix"),
+            category=category,
+            limit=max(1, min(limit, 200))
+        )
+
+        return {"query": q, "mode": mode, "entities": results}
+
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+
+    except Exception as e:
+        log_event(f"Error searching entities: {e}", "error")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Web UI Routes
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -440,6 +836,14 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# Service metrics endpoint (admin only)
+@app.get("/api/metrics")
+async def service_metrics(admin: bool = Depends(is_admin)):
+    """
+    Get in-process service metrics such as ingestion and cache counters
+    """
+    return {"metrics": get_metrics()}
+
 # Run the app with Uvicorn if executed directly
 if __name__ == "__main__":
     host = os.getenv("HOST", "0.0.0.0")
@@ -0,0 +1,36 @@
+# app/metrics.py
+import threading
+from typing import Dict, Union
+
+# In-process counters, shared by the request handlers and background workers
+_lock = threading.Lock()
+_counters: Dict[str, Union[int, float]] = {}
+
+def increment(name: str, value: Union[int, float] = 1) -> None:
+    """
+    Increment a named counter
+
+    Args:
+        name: Counter name, dotted by area (e.g. "ingestion.ner_cache_hits")
+        value: Amount to add
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def get_metrics(prefix: str = "") -> Dict[str, Union[int, float]]:
+    """
+    Get a snapshot of the counters
+
+    Args:
+        prefix: Optional prefix to filter counters by
+
+    Returns:
+        Dictionary of counter names and values
+    """
+    with _lock:
+        return {name: value for name, value in sorted(_counters.items()) if name.startswith(prefix)}
+
+def reset_metrics() -> None:
+    """Reset all counters"""
+    with _lock:
+        _counters.clear()
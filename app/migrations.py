@@ -0,0 +1,177 @@
+# app/migrations.py
+import re
+from typing import Callable, Dict, List, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from utils.logger import log_event
+
+# New tables are created by Base.metadata.create_all; migrations bring databases
+# created by earlier versions up to date. Every step must be safe to run on a
+# fresh database too, since create_all has already built the current schema there.
+
+def _column_names(conn: Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))]
+
+def _add_column(conn: Connection, table: str, column: str, definition: str) -> None:
+    if column not in _column_names(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+
+def _add_entity_statistics(conn: Connection) -> None:
+    _add_column(conn, "document_entities", "mention_count", "INTEGER DEFAULT 1")
+    _add_column(conn, "document_entities", "first_offset", "INTEGER")
+
+def _add_query_indexes(conn: Connection) -> None:
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_document_entities_document ON document_entities (document_id, category)",
+        "CREATE INDEX IF NOT EXISTS ix_documents_owner_created ON documents (owner_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_questions_document_user ON questions (document_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_questions_user_created ON questions (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_user_activities_user_created ON user_activities (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_user_activities_user_type_created "
+        "ON user_activities (user_id, activity_type, created_at)",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+    # Give the query planner statistics for the new indexes
+    conn.execute(text("ANALYZE"))
+
+def _add_user_counters(conn: Connection) -> None:
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_user_payments_user ON user_payments (user_id)"))
+    # create_all has made the table; backfill it for users of earlier versions
+    conn.execute(text(
+        "INSERT OR REPLACE INTO user_counters (user_id, documents, questions, uploads, questions_asked) "
+        "SELECT users.id, "
+        "(SELECT COUNT(*) FROM documents WHERE documents.owner_id = users.id), "
+        "(SELECT COUNT(*) FROM questions WHERE questions.user_id = users.id), "
+        "(SELECT COUNT(*) FROM user_activities WHERE user_activities.user_id = users.id "
+        "AND user_activities.activity_type = 'document_upload'), "
+        "(SELECT COUNT(*) FROM user_activities WHERE user_activities.user_id = users.id "
+        "AND user_activities.activity_type = 'question') "
+        "FROM users"
+    ))
+
+def _add_question_page_index(conn: Connection) -> None:
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_questions_document_id ON questions (document_id, id)"))
+
+# Child columns that cascade when their parent row is deleted, by table
+CASCADING_FOREIGN_KEYS: Dict[str, List[str]] = {
+    "document_entities": ["document_id"],
+    "entity_index": ["document_id"],
+    "questions": ["document_id"],
+    "answer_cache": ["document_id"],
+    "conversation_states": ["document_id"],
+    "precomputed_answers": ["document_id"],
+    "user_activities": ["document_id", "question_id"],
+}
+
+# Rows derived from a user, removed with the user
+USER_CASCADING_FOREIGN_KEYS: Dict[str, List[str]] = {
+    "entity_index": ["owner_id"],
+    "conversation_states": ["user_id"],
+    "user_counters": ["user_id"],
+    "user_daily_rollups": ["user_id"],
+}
+
+FOREIGN_KEY_PATTERN = re.compile(
+    r'(FOREIGN KEY\s*\(\s*"?(\w+)"?\s*\)\s*REFERENCES\s+"?\w+"?\s*\(\s*"?\w+"?\s*\))(?!\s*ON DELETE)',
+    re.IGNORECASE
+)
+
+def _rebuild_with_cascade(conn: Connection, table: str, columns: List[str]) -> None:
+    # SQLite cannot alter a constraint, so the table is recreated from its own
+    # definition with ON DELETE CASCADE added, then the rows and indexes restored
+    create_sql = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :table"), {"table": table}
+    ).scalar()
+    if create_sql is None:
+        return
+
+    cascading_sql = FOREIGN_KEY_PATTERN.sub(
+        lambda match: match.group(1) + " ON DELETE CASCADE" if match.group(2) in columns else match.group(0),
+        create_sql
+    )
+    if cascading_sql == create_sql:
+        return
+
+    staging = f"_rebuild_{table}"
+    index_sqls = [row[0] for row in conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"),
+        {"table": table}
+    )]
+
+    conn.execute(text(re.sub(
+        r'^(CREATE TABLE\s+)"?' + table + r'"?', lambda match: match.group(1) + staging, cascading_sql, count=1
+    )))
+    conn.execute(text(f"INSERT INTO {staging} SELECT * FROM {table}"))
+    conn.execute(text(f"DROP TABLE {table}"))
+    conn.execute(text(f"ALTER TABLE {staging} RENAME TO {table}"))
+    for index_sql in index_sqls:
+        conn.execute(text(index_sql))
+
+def _add_cascading_deletes(conn: Connection) -> None:
+    for table, columns in CASCADING_FOREIGN_KEYS.items():
+        _rebuild_with_cascade(conn, table, columns)
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_user_activities_document ON user_activities (document_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_user_activities_question ON user_activities (question_id)"))
+
+def _add_user_cascading_deletes(conn: Connection) -> None:
+    for table, columns in USER_CASCADING_FOREIGN_KEYS.items():
+        _rebuild_with_cascade(conn, table, columns)
+
+def _activity_times_to_utc(conn: Connection) -> None:
+    # Activities were stamped with the server's local time by Python, unlike
+    # every other table, whose CURRENT_TIMESTAMP default is UTC. SQLite's 'utc'
+    # modifier reads a time as local time of this host, the one that wrote it.
+    conn.execute(text(
+        "UPDATE user_activities SET created_at = datetime(created_at, 'utc') WHERE created_at IS NOT NULL"
+    ))
+
+# (version, description, step) in order; append new steps, never edit applied ones
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Add mention statistics to document entities", _add_entity_statistics),
+    (2, "Add indexes for per-user and per-document queries", _add_query_indexes),
+    (3, "Add materialized per-user usage counters", _add_user_counters),
+    (4, "Add index for paging a document's questions", _add_question_page_index),
+    (5, "Cascade deletes of documents and questions to their rows", _add_cascading_deletes),
+    (6, "Cascade deletes of users to their derived rows", _add_user_cascading_deletes),
+    (7, "Store activity timestamps in UTC", _activity_times_to_utc),
+]
+
+def get_schema_version(conn: Connection) -> int:
+    """Read the schema version stored in the SQLite user_version header field"""
+    return conn.execute(text("PRAGMA user_version")).scalar() or 0
+
+def run_migrations(engine: Engine) -> int:
+    """
+    Apply pending migrations, each in its own transaction
+
+    Args:
+        engine: Database engine
+
+    Returns:
+        The schema version after migrating
+    """
+    with engine.connect() as conn:
+        version = get_schema_version(conn)
+
+    for target, description, step in MIGRATIONS:
+        if target <= version:
+            continue
+
+        with engine.connect() as conn:
+            # Table rebuilds must not fire foreign key actions; the pragma
+            # only takes effect outside a transaction
+            conn.execute(text("PRAGMA foreign_keys=OFF"))
+            conn.commit()
+            try:
+                with conn.begin():
+                    step(conn)
+                    conn.execute(text(f"PRAGMA user_version = {target}"))
+            finally:
+                conn.execute(text("PRAGMA foreign_keys=ON"))
+                conn.commit()
+
+        version = target
+        log_event(f"Applied database migration {target}: {description}", "info")
+
+    return version
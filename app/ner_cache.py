@@ -0,0 +1,37 @@
+# app/ner_cache.py
+from typing import List, Dict, Any, Iterable
+from sqlalchemy.orm import Session
+
+from app.database import NerCacheEntry
+from app.keyed_cache import get_cached_values, store_cached_values
+from utils.logger import log_event
+
+def get_cached_entities(db: Session, keys: Iterable[str]) -> Dict[str, List[List[Any]]]:
+    """
+    Look up cached NER results for a set of segment keys
+
+    Args:
+        db: Database session
+        keys: Segment cache keys
+
+    Returns:
+        Dictionary of key -> list of [entity_text, entity_label, start_offset] entries
+    """
+    cached = get_cached_values(db, NerCacheEntry, "entities", keys, "NER")
+    return {key: entities or [] for key, entities in cached.items()}
+
+def store_cached_entities(db: Session, entries: Dict[str, List[List[Any]]]) -> int:
+    """
+    Store NER results for newly processed segments
+
+    Args:
+        db: Database session
+        entries: Dictionary of key -> list of [entity_text, entity_label, start_offset] entries
+
+    Returns:
+        Number of entries stored
+    """
+    stored = store_cached_values(db, NerCacheEntry, "entities", entries, "NER")
+    if stored:
+        log_event(f"Cached NER results for {stored} segments", "info")
+    return stored
@@ -1,8 +1,13 @@
 # app/ner_extraction.py
+import hashlib
+import time
 import spacy
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Any, Optional
+from sqlalchemy.orm import Session
 from utils.logger import log_event
-from app.config import LEGAL_ENTITY_CATEGORIES
+from app.config import LEGAL_ENTITY_CATEGORIES, NER_RULESET_VERSION, NER_CACHE_ENABLED
+from app.ner_cache import get_cached_entities, store_cached_entities
+from app.metrics import increment
 
 # Load spaCy model
 try:
@@ -22,67 +27,179 @@ except Exception as e:
         nlp = spacy.blank("en")
         log_event("Using blank English model as fallback", "warning")
 
-def extract_entities(text: str) -> List[Tuple[str, str]]:
+# Precomputed spaCy label -> legal category map so categorization is one dict lookup per entity
+LABEL_TO_CATEGORY = {
+    label: category
+    for category, labels in LEGAL_ENTITY_CATEGORIES.items()
+    for label in labels
+}
+
+# Segments longer than this are split before being passed to spaCy
+MAX_SEGMENT_LENGTH = 100000  # SpaCy default is usually around 1,000,000 characters
+
+# Identifies the model in NER cache keys, so a model upgrade invalidates cached results
+MODEL_FINGERPRINT = f"{nlp.meta.get('lang', '')}_{nlp.meta.get('name', '')}\0{nlp.meta.get('version', '')}\0{NER_RULESET_VERSION}"
+
+def split_into_segments(text: str) -> List[Tuple[int, str]]:
+    """
+    Split text into paragraph segments, the unit of NER caching
+    
+    Args:
+        text: Text to split
+        
+    Returns:
+        List of (start_offset, segment_text) tuples
+    """
+    segments = []
+    position = 0
+    
+    while position < len(text):
+        end = text.find("\n\n", position)
+        if end == -1:
+            end = len(text)
+        
+        # Split overly long paragraphs at the spaCy length bound
+        for start in range(position, end, MAX_SEGMENT_LENGTH):
+            segment = text[start:min(end, start + MAX_SEGMENT_LENGTH)]
+            if segment.strip():
+                segments.append((start, segment))
+        
+        position = end + 2
+    
+    return segments
+
+def segment_cache_key(segment: str) -> str:
+    """Build the NER cache key for a segment of text"""
+    return hashlib.sha256(f"{MODEL_FINGERPRINT}\0{segment}".encode("utf-8")).hexdigest()
+
+def extract_entities(
+    text: str,
+    db: Optional[Session] = None,
+    stats: Optional[Dict[str, Any]] = None
+) -> List[Tuple[str, str, int]]:
     """
     Extract named entities from text using spaCy
     
+    Text is split into paragraph segments. When a database session is given,
+    segments seen before are served from the NER cache and spaCy only runs
+    on unseen ones.
+    
     Args:
         text: Text to extract entities from
+        db: Optional database session used for the NER cache
+        stats: Optional dictionary that receives cache statistics
         
     Returns:
-        List of (entity_text, entity_label) tuples
+        List of (entity_text, entity_label, start_offset) tuples, where
+        start_offset is the character offset of the mention in text
     """
     try:
-        # Process text in chunks to avoid memory issues with large documents
-        max_length = 100000  # SpaCy default is usually around 1,000,000 characters
+        start_time = time.perf_counter()
+        use_cache = db is not None and NER_CACHE_ENABLED
+        
+        segments = split_into_segments(text)
+        keys = [segment_cache_key(segment) for _, segment in segments]
+        cached = get_cached_entities(db, keys) if use_cache else {}
+        
+        # Run spaCy once per distinct unseen segment
+        missing = {}
+        for key, (_, segment) in zip(keys, segments):
+            if key not in cached and key not in missing:
+                missing[key] = segment
+        
+        computed = {}
+        for key, doc in zip(missing.keys(), nlp.pipe(missing.values())):
+            computed[key] = [[ent.text, ent.label_, ent.start_char] for ent in doc.ents]
+        
+        if use_cache:
+            store_cached_entities(db, computed)
+        
+        # Merge cached and new results, shifting offsets into the full text
         entities = []
+        for key, (segment_start, _) in zip(keys, segments):
+            segment_entities = cached[key] if key in cached else computed[key]
+            for entity_text, entity_label, offset in segment_entities:
+                entities.append((entity_text, entity_label, segment_start + offset))
         
-        # Process text in chunks
-        for i in range(0, len(text), max_length):
-            chunk = text[i:i + max_length]
-            doc = nlp(chunk)
-            
-            # Extract all entities
-            for ent in doc.ents:
-                entities.append((ent.text, ent.label_))
+        cache_stats = {
+            "segments": len(segments),
+            "cache_hits": len(segments) - len(missing),
+            "cache_misses": len(missing),
+            "seconds": round(time.perf_counter() - start_time, 3)
+        }
+        increment("ingestion.ner_segments", cache_stats["segments"])
+        increment("ingestion.ner_cache_hits", cache_stats["cache_hits"])
+        increment("ingestion.ner_cache_misses", cache_stats["cache_misses"])
+        increment("ingestion.ner_seconds", cache_stats["seconds"])
+        if stats is not None:
+            stats.update(cache_stats)
         
-        log_event(f"Extracted {len(entities)} entities from text", "info")
+        log_event(
+            f"Extracted {len(entities)} entities from text "
+            f"({cache_stats['cache_hits']}/{cache_stats['segments']} segments cached)",
+            "info"
+        )
         return entities
     
     except Exception as e:
         log_event(f"Error extracting entities: {e}", "error")
         return []
 
-def categorize_legal_entities(entities: List[Tuple[str, str]]) -> Dict[str, List[str]]:
+def aggregate_legal_entities(entities: List[Tuple]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Categorize extracted entities in a single pass, keeping mention statistics
+    
+    Args:
+        entities: List of (entity_text, entity_label[, start_offset]) tuples
+        
+    Returns:
+        Dictionary of category -> {entity_text: {"count": int, "first_offset": Optional[int]}},
+        with entities in order of first appearance
+    """
+    try:
+        aggregated = {category: {} for category in LEGAL_ENTITY_CATEGORIES.keys()}
+        
+        for entity in entities:
+            entity_text, entity_label = entity[0], entity[1]
+            offset: Optional[int] = entity[2] if len(entity) > 2 else None
+            
+            category = LABEL_TO_CATEGORY.get(entity_label)
+            if category is None:
+                continue
+            
+            # Hash-based dedupe: dicts keep insertion order, so the first mention wins
+            stats = aggregated[category].get(entity_text)
+            if stats is None:
+                aggregated[category][entity_text] = {"count": 1, "first_offset": offset}
+            else:
+                stats["count"] += 1
+                if offset is not None and (stats["first_offset"] is None or offset < stats["first_offset"]):
+                    stats["first_offset"] = offset
+        
+        log_event(f"Aggregated {len(entities)} entity mentions", "info")
+        return aggregated
+    
+    except Exception as e:
+        log_event(f"Error aggregating entities: {e}", "error")
+        return {category: {} for category in LEGAL_ENTITY_CATEGORIES.keys()}
+
+def categorize_legal_entities(entities: List[Tuple]) -> Dict[str, List[str]]:
     """
     Categorize extracted entities into legal-relevant groups
     
     Args:
-        entities: List of (entity_text, entity_label) tuples
+        entities: List of (entity_text, entity_label[, start_offset]) tuples
         
     Returns:
         Dictionary with categorized entities
     """
     try:
-        # Create result dictionary based on config categories
-        categorized = {category: [] for category in LEGAL_ENTITY_CATEGORIES.keys()}
-        
-        # Process each entity
-        for entity_text, entity_label in entities:
-            # Find the category this entity belongs to
-            for category, labels in LEGAL_ENTITY_CATEGORIES.items():
-                if entity_label in labels:
-                    # Add to appropriate category, avoiding duplicates
-                    if entity_text not in categorized[category]:
-                        categorized[category].append(entity_text)
-        
-        # Custom post-processing for legal entities (can be expanded)
-        # Look for patterns like "Section X" or statute references
-        # This is a simplified approach; a more sophisticated approach would use regex or ML
+        aggregated = aggregate_legal_entities(entities)
+        categorized = {category: list(mentions.keys()) for category, mentions in aggregated.items()}
         
         log_event("Entities categorized successfully", "info")
         return categorized
     
     except Exception as e:
         log_event(f"Error categorizing entities: {e}", "error")
-        return {category: [] for category in LEGAL_ENTITY_CATEGORIES.keys()}
\ No newline at end of file
+        return {category: [] for category in LEGAL_ENTITY_CATEGORIES.keys()}
@@ -0,0 +1,58 @@
+# app/pagination.py
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import String, type_coerce
+
+from app.config import PAGE_SIZE_MAX
+
+# Cursors are opaque to clients: the sort key of the last row of a page,
+# base64-encoded. The next page starts strictly after it, so pages stay
+# constant-time however deep the client goes. Timestamps are kept as the
+# text SQLite stores (see timestamp_key), since re-binding a parsed datetime
+# can format it differently and break the comparison.
+
+def timestamp_key(column):
+    """Select a DateTime column as its stored text, for use in a cursor"""
+    return type_coerce(column, String)
+
+def encode_cursor(*values: Any) -> str:
+    """Encode the sort key of a row as a cursor"""
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decode a cursor into its sort key values
+
+    Raises:
+        HTTPException: If the cursor is malformed
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if isinstance(values, list) and len(values) == size:
+            return values
+    except (ValueError, UnicodeError):
+        pass
+
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def clamp_page_size(limit: int) -> int:
+    """Keep a requested page size within 1..PAGE_SIZE_MAX"""
+    return max(1, min(limit, PAGE_SIZE_MAX))
+
+def split_page(rows: Sequence[Any], limit: int, key) -> Tuple[List[Any], Optional[str]]:
+    """
+    Trim rows fetched with limit + 1 to a page and build the next cursor
+
+    Args:
+        rows: Up to limit + 1 rows in page order
+        limit: Page size
+        key: Function returning the sort key tuple of a row
+
+    Returns:
+        Tuple of (page rows, cursor of the next page or None on the last page)
+    """
+    page = list(rows[:limit])
+    next_cursor = encode_cursor(*key(page[-1])) if len(rows) > limit else None
+    return page, next_cursor
@@ -0,0 +1,127 @@
+# app/precomputed_answers.py
+import numpy as np
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+
+from app.database import PrecomputedAnswer
+from app.config import LLM_MODEL, QA_PROMPT_VERSION, PRECOMPUTED_ANSWER_SIMILARITY_THRESHOLD
+from app.answer_cache import normalize_question
+from app.metrics import increment
+from utils.logger import log_event
+
+def find_precomputed_answer(
+    db: Session,
+    document_id: str,
+    question: str,
+    query_embedding: Optional[List[float]] = None
+) -> Optional[str]:
+    """
+    Look up an answer precomputed for a standard question during ingestion
+
+    Args:
+        db: Database session
+        document_id: Document ID
+        question: Question text
+        query_embedding: Optional embedding of the question; without it only
+            identical questions match
+
+    Returns:
+        The precomputed answer, or None if no standard question matches
+    """
+    try:
+        entries = db.query(PrecomputedAnswer)\
+            .filter(
+                PrecomputedAnswer.document_id == document_id,
+                PrecomputedAnswer.model == LLM_MODEL,
+                PrecomputedAnswer.prompt_version == QA_PROMPT_VERSION
+            )\
+            .all()
+
+        if not entries:
+            return None
+
+        normalized = normalize_question(question)
+        match = next((entry for entry in entries if entry.normalized_question == normalized), None)
+
+        if match is None and query_embedding is not None:
+            with_embeddings = [entry for entry in entries if entry.question_embedding is not None]
+            if with_embeddings:
+                matrix = np.stack([np.frombuffer(entry.question_embedding, dtype=np.float32) for entry in with_embeddings])
+                query = np.asarray(query_embedding, dtype=np.float32)
+                similarities = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+
+                best = int(np.argmax(similarities))
+                if similarities[best] >= PRECOMPUTED_ANSWER_SIMILARITY_THRESHOLD:
+                    match = with_embeddings[best]
+
+        if match is None:
+            return None
+
+        # Hits are counted in metrics only, so a hit stays a pure read
+        increment("qa.precomputed_hits")
+        log_event(f"Serving precomputed answer for standard question: {match.question_text}", "info")
+        return match.answer_text
+
+    except Exception as e:
+        log_event(f"Error reading precomputed answers: {e}", "error")
+        db.rollback()
+        return None
+
+def store_precomputed_answers(
+    db: Session,
+    document_id: str,
+    answers: List[Tuple[str, str, Optional[List[float]]]]
+) -> int:
+    """
+    Replace the precomputed answers of a document
+
+    Args:
+        db: Database session
+        document_id: Document ID
+        answers: List of (question, answer, question embedding) tuples
+
+    Returns:
+        Number of answers stored
+    """
+    try:
+        delete_precomputed_answers(db, document_id)
+
+        db.add_all([
+            PrecomputedAnswer(
+                document_id=document_id,
+                question_text=question,
+                normalized_question=normalize_question(question),
+                model=LLM_MODEL,
+                prompt_version=QA_PROMPT_VERSION,
+                answer_text=answer,
+                question_embedding=(
+                    np.asarray(embedding, dtype=np.float32).tobytes()
+                    if embedding is not None else None
+                )
+            )
+            for question, answer, embedding in answers
+        ])
+        db.commit()
+
+        log_event(f"Stored {len(answers)} precomputed answers for document {document_id}", "info")
+        return len(answers)
+
+    except Exception as e:
+        log_event(f"Error storing precomputed answers: {e}", "error")
+        db.rollback()
+        raise e
+
+def delete_precomputed_answers(db: Session, document_id: str) -> int:
+    """
+    Remove all precomputed answers for a document (does not commit)
+
+    Args:
+        db: Database session
+        document_id: Document ID
+
+    Returns:
+        Number of answers removed
+    """
+    return db.query(PrecomputedAnswer)\
+        .filter(PrecomputedAnswer.document_id == document_id)\
+        .delete(synchronize_session=False)
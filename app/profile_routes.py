@@ -1,19 +1,26 @@
 # app/profile_routes.py
+import asyncio
 from typing import Dict, List, Any, Optional
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from fastapi import APIRouter, Depends, HTTPException, status, Form, Body
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field, EmailStr
 
-from app.database import get_db, User, Question
-from app.auth import get_current_active_user, get_password_hash, verify_password
+from app.database import get_async_db, User, Question
+from app.auth import get_current_active_user, aget_password_hash, averify_password, invalidate_principal, Principal
 from app.activity_repository import (
-    get_user_activities, 
-    log_activity, 
-    get_user_activity_count,
+    aget_user_activities, 
+    alog_activity, 
+    aget_user_activity_count,
+    aget_user_daily_activity,
+    get_archived_user_activities,
     format_activity_for_display
 )
+from app.user_counters import aget_user_counters
+from app.pagination import clamp_page_size
+from app.history_archive import MONTH_PATTERN, read_archive
+from app.config import PAGE_SIZE_DEFAULT
 from utils.logger import log_event
 
 # Create router
@@ -25,6 +32,18 @@ class PasswordChangeRequest(BaseModel):
 
 class UserActivityResponse(BaseModel):
     activities: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+class ArchivedActivityResponse(BaseModel):
+    month: str
+    activities: List[Dict[str, Any]]
+
+class ArchivedQuestionResponse(BaseModel):
+    month: str
+    questions: List[Dict[str, Any]]
+
+class DailyActivityResponse(BaseModel):
+    days: List[Dict[str, Any]]
 
 class ActivityCountResponse(BaseModel):
     documents: int
@@ -38,15 +57,18 @@ class QuestionCountResponse(BaseModel):
 @router.post("/change-password", status_code=status.HTTP_200_OK)
 async def change_password(
     password_data: PasswordChangeRequest,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Change user password
     """
     try:
+        # The principal carries no password hash; load the user row
+        user = await db.get(User, current_user.id)
+        
         # Verify current password
-        if not verify_password(password_data.current_password, current_user.hashed_password):
+        if not await averify_password(password_data.current_password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Incorrect current password"
@@ -60,17 +82,15 @@ async def change_password(
             )
             
         # Hash new password and update user
-        hashed_password = get_password_hash(password_data.new_password)
-        
-        # Get user from database to ensure it's fresh
-        user = db.query(User).filter(User.id == current_user.id).first()
+        hashed_password = await aget_password_hash(password_data.new_password)
         user.hashed_password = hashed_password
         
         # Save changes
-        db.commit()
+        await db.commit()
+        invalidate_principal(user_id=current_user.id)
         
         # Log activity
-        log_activity(
+        await alog_activity(
             db=db,
             user_id=current_user.id,
             activity_type="profile_update",
@@ -87,7 +107,7 @@ async def change_password(
         
     except Exception as e:
         log_event(f"Error changing password: {e}", "error")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -96,11 +116,14 @@ async def change_password(
 @router.get("/activity", response_model=UserActivityResponse)
 async def get_activity_history(
     filter: str = "all",
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    limit: int = PAGE_SIZE_DEFAULT,
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get user activity history
+    Get user activity history, newest first
+    - pass the returned next_cursor as cursor to get the next page; it is null on the last page
     """
     try:
         # Map filter to activity type
@@ -111,16 +134,22 @@ async def get_activity_history(
             activity_type = "question"
             
         # Get activities
-        activities = get_user_activities(
+        activities, next_cursor = await aget_user_activities(
             db=db,
             user_id=current_user.id,
-            activity_type=activity_type
+            activity_type=activity_type,
+            limit=clamp_page_size(limit),
+            cursor=cursor
         )
         
         # Format activities for display
         formatted_activities = [format_activity_for_display(activity) for activity in activities]
         
-        return {"activities": formatted_activities}
+        return {"activities": formatted_activities, "next_cursor": next_cursor}
+        
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
         
     except Exception as e:
         log_event(f"Error getting activity history: {e}", "error")
@@ -129,17 +158,102 @@ async def get_activity_history(
             detail=str(e)
         )
 
+@router.get("/activity/archive", response_model=ArchivedActivityResponse)
+async def get_archived_activity(
+    month: str,
+    current_user: Principal = Depends(get_current_active_user)
+):
+    """
+    Get archived activity of a month (YYYY-MM), newest first
+    - activities older than the retention window are only available here
+    """
+    if not MONTH_PATTERN.match(month):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Month must be formatted as YYYY-MM"
+        )
+        
+    try:
+        activities = await asyncio.to_thread(get_archived_user_activities, current_user.id, month)
+        return {"month": month, "activities": [format_activity_for_display(activity) for activity in activities]}
+        
+    except Exception as e:
+        log_event(f"Error getting archived activity: {e}", "error")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.get("/questions/archive", response_model=ArchivedQuestionResponse)
+async def get_archived_questions(
+    month: str,
+    document_id: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_user)
+):
+    """
+    Get archived questions and answers of a month (YYYY-MM), newest first
+    - questions older than the retention window are only available here
+    """
+    if not MONTH_PATTERN.match(month):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Month must be formatted as YYYY-MM"
+        )
+        
+    try:
+        rows = await asyncio.to_thread(read_archive, "questions", month, current_user.id)
+        questions = [
+            {
+                "id": row["id"],
+                "document_id": row["document_id"],
+                "question": row["question_text"],
+                "answer": row["answer_text"],
+                "created_at": datetime.fromisoformat(row["created_at"]).isoformat() if row["created_at"] else None
+            }
+            for row in reversed(rows)
+            if document_id is None or row["document_id"] == document_id
+        ]
+        return {"month": month, "questions": questions}
+        
+    except Exception as e:
+        log_event(f"Error getting archived questions: {e}", "error")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.get("/activity/daily", response_model=DailyActivityResponse)
+async def get_daily_activity(
+    days: int = 30,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get activity counts per day and type over the last days, archived activity included
+    """
+    try:
+        # Days are UTC, like the stored timestamps
+        since = (datetime.now(timezone.utc) - timedelta(days=max(1, min(days, 3660)) - 1)).strftime("%Y-%m-%d")
+        return {"days": await aget_user_daily_activity(db, current_user.id, since)}
+        
+    except Exception as e:
+        log_event(f"Error getting daily activity: {e}", "error")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
 @router.get("/stats", response_model=ActivityCountResponse)
 async def get_user_stats(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get user statistics
     """
     try:
         # Get activity counts
-        counts = get_user_activity_count(db=db, user_id=current_user.id)
+        counts = await aget_user_activity_count(db=db, user_id=current_user.id)
         return counts
         
     except Exception as e:
@@ -151,16 +265,16 @@ async def get_user_stats(
 
 @router.get("/questions/count", response_model=QuestionCountResponse)
 async def get_question_count(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get count of questions asked by the user
     """
     try:
         # Get question count
-        count = db.query(Question).filter(Question.user_id == current_user.id).count()
-        return {"count": count}
+        counters = await aget_user_counters(db, current_user.id)
+        return {"count": counters["questions"]}
         
     except Exception as e:
         log_event(f"Error getting question count: {e}", "error")
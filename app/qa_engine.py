@@ -1,12 +1,21 @@
 # app/qa_engine.py
-import openai
-from typing import List, Tuple, Any
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Any, AsyncIterator, Optional, Dict
 from utils.logger import log_event
-from app.config import OPENAI_API_KEY, LLM_MODEL
-from app.embeddings import search_similar_chunks
-
-# Initialize OpenAI API
-openai.api_key = OPENAI_API_KEY
+from sqlalchemy.orm import Session
+from app.config import (
+    LLM_MODEL, SUMMARY_PROMPT_VERSION,
+    SUMMARY_GROUP_SIZE, SUMMARY_REDUCE_FANIN, SUMMARY_CONCURRENCY, PRECOMPUTE_CONCURRENCY
+)
+from app.embeddings import (
+    search_similar_chunk_ids, search_similar_chunk_ids_batch, aget_openai_embedding, get_batch_embeddings
+)
+from app.llm_client import create_chat_completion, acreate_chat_completion, astream_chat_completion
+from app.context_packer import pack_context, estimate_tokens, join_consecutive_chunks
+from app.summary_cache import get_cached_summaries, store_cached_summaries
+from app.metrics import increment
 
 def generate_system_prompt() -> str:
     """Create a system prompt for the legal assistant"""
@@ -22,14 +31,25 @@ def generate_system_prompt() -> str:
     
     Focus on providing factual, accurate analysis of the legal text without adding personal opinions or legal advice."""
 
-def generate_prompt_with_context(query: str, relevant_chunks: List[Tuple[str, float]]) -> str:
-    """Create a prompt with the query and relevant context"""
+def generate_prompt_with_context(
+    query: str,
+    relevant_chunks: List[Tuple[str, float]],
+    history: Optional[str] = None
+) -> str:
+    """Create a prompt with the query, relevant context and optional conversation history"""
     # Extract just the text from the chunks
     context_texts = [chunk[0] for chunk in relevant_chunks]
     context = "\n\n".join(context_texts)
     
+    conversation = f"""
+Conversation so far (for reference only; the document context is authoritative):
+```
+{history}
+```
+""" if history else ""
+    
     prompt = f"""You are a legal document analysis assistant. Please answer the following question about the legal document carefully and precisely:
-
+{conversation}
 Question: {query}
 
 Document Context:
@@ -48,6 +68,86 @@ Answer:"""
     
     return prompt
 
+def build_answer_prompts(
+    query: str,
+    index: Any,
+    chunks: List[str],
+    top_k: int = 5,
+    query_embedding: Optional[List[float]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    history: Optional[str] = None
+) -> Optional[Tuple[str, str]]:
+    """
+    Retrieve context for a question and build the system and user prompts
+    
+    Args:
+        query: The user's question
+        index: FAISS index of the document
+        chunks: The document chunks
+        top_k: Number of chunks to retrieve
+        query_embedding: Optional precomputed embedding of the question
+        stats: Optional dictionary that receives prompt token estimates
+        history: Optional conversation history to include in the prompt
+        
+    Returns:
+        Tuple of (system_prompt, user_prompt), or None if nothing relevant was found
+    """
+    # Retrieve relevant chunks
+    ranked = search_similar_chunk_ids(query, index, len(chunks), top_k, query_embedding)
+    
+    return build_prompts_from_ranked(query, ranked, chunks, stats, history)
+
+def build_prompts_from_ranked(
+    query: str,
+    ranked: List[Tuple[int, float]],
+    chunks: List[str],
+    stats: Optional[Dict[str, Any]] = None,
+    history: Optional[str] = None
+) -> Optional[Tuple[str, str]]:
+    """
+    Build the system and user prompts for a question from already retrieved chunks
+    
+    Args:
+        query: The user's question
+        ranked: List of (chunk_index, score) tuples, most relevant first
+        chunks: The document chunks
+        stats: Optional dictionary that receives prompt token estimates
+        history: Optional conversation history to include in the prompt
+        
+    Returns:
+        Tuple of (system_prompt, user_prompt), or None if nothing relevant was found
+    """
+    if not ranked:
+        return None
+    
+    # Merge overlapping chunks and fit them into the token budget
+    passages, context_tokens = pack_context(ranked, chunks)
+    
+    # Generate prompt with context
+    system_prompt = generate_system_prompt()
+    user_prompt = generate_prompt_with_context(query, passages, history)
+    
+    prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+    increment("qa.prompts")
+    increment("qa.prompt_tokens", prompt_tokens)
+    if stats is not None:
+        stats.update({"prompt_tokens": prompt_tokens, "context_tokens": context_tokens})
+    
+    return system_prompt, user_prompt
+
+def build_messages(prompt: str, system_prompt: str = None) -> List[Dict[str, str]]:
+    """Build the chat messages for a prompt and optional system prompt"""
+    messages = []
+    
+    # Add system prompt if provided
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    
+    # Add user prompt
+    messages.append({"role": "user", "content": prompt})
+    
+    return messages
+
 def query_llm(prompt: str, system_prompt: str = None) -> str:
     """
     Send a prompt to the LLM and get a response
@@ -60,20 +160,11 @@ def query_llm(prompt: str, system_prompt: str = None) -> str:
         The model's response text
     """
     try:
-        messages = []
-        
-        # Add system prompt if provided
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        
-        # Add user prompt
-        messages.append({"role": "user", "content": prompt})
-        
         # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
         # do not change this unless explicitly requested by the user
-        response = openai.chat.completions.create(
+        response = create_chat_completion(
             model=LLM_MODEL,
-            messages=messages,
+            messages=build_messages(prompt, system_prompt),
             temperature=0.3,  # Lower temperature for more factual responses
             max_tokens=1200
         )
@@ -84,7 +175,39 @@ def query_llm(prompt: str, system_prompt: str = None) -> str:
         log_event(f"Error querying LLM: {e}", "error")
         raise Exception(f"Error generating response: {str(e)}")
 
-def answer_question(query: str, index: Any, chunks: List[str], top_k: int = 5) -> str:
+async def aquery_llm(prompt: str, system_prompt: str = None) -> str:
+    """
+    Send a prompt to the LLM without blocking the event loop
+    
+    Args:
+        prompt: The user prompt to send
+        system_prompt: Optional system prompt
+        
+    Returns:
+        The model's response text
+    """
+    try:
+        response = await acreate_chat_completion(
+            model=LLM_MODEL,
+            messages=build_messages(prompt, system_prompt),
+            temperature=0.3,  # Lower temperature for more factual responses
+            max_tokens=1200
+        )
+        
+        return response.choices[0].message.content
+    
+    except Exception as e:
+        log_event(f"Error querying LLM: {e}", "error")
+        raise Exception(f"Error generating response: {str(e)}")
+
+def generate_answer(
+    query: str,
+    index: Any,
+    chunks: List[str],
+    top_k: int = 5,
+    query_embedding: Optional[List[float]] = None,
+    stats: Optional[Dict[str, Any]] = None
+) -> str:
     """
     Answer a question using RAG with the document chunks
     
@@ -93,70 +216,273 @@ def answer_question(query: str, index: Any, chunks: List[str], top_k: int = 5) -
         index: FAISS index of the document
         chunks: The document chunks
         top_k: Number of chunks to retrieve
+        query_embedding: Optional precomputed embedding of the question
+        stats: Optional dictionary that receives prompt token estimates
         
     Returns:
         The answer to the question
-    """
-    try:
-        log_event(f"Answering question: {query}", "info")
-        
-        # Retrieve relevant chunks
-        relevant_chunks = search_similar_chunks(query, index, chunks, top_k)
         
-        if not relevant_chunks:
-            return "I couldn't find any relevant information in the document to answer your question."
+    Raises:
+        Exception: If retrieval or generation fails
+    """
+    log_event(f"Answering question: {query}", "info")
+    
+    prompts = build_answer_prompts(query, index, chunks, top_k, query_embedding, stats)
+    
+    if prompts is None:
+        return "I couldn't find any relevant information in the document to answer your question."
+    
+    system_prompt, user_prompt = prompts
+    
+    # Get response from LLM
+    answer = query_llm(user_prompt, system_prompt)
+    
+    log_event("Successfully generated answer", "info")
+    return answer
+
+async def agenerate_answer(
+    query: str,
+    index: Any,
+    chunks: List[str],
+    top_k: int = 5,
+    query_embedding: Optional[List[float]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    history: Optional[str] = None
+) -> str:
+    """
+    Answer a question using RAG without blocking the event loop
+    
+    Args:
+        query: The user's question
+        index: FAISS index of the document
+        chunks: The document chunks
+        top_k: Number of chunks to retrieve
+        query_embedding: Optional precomputed embedding of the question
+        stats: Optional dictionary that receives prompt token estimates
+        history: Optional conversation history to include in the prompt
         
-        # Generate prompt with context
-        system_prompt = generate_system_prompt()
-        user_prompt = generate_prompt_with_context(query, relevant_chunks)
+    Returns:
+        The answer to the question
         
-        # Get response from LLM
-        answer = query_llm(user_prompt, system_prompt)
+    Raises:
+        Exception: If retrieval or generation fails
+    """
+    log_event(f"Answering question: {query}", "info")
+    
+    if query_embedding is None:
+        query_embedding = await aget_openai_embedding(query)
+    
+    prompts = build_answer_prompts(query, index, chunks, top_k, query_embedding, stats, history)
+    
+    if prompts is None:
+        return "I couldn't find any relevant information in the document to answer your question."
+    
+    system_prompt, user_prompt = prompts
+    
+    # Get response from LLM
+    answer = await aquery_llm(user_prompt, system_prompt)
+    
+    log_event("Successfully generated answer", "info")
+    return answer
+
+def answer_question(query: str, index: Any, chunks: List[str], top_k: int = 5) -> str:
+    """
+    Answer a question using RAG with the document chunks
+    
+    Args:
+        query: The user's question
+        index: FAISS index of the document
+        chunks: The document chunks
+        top_k: Number of chunks to retrieve
         
-        log_event("Successfully generated answer", "info")
-        return answer
+    Returns:
+        The answer to the question, or an error message if it could not be generated
+    """
+    try:
+        return generate_answer(query, index, chunks, top_k)
     
     except Exception as e:
         log_event(f"Error answering question: {e}", "error")
         return f"I encountered an error while trying to answer your question: {str(e)}"
 
-def summarize_document(chunks: List[str], num_chunks: int = 10) -> str:
+async def stream_llm(prompt: str, system_prompt: str = None) -> AsyncIterator[str]:
     """
-    Generate a summary of the document
+    Send a prompt to the LLM and yield the response as it is generated
+    
+    Closing the generator early closes the response, which aborts generation upstream.
     
     Args:
-        chunks: The document chunks
-        num_chunks: Number of chunks to include in summary generation
+        prompt: The user prompt to send
+        system_prompt: Optional system prompt
         
-    Returns:
-        A summary of the document
+    Yields:
+        Pieces of the model's response text
     """
     try:
-        log_event("Generating document summary", "info")
-        
-        # Select representative chunks from the document
-        # For simplicity, take evenly spaced chunks across the document
-        selected_chunks = []
-        step = max(1, len(chunks) // num_chunks)
-        
-        for i in range(0, len(chunks), step):
-            if len(selected_chunks) < num_chunks:
-                selected_chunks.append(chunks[i])
-            else:
-                break
-        
-        # Join selected chunks
-        document_sample = "\n\n".join(selected_chunks)
+        async with astream_chat_completion(
+            model=LLM_MODEL,
+            messages=build_messages(prompt, system_prompt),
+            temperature=0.3,  # Lower temperature for more factual responses
+            max_tokens=1200
+        ) as stream:
+            async for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+    
+    except GeneratorExit:
+        log_event("LLM stream cancelled", "info")
+        increment("qa.streams_cancelled")
+        raise
+    
+    except Exception as e:
+        log_event(f"Error querying LLM: {e}", "error")
+        raise Exception(f"Error generating response: {str(e)}")
+
+async def answer_question_stream(
+    query: str,
+    index: Any,
+    chunks: List[str],
+    top_k: int = 5,
+    query_embedding: Optional[List[float]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    history: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Answer a question using RAG, yielding the answer as it is generated
+    
+    Args:
+        query: The user's question
+        index: FAISS index of the document
+        chunks: The document chunks
+        top_k: Number of chunks to retrieve
+        query_embedding: Optional precomputed embedding of the question
+        stats: Optional dictionary that receives prompt token estimates
+        history: Optional conversation history to include in the prompt
         
-        # Ensure the sample is not too long
-        if len(document_sample) > 15000:
-            document_sample = document_sample[:15000] + "..."
+    Yields:
+        Pieces of the answer text
+    """
+    log_event(f"Answering question (streaming): {query}", "info")
+    start_time = time.perf_counter()
+    
+    if query_embedding is None:
+        query_embedding = await aget_openai_embedding(query)
+    
+    prompts = build_answer_prompts(query, index, chunks, top_k, query_embedding, stats, history)
+    
+    if prompts is None:
+        yield "I couldn't find any relevant information in the document to answer your question."
+        return
+    
+    system_prompt, user_prompt = prompts
+    
+    first_token = True
+    tokens = stream_llm(user_prompt, system_prompt)
+    try:
+        async for token in tokens:
+            if first_token:
+                time_to_first_token = time.perf_counter() - start_time
+                increment("qa.stream_first_tokens")
+                increment("qa.stream_ttft_seconds", time_to_first_token)
+                log_event(f"First answer token after {time_to_first_token:.2f}s", "info")
+                first_token = False
+            yield token
+    finally:
+        # Propagate early closes so the upstream response is closed too
+        await tokens.aclose()
+    
+    log_event("Successfully streamed answer", "info")
+
+def precompute_answers(
+    questions: List[str],
+    index: Any,
+    chunks: List[str],
+    top_k: int = 5
+) -> List[Tuple[str, str, List[float]]]:
+    """
+    Answer a set of standard questions about a document ahead of time
+    
+    All questions are embedded in one request and retrieved in one index pass;
+    the LLM calls then run on a small thread pool so they do not crowd out
+    interactive questions.
+    
+    Args:
+        questions: Questions to answer
+        index: FAISS index of the document
+        chunks: The document chunks
+        top_k: Number of chunks to retrieve per question
         
-        # Create prompt for summary
-        prompt = f"""Summarize the following excerpt from a legal document:
+    Returns:
+        List of (question, answer, question embedding) tuples for the questions
+        that could be answered
+    """
+    if not questions:
+        return []
+    
+    embeddings = get_batch_embeddings(questions, batch_size=len(questions))
+    ranked_lists = search_similar_chunk_ids_batch(embeddings, index, len(chunks), top_k)
+    
+    jobs = []
+    for question, embedding, ranked in zip(questions, embeddings, ranked_lists):
+        prompts = build_prompts_from_ranked(question, ranked, chunks)
+        if prompts is not None:
+            jobs.append((question, embedding.tolist(), prompts))
+    
+    def answer(job):
+        question, _, (system_prompt, user_prompt) = job
+        try:
+            return query_llm(user_prompt, system_prompt)
+        except Exception as e:
+            log_event(f"Error precomputing answer to '{question}': {e}", "warning")
+            return None
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(PRECOMPUTE_CONCURRENCY, len(jobs) or 1))) as executor:
+        answers = list(executor.map(answer, jobs))
+    
+    increment("qa.precomputed_answers", sum(answer is not None for answer in answers))
+    return [
+        (question, answer, embedding)
+        for (question, embedding, _), answer in zip(jobs, answers)
+        if answer is not None
+    ]
+
+SUMMARY_SYSTEM_PROMPT = "You are an AI legal document assistant specialized in analyzing and summarizing legal texts. Provide clear, concise summaries that capture the essential elements of legal documents."
+
+def generate_section_summary_prompt(section_text: str) -> str:
+    """Create a prompt summarizing one section of a document (map step)"""
+    return f"""Summarize the following section of a legal document:
 
 ```
-{document_sample}
+{section_text}
+```
+
+Please provide a concise summary that:
+1. Names the parties, provisions and sections covered
+2. Notes any important clauses, deadlines, amounts, or obligations
+3. Preserves section or clause numbers where given
+4. Uses formal language appropriate for legal document analysis
+
+Your summary should be brief (100-200 words)."""
+
+def generate_combine_summaries_prompt(summaries: List[str]) -> str:
+    """Create a prompt merging consecutive section summaries (reduce step)"""
+    joined = "\n\n---\n\n".join(summaries)
+    return f"""The following are summaries of consecutive sections of a legal document:
+
+```
+{joined}
+```
+
+Combine them into a single summary of these sections that keeps all key provisions,
+parties, deadlines, amounts and obligations. Use formal language and stay under 300 words."""
+
+def generate_document_summary_prompt(document_text: str, from_summaries: bool = False) -> str:
+    """Create the prompt for the final document summary"""
+    source = "section summaries of a legal document" if from_summaries else "excerpt from a legal document"
+    return f"""Summarize the following {source}:
+
+```
+{document_text}
 ```
 
 Please provide a concise summary that:
@@ -167,14 +493,104 @@ Please provide a concise summary that:
 5. Uses formal language appropriate for legal document analysis
 
 Your summary should be comprehensive yet concise (300-500 words)."""
+
+def summary_cache_key(prompt: str) -> str:
+    """Build the summary cache key for a prompt (which embeds its input text)"""
+    key = f"{LLM_MODEL}\0{SUMMARY_PROMPT_VERSION}\0{prompt}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def run_summary_prompts(prompts: List[str], db: Optional[Session] = None) -> List[str]:
+    """
+    Run summary prompts concurrently, serving previously seen inputs from the summary cache
+    
+    Args:
+        prompts: Summary prompts
+        db: Optional database session used for the summary cache
+        
+    Returns:
+        Summaries in the same order as the prompts
+    """
+    keys = [summary_cache_key(prompt) for prompt in prompts]
+    results = get_cached_summaries(db, keys) if db is not None else {}
+    
+    missing = {}
+    for key, prompt in zip(keys, prompts):
+        if key not in results:
+            missing[key] = prompt
+    
+    increment("summary.cache_hits", len(prompts) - len(missing))
+    increment("summary.llm_calls", len(missing))
+    
+    if missing:
+        # Bounded concurrency keeps long documents from flooding the LLM API
+        with ThreadPoolExecutor(max_workers=min(SUMMARY_CONCURRENCY, len(missing))) as executor:
+            futures = {
+                key: executor.submit(query_llm, prompt, SUMMARY_SYSTEM_PROMPT)
+                for key, prompt in missing.items()
+            }
+            generated = {}
+            error = None
+            for key, future in futures.items():
+                try:
+                    generated[key] = future.result()
+                except Exception as e:
+                    error = error or e
+
+        # Summaries that succeeded are cached even if another call failed,
+        # so a retry only runs the failed prompts again
+        if db is not None:
+            store_cached_summaries(db, generated)
+        if error is not None:
+            raise error
+        results.update(generated)
+    
+    return [results[key] for key in keys]
+
+def summarize_document(chunks: List[str], db: Optional[Session] = None) -> str:
+    """
+    Generate a summary of the whole document
+    
+    Chunk groups are summarized in parallel, then the summaries are combined
+    in a tree until one summary remains. Intermediate summaries are cached so
+    summarizing unchanged sections again is cheap.
+    
+    Args:
+        chunks: The document chunks
+        db: Optional database session used for the summary cache
+        
+    Returns:
+        A summary of the document
+    """
+    try:
+        log_event("Generating document summary", "info")
+        
+        # Group consecutive chunks, removing their overlap
+        groups = [
+            join_consecutive_chunks(chunks[i:i + SUMMARY_GROUP_SIZE])
+            for i in range(0, len(chunks), SUMMARY_GROUP_SIZE)
+        ]
         
-        # Get response from LLM
-        system_prompt = "You are an AI legal document assistant specialized in analyzing and summarizing legal texts. Provide clear, concise summaries that capture the essential elements of legal documents."
-        summary = query_llm(prompt, system_prompt)
+        if len(groups) <= 1:
+            # Short documents are summarized in one call
+            summary = run_summary_prompts([generate_document_summary_prompt("\n\n".join(groups))], db)[0]
+        else:
+            # Map: summarize each chunk group
+            summaries = run_summary_prompts([generate_section_summary_prompt(group) for group in groups], db)
+            
+            # Reduce: combine consecutive summaries until they fit in one final call
+            while len(summaries) > SUMMARY_REDUCE_FANIN:
+                batches = [
+                    summaries[i:i + SUMMARY_REDUCE_FANIN]
+                    for i in range(0, len(summaries), SUMMARY_REDUCE_FANIN)
+                ]
+                summaries = run_summary_prompts([generate_combine_summaries_prompt(batch) for batch in batches], db)
+            
+            document_text = "\n\n---\n\n".join(summaries)
+            summary = run_summary_prompts([generate_document_summary_prompt(document_text, from_summaries=True)], db)[0]
         
-        log_event("Successfully generated document summary", "info")
+        log_event(f"Successfully generated document summary from {len(groups)} chunk groups", "info")
         return summary
     
     except Exception as e:
         log_event(f"Error generating document summary: {e}", "error")
-        return "I encountered an error while trying to generate a summary of the document."
\ No newline at end of file
+        return "I encountered an error while trying to generate a summary of the document."
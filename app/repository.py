@@ -1,15 +1,25 @@
 # app/repository.py
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 from fastapi import HTTPException, status
 import uuid
 import os
+import re
 
-from app.database import User, Document, DocumentEntity, Question, UserActivity
+from app.database import User, Document, DocumentEntity, EntityIndexEntry, Question, UserActivity
 from utils.logger import log_event
-from app.config import UPLOAD_FOLDER
-from app.activity_repository import log_activity
+from app.config import UPLOAD_FOLDER, PAGE_SIZE_DEFAULT
+from app.activity_repository import log_activity, alog_activity
+from app.artifact_reaper import artifact_reaper
+from app.user_counters import increment_counters, aincrement_counters, subtract_document_counts
+from app.pagination import timestamp_key, decode_cursor, split_page
+
+# Characters stripped from both ends of entity text before indexing
+ENTITY_EDGE_PUNCTUATION = " \t\n.,;:!?\"'()[]{}"
 
 # Document Repository Functions
 def create_document(
@@ -52,6 +62,7 @@ def create_document(
         
         # Add to database
         db.add(document)
+        increment_counters(db, user_id, documents=1)
         db.commit()
         db.refresh(document)
         
@@ -129,51 +140,197 @@ def update_document_status(
 def store_document_entities(
     db: Session,
     document_id: str,
-    entities: Dict[str, List[str]]
-) -> List[DocumentEntity]:
+    entities: Dict[str, Any]
+) -> int:
     """
-    Store entities extracted from a document
+    Store entities extracted from a document, replacing any stored earlier
+    
+    Rows are written with bulk INSERTs in a single transaction, together with
+    the removal of entities from a previous processing of the document and
+    the update of the owner's entity index.
     
     Args:
         db: Database session
         document_id: Document ID
-        entities: Dictionary of entity categories and values
+        entities: Dictionary of entity categories to either a list of values or
+            a {value: {"count": int, "first_offset": int}} mapping
         
     Returns:
-        List of created document entities
+        Number of entities stored
     """
     try:
-        # Create entity records
-        entity_records = []
-        
-        for category, entity_list in entities.items():
-            for entity_text in entity_list:
-                # Create entity record
-                entity = DocumentEntity(
-                    document_id=document_id,
-                    category=category,
-                    text=entity_text
-                )
+        rows = []
+        
+        for category, category_entities in entities.items():
+            if isinstance(category_entities, dict):
+                items = category_entities.items()
+            else:
+                items = ((entity_text, {}) for entity_text in category_entities)
                 
-                # Add to database
-                db.add(entity)
-                entity_records.append(entity)
+            for entity_text, stats in items:
+                rows.append({
+                    "document_id": document_id,
+                    "category": category,
+                    "text": entity_text,
+                    "mention_count": stats.get("count", 1),
+                    "first_offset": stats.get("first_offset")
+                })
         
-        # Commit changes
-        db.commit()
+        # Drop entities from any previous processing of the document
+        db.execute(delete(DocumentEntity).where(DocumentEntity.document_id == document_id))
+        
+        if rows:
+            db.execute(insert(DocumentEntity), rows)
+        
+        # Update the owner's entity index in the same transaction
+        index_document_entities(db, document_id, rows)
         
-        # Refresh entities
-        for entity in entity_records:
-            db.refresh(entity)
+        db.commit()
         
-        log_event(f"Stored {len(entity_records)} entities for document {document_id}", "info")
-        return entity_records
+        log_event(f"Stored {len(rows)} entities for document {document_id}", "info")
+        return len(rows)
         
     except Exception as e:
         log_event(f"Error storing document entities: {e}", "error")
         db.rollback()
         raise e
 
+def normalize_entity_text(text: str) -> str:
+    """
+    Normalize entity text for the entity index
+    
+    Args:
+        text: Entity text
+        
+    Returns:
+        Casefolded text with collapsed whitespace and surrounding punctuation removed
+    """
+    return re.sub(r"\s+", " ", text).strip(ENTITY_EDGE_PUNCTUATION).casefold()
+
+def index_document_entities(db: Session, document_id: str, entity_rows: List[Dict[str, Any]]) -> int:
+    """
+    Replace a document's entries in the entity index (does not commit)
+    
+    Args:
+        db: Database session
+        document_id: Document ID
+        entity_rows: Entities stored for the document, as dictionaries with
+            "category", "text" and "mention_count" keys
+        
+    Returns:
+        Number of index entries added
+    """
+    owner_id = db.query(Document.owner_id).filter(Document.id == document_id).scalar()
+    
+    # Drop entries from any previous processing of the document
+    db.execute(delete(EntityIndexEntry).where(EntityIndexEntry.document_id == document_id))
+    
+    # Merge entities that normalize to the same text
+    merged = {}
+    for entity in entity_rows:
+        normalized = normalize_entity_text(entity["text"] or "")
+        if not normalized:
+            continue
+        
+        key = (entity["category"], normalized)
+        if key in merged:
+            merged[key]["mention_count"] += entity["mention_count"] or 1
+        else:
+            merged[key] = {
+                "owner_id": owner_id,
+                "document_id": document_id,
+                "category": entity["category"],
+                "normalized_text": normalized[:255],
+                "display_text": entity["text"],
+                "mention_count": entity["mention_count"] or 1
+            }
+    
+    if merged:
+        db.execute(insert(EntityIndexEntry), list(merged.values()))
+    return len(merged)
+
+def search_entity_index(
+    db: Session,
+    user_id: int,
+    query: str,
+    prefix: bool = False,
+    category: Optional[str] = None,
+    limit: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Find a user's documents that mention an entity
+    
+    Args:
+        db: Database session
+        user_id: User ID
+        query: Entity text to look up
+        prefix: Whether to match entities starting with the query instead of exact matches
+        category: Optional entity category filter
+        limit: Maximum number of entities to return
+        
+    Returns:
+        List of entities with the documents mentioning them, most mentioned first
+    """
+    try:
+        normalized = normalize_entity_text(query)
+        if not normalized:
+            return []
+        
+        q = db.query(
+            EntityIndexEntry.normalized_text,
+            EntityIndexEntry.category,
+            EntityIndexEntry.display_text,
+            EntityIndexEntry.mention_count,
+            EntityIndexEntry.document_id,
+            Document.original_filename
+        ).join(Document, Document.id == EntityIndexEntry.document_id)\
+            .filter(EntityIndexEntry.owner_id == user_id)
+        
+        if prefix:
+            # Range condition so the (owner_id, normalized_text) index is used
+            q = q.filter(
+                EntityIndexEntry.normalized_text >= normalized,
+                EntityIndexEntry.normalized_text < normalized + "\U0010ffff"
+            )
+        else:
+            q = q.filter(EntityIndexEntry.normalized_text == normalized)
+            
+        if category:
+            q = q.filter(EntityIndexEntry.category == category)
+        
+        # Group rows by entity
+        results = {}
+        rows = q.order_by(EntityIndexEntry.normalized_text, EntityIndexEntry.category).yield_per(500)
+        for row in rows:
+            key = (row.normalized_text, row.category)
+            if key not in results:
+                if len(results) >= limit:
+                    break
+                results[key] = {
+                    "text": row.display_text,
+                    "normalized_text": row.normalized_text,
+                    "category": row.category,
+                    "total_mentions": 0,
+                    "documents": []
+                }
+            
+            entry = results[key]
+            entry["total_mentions"] += row.mention_count or 1
+            entry["documents"].append({
+                "document_id": row.document_id,
+                "filename": row.original_filename,
+                "mentions": row.mention_count or 1
+            })
+        
+        for entry in results.values():
+            entry["documents"].sort(key=lambda d: d["mentions"], reverse=True)
+        
+        return sorted(results.values(), key=lambda e: e["total_mentions"], reverse=True)
+        
+    except Exception as e:
+        log_event(f"Error searching entity index: {e}", "error")
+        raise e
+
 def get_document(db: Session, document_id: str, user_id: Optional[int] = None) -> Document:
     """
     Get a document by ID, optionally checking ownership
@@ -249,6 +406,36 @@ def get_document_entities(db: Session, document_id: str) -> Dict[str, List[str]]
         log_event(f"Error getting document entities: {e}", "error")
         raise e
 
+def get_document_entity_counts(db: Session, document_id: str) -> Dict[str, Dict[str, int]]:
+    """
+    Get entities for a document with their mention counts
+    
+    Args:
+        db: Database session
+        document_id: Document ID
+        
+    Returns:
+        Dictionary of entity categories to {value: mention count}, ordered by first mention
+    """
+    try:
+        # Get entities in document order
+        entities = db.query(DocumentEntity)\
+            .filter(DocumentEntity.document_id == document_id)\
+            .order_by(DocumentEntity.category, DocumentEntity.first_offset, DocumentEntity.id)\
+            .all()
+        
+        # Group by category
+        result = {}
+        
+        for entity in entities:
+            result.setdefault(entity.category, {})[entity.text] = entity.mention_count or 1
+        
+        return result
+        
+    except Exception as e:
+        log_event(f"Error getting document entity counts: {e}", "error")
+        raise e
+
 def get_user_documents(db: Session, user_id: int) -> List[Document]:
     """
     Get all documents owned by a user
@@ -285,18 +472,20 @@ def delete_document(db: Session, document_id: str, user_id: Optional[int] = None
         # Get the document
         document = get_document(db, document_id, user_id)
         
-        # Delete the file if it exists
-        if document.file_path and os.path.exists(document.file_path):
-            os.remove(document.file_path)
-        
         # Get document info before deleting
         document_filename = document.original_filename
         owner_id = document.owner_id
+        file_path = document.file_path
         
-        # Delete from database
-        db.delete(document)
+        # Delete from database; foreign keys cascade to the entities, entity index, questions,
+        # activities, caches and conversations of the document, so their counts are subtracted
+        subtract_document_counts(db, document_id, owner_id)
+        db.execute(delete(Document).where(Document.id == document_id))
         db.commit()
         
+        # The uploaded file and vector store are removed in the background
+        artifact_reaper.schedule(document_id, file_path)
+        
         # Log activity
         if user_id:
             log_activity(
@@ -354,6 +543,7 @@ def store_question_answer(
         
         # Add to database
         db.add(question_record)
+        increment_counters(db, user_id, questions=1)
         db.commit()
         db.refresh(question_record)
         
@@ -394,4 +584,252 @@ def get_document_questions(db: Session, document_id: str) -> List[Question]:
         
     except Exception as e:
         log_event(f"Error getting document questions: {e}", "error")
-        raise e
\ No newline at end of file
+        raise e
+
+# Async Repository Functions, used by request handlers; background workers use the sync functions above
+async def acreate_document(
+    db: AsyncSession,
+    user_id: int,
+    filename: str,
+    file_path: str,
+    file_size_kb: float,
+    file_type: str
+) -> Document:
+    """Async version of create_document"""
+    try:
+        document_id = str(uuid.uuid4())
+        
+        document = Document(
+            id=document_id,
+            owner_id=user_id,
+            filename=os.path.basename(file_path),
+            original_filename=filename,
+            file_path=file_path,
+            file_size_kb=int(file_size_kb),  # Convert to integer
+            file_type=file_type,
+            status="uploading"
+        )
+        
+        db.add(document)
+        await aincrement_counters(db, user_id, documents=1)
+        await db.commit()
+        await db.refresh(document)
+        
+        await alog_activity(
+            db=db,
+            user_id=user_id,
+            activity_type="document_upload",
+            description=f"Uploaded document: {filename}",
+            document_id=document_id,
+            extra_data={"file_size_kb": int(file_size_kb), "file_type": file_type}
+        )
+        
+        log_event(f"Document created: {document_id}", "info")
+        return document
+        
+    except Exception as e:
+        log_event(f"Error creating document: {e}", "error")
+        await db.rollback()
+        raise e
+
+async def aget_document(db: AsyncSession, document_id: str, user_id: Optional[int] = None) -> Document:
+    """Async version of get_document"""
+    document = await db.get(Document, document_id)
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+        
+    # Check ownership if user_id provided
+    if user_id and document.owner_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission to access this document"
+        )
+        
+    return document
+
+async def aget_document_entity_counts(db: AsyncSession, document_id: str) -> Dict[str, Dict[str, int]]:
+    """Async version of get_document_entity_counts"""
+    try:
+        rows = await db.execute(
+            select(DocumentEntity.category, DocumentEntity.text, DocumentEntity.mention_count)
+            .where(DocumentEntity.document_id == document_id)
+            .order_by(DocumentEntity.category, DocumentEntity.first_offset, DocumentEntity.id)
+        )
+        
+        result = {}
+        for category, text, mention_count in rows:
+            result.setdefault(category, {})[text] = mention_count or 1
+        
+        return result
+        
+    except Exception as e:
+        log_event(f"Error getting document entity counts: {e}", "error")
+        raise e
+
+async def aget_user_documents(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = PAGE_SIZE_DEFAULT,
+    cursor: Optional[str] = None
+) -> Tuple[List[Row], Optional[str]]:
+    """
+    Get a page of a user's documents, newest first
+    
+    Only the listed columns are loaded (not the summary), and pages continue
+    from the cursor through the (owner_id, created_at) index.
+    
+    Args:
+        db: Database session
+        user_id: User ID
+        limit: Page size
+        cursor: Cursor returned with the previous page
+        
+    Returns:
+        Tuple of (rows with id, original_filename, status, created_at and
+        processed_at, cursor of the next page or None)
+    """
+    try:
+        created_key = timestamp_key(Document.created_at)
+        query = select(
+            Document.id, Document.original_filename, Document.status,
+            Document.created_at, Document.processed_at, created_key.label("created_key")
+        ).where(Document.owner_id == user_id)
+        
+        if cursor:
+            created, document_id = decode_cursor(cursor, 2)
+            query = query.where(tuple_(created_key, Document.id) < tuple_(created, document_id))
+        
+        result = await db.execute(query.order_by(created_key.desc(), Document.id.desc()).limit(limit + 1))
+        return split_page(result.all(), limit, lambda row: (row.created_key, row.id))
+        
+    except Exception as e:
+        log_event(f"Error getting user documents: {e}", "error")
+        raise e
+
+async def adelete_document(db: AsyncSession, document_id: str, user_id: Optional[int] = None) -> bool:
+    """Async version of delete_document"""
+    try:
+        document = await aget_document(db, document_id, user_id)
+        
+        document_filename = document.original_filename
+        owner_id = document.owner_id
+        file_path = document.file_path
+        
+        # Foreign keys cascade to the rows of the document
+        await db.run_sync(subtract_document_counts, document_id, owner_id)
+        await db.execute(delete(Document).where(Document.id == document_id))
+        await db.commit()
+        
+        artifact_reaper.schedule(document_id, file_path)
+        
+        if user_id:
+            await alog_activity(
+                db=db,
+                user_id=user_id,
+                activity_type="document_delete",
+                description=f"Deleted document: {document_filename}",
+                extra_data={"document_id": document_id}
+            )
+        
+        log_event(f"Document {document_id} deleted", "info")
+        return True
+        
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+        
+    except Exception as e:
+        log_event(f"Error deleting document: {e}", "error")
+        await db.rollback()
+        raise e
+
+async def asearch_entity_index(
+    db: AsyncSession,
+    user_id: int,
+    query: str,
+    prefix: bool = False,
+    category: Optional[str] = None,
+    limit: int = 50
+) -> List[Dict[str, Any]]:
+    """Async version of search_entity_index"""
+    return await db.run_sync(search_entity_index, user_id, query, prefix, category, limit)
+
+async def astore_question_answer(
+    db: AsyncSession,
+    document_id: str,
+    user_id: int,
+    question: str,
+    answer: str
+) -> Question:
+    """Async version of store_question_answer"""
+    try:
+        # Check if document exists
+        await aget_document(db, document_id)
+        
+        question_record = Question(
+            document_id=document_id,
+            user_id=user_id,
+            question_text=question,
+            answer_text=answer
+        )
+        
+        db.add(question_record)
+        await aincrement_counters(db, user_id, questions=1)
+        await db.commit()
+        await db.refresh(question_record)
+        
+        await alog_activity(
+            db=db,
+            user_id=user_id,
+            activity_type="question",
+            description=f"Asked: {question[:100]}{'...' if len(question) > 100 else ''}",
+            document_id=document_id,
+            question_id=question_record.id,
+            extra_data={"answer_length": len(answer)}
+        )
+        
+        log_event(f"Question stored for document {document_id}", "info")
+        return question_record
+        
+    except Exception as e:
+        log_event(f"Error storing question: {e}", "error")
+        await db.rollback()
+        raise e
+
+async def aget_document_questions(
+    db: AsyncSession,
+    document_id: str,
+    limit: int = PAGE_SIZE_DEFAULT,
+    cursor: Optional[str] = None
+) -> Tuple[List[Row], Optional[str]]:
+    """
+    Get a page of the questions asked about a document, newest first
+    
+    Args:
+        db: Database session
+        document_id: Document ID
+        limit: Page size
+        cursor: Cursor returned with the previous page
+        
+    Returns:
+        Tuple of (rows with id, question_text, answer_text and created_at,
+        cursor of the next page or None)
+    """
+    try:
+        query = select(Question.id, Question.question_text, Question.answer_text, Question.created_at)\
+            .where(Question.document_id == document_id)
+        
+        if cursor:
+            question_id, = decode_cursor(cursor, 1)
+            query = query.where(Question.id < question_id)
+        
+        result = await db.execute(query.order_by(Question.id.desc()).limit(limit + 1))
+        return split_page(result.all(), limit, lambda row: (row.id,))
+        
+    except Exception as e:
+        log_event(f"Error getting document questions: {e}", "error")
+        raise e
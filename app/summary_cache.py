@@ -0,0 +1,32 @@
+# app/summary_cache.py
+from typing import Dict, Iterable
+from sqlalchemy.orm import Session
+
+from app.database import SummaryCacheEntry
+from app.keyed_cache import get_cached_values, store_cached_values
+
+def get_cached_summaries(db: Session, keys: Iterable[str]) -> Dict[str, str]:
+    """
+    Look up cached intermediate summaries
+
+    Args:
+        db: Database session
+        keys: Summary cache keys
+
+    Returns:
+        Dictionary of key -> summary for the keys found
+    """
+    return get_cached_values(db, SummaryCacheEntry, "summary", keys, "summary")
+
+def store_cached_summaries(db: Session, entries: Dict[str, str]) -> int:
+    """
+    Store newly generated intermediate summaries
+
+    Args:
+        db: Database session
+        entries: Dictionary of key -> summary
+
+    Returns:
+        Number of entries stored
+    """
+    return store_cached_values(db, SummaryCacheEntry, "summary", entries, "summary")
@@ -0,0 +1,172 @@
+# app/user_counters.py
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select, func, and_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import User, UserCounter, UserPayment, Document, Question, UserActivity, UserDailyRollup
+from utils.logger import log_event
+
+COUNTER_FIELDS = ("documents", "questions", "uploads", "questions_asked")
+
+# Counter incremented for each logged activity of a type
+ACTIVITY_COUNTERS = {
+    "document_upload": "uploads",
+    "question": "questions_asked",
+}
+
+def _increment_statement(user_id: int, deltas: Dict[str, int]):
+    unknown = set(deltas) - set(COUNTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown user counters: {', '.join(sorted(unknown))}")
+
+    # Users without a row yet (new accounts) start from zero
+    return insert(UserCounter)\
+        .values(user_id=user_id, **{field: deltas.get(field, 0) for field in COUNTER_FIELDS})\
+        .on_conflict_do_update(
+            index_elements=[UserCounter.user_id],
+            set_={field: getattr(UserCounter, field) + delta for field, delta in deltas.items()}
+        )
+
+def increment_counters(db: Session, user_id: int, **deltas: int) -> None:
+    """
+    Add to a user's counters (does not commit)
+
+    Call this in the transaction that writes the counted rows, so the
+    counters are committed or rolled back together with them.
+
+    Args:
+        db: Database session
+        user_id: User ID
+        **deltas: Amount to add per counter, e.g. questions=1
+    """
+    db.execute(_increment_statement(user_id, deltas))
+
+async def aincrement_counters(db: AsyncSession, user_id: int, **deltas: int) -> None:
+    """Async version of increment_counters"""
+    await db.execute(_increment_statement(user_id, deltas))
+
+def _counters_to_dict(counter: Optional[UserCounter]) -> Dict[str, int]:
+    return {field: getattr(counter, field) if counter else 0 for field in COUNTER_FIELDS}
+
+def get_user_counters(db: Session, user_id: int) -> Dict[str, int]:
+    """
+    Get a user's counters with a single primary-key read
+
+    Returns:
+        Dictionary with documents, questions, uploads and questions_asked
+    """
+    return _counters_to_dict(db.get(UserCounter, user_id))
+
+async def aget_user_counters(db: AsyncSession, user_id: int) -> Dict[str, int]:
+    """Async version of get_user_counters"""
+    return _counters_to_dict(await db.get(UserCounter, user_id))
+
+async def aget_question_quota(db: AsyncSession, user_id: int) -> Tuple[int, bool]:
+    """
+    Get the number of questions a user has asked and whether they are premium
+
+    Returns:
+        Tuple of (question count, premium)
+    """
+    row = (await db.execute(
+        select(func.coalesce(UserCounter.questions, 0), UserPayment.id)
+        .select_from(User)
+        .outerjoin(UserCounter, UserCounter.user_id == User.id)
+        .outerjoin(UserPayment, and_(UserPayment.user_id == User.id, UserPayment.is_premium == True))
+        .where(User.id == user_id)
+        .limit(1)
+    )).first()
+
+    if row is None:
+        return 0, False
+    return row[0], row[1] is not None
+
+def subtract_document_counts(db: Session, document_id: str, owner_id: int) -> None:
+    """
+    Take a document and the rows that cascade with it off the counters (does not commit)
+
+    Call this just before deleting the document, in the same transaction.
+    It reads only the document's own rows, through their document indexes.
+    Activities still queued for the document fail to insert once it is
+    gone, so they are never counted either.
+
+    Args:
+        db: Database session
+        document_id: Document ID
+        owner_id: Owner of the document
+    """
+    # Written first so the transaction holds the write lock while counting,
+    # and no activity of the document can be inserted in between
+    increment_counters(db, owner_id, documents=-1)
+
+    deltas: Dict[int, Dict[str, int]] = {}
+    questions = db.execute(
+        select(Question.user_id, func.count())
+        .where(Question.document_id == document_id)
+        .group_by(Question.user_id)
+    )
+    for user_id, count in questions:
+        deltas.setdefault(user_id, {})["questions"] = -count
+
+    activities = db.execute(
+        select(UserActivity.user_id, UserActivity.activity_type, func.count())
+        .where(UserActivity.document_id == document_id, UserActivity.activity_type.in_(list(ACTIVITY_COUNTERS)))
+        .group_by(UserActivity.user_id, UserActivity.activity_type)
+    )
+    for user_id, activity_type, count in activities:
+        user_deltas = deltas.setdefault(user_id, {})
+        counter = ACTIVITY_COUNTERS[activity_type]
+        user_deltas[counter] = user_deltas.get(counter, 0) - count
+
+    for user_id, user_deltas in deltas.items():
+        increment_counters(db, user_id, **user_deltas)
+
+def rebuild_user_counters(db: Session, user_id: Optional[int] = None) -> int:
+    """
+    Recompute counters from the source tables (does not commit)
+
+    Used as a repair job (tools/rebuild_counters.py) should counters ever drift.
+    Questions and activities moved to the history archive are counted from
+    their daily rollups.
+
+    Args:
+        db: Database session
+        user_id: Optional user ID; all users are rebuilt without it
+
+    Returns:
+        Number of users whose counters were rebuilt
+    """
+    def count(model, *conditions):
+        return select(func.count()).select_from(model).where(*conditions).scalar_subquery()
+
+    def archived(source, activity_type=""):
+        return select(func.coalesce(func.sum(UserDailyRollup.count), 0)).where(
+            UserDailyRollup.user_id == User.id,
+            UserDailyRollup.source == source,
+            UserDailyRollup.activity_type == activity_type
+        ).scalar_subquery()
+
+    def activities(activity_type):
+        return count(UserActivity, UserActivity.user_id == User.id, UserActivity.activity_type == activity_type) \
+            + archived("user_activities", activity_type)
+
+    counts = select(
+        User.id,
+        count(Document, Document.owner_id == User.id),
+        count(Question, Question.user_id == User.id) + archived("questions"),
+        activities("document_upload"),
+        activities("question"),
+    )
+    if user_id is not None:
+        counts = counts.where(User.id == user_id)
+
+    result = db.execute(
+        insert(UserCounter)
+        .from_select(["user_id", *COUNTER_FIELDS], counts)
+        .prefix_with("OR REPLACE")
+    )
+
+    log_event(f"Rebuilt usage counters for {'user ' + str(user_id) if user_id is not None else 'all users'}", "info")
+    return result.rowcount
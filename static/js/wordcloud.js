@@ -1,15 +1,27 @@
 
 // Word cloud configuration
-function createWordCloud(entities) {
+// entityCounts is the optional {category: {entity: mentionCount}} map from the analysis API
+function createWordCloud(entities, entityCounts = {}) {
     const words = [];
     
+    // Find the highest mention count so sizes can be scaled to it
+    let maxCount = 1;
+    Object.values(entityCounts).forEach(counts => {
+      Object.values(counts).forEach(count => {
+        maxCount = Math.max(maxCount, count);
+      });
+    });
+    
     // Convert entities object to word cloud format
     Object.entries(entities).forEach(([category, items]) => {
+      const counts = entityCounts[category] || {};
       items.forEach(item => {
+        const count = counts[item] || 1;
         words.push({
           text: item,
-          size: 20 + Math.random() * 30, // Random size between 20-50
-          category: category
+          size: 20 + 30 * Math.sqrt(count / maxCount), // Size between 20-50 by mention frequency
+          category: category,
+          count: count
         });
       });
     });
@@ -56,7 +68,7 @@ function createWordCloud(entities) {
         .attr("transform", d => `translate(${d.x},${d.y})rotate(${d.rotate})`)
         .text(d => d.text)
         .append("title")
-        .text(d => `${d.text} (${d.category})`);
+        .text(d => `${d.text} (${d.category}, ${d.count} mentions)`);
     }
   }
   
\ No newline at end of file
@@ -0,0 +1,299 @@
+# tools/benchmark.py — Micro-benchmarks for the ingestion and retrieval hot paths
+"""
+Times chunk_text, categorize_legal_entities, search_similar_chunks,
+extract_text_from_pdf and store_document_entities in isolation on synthetic
+legal corpora of controlled size, in two flavours: boilerplate-heavy (the
+same headers, footers and standard clauses on every page) and unique.
+
+For each benchmark and corpus it records the median and minimum wall time,
+peak traced memory and memory still allocated after the call (tracemalloc).
+
+    python tools/benchmark.py                       # compare against stored baselines
+    python tools/benchmark.py --save-baseline       # record new baselines
+    python tools/benchmark.py --pages 1 100 --only chunk_text --threshold 0.1
+
+Results are compared with tools/benchmark_baselines.json; the run exits with
+status 1 when any benchmark is slower or uses more memory than its baseline
+by more than the threshold.
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import faiss
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, User, Document
+from app.ingestion import chunk_text, extract_text_from_pdf
+from app.ner_extraction import categorize_legal_entities, aggregate_legal_entities
+from app.embeddings import search_similar_chunks
+from app.repository import store_document_entities
+from load_test import make_pdf
+
+DEFAULT_BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+
+# Synthetic corpus shape
+LINES_PER_PAGE = 40
+EMBEDDING_DIMENSION = 1536
+ENTITIES_PER_PAGE = 25
+
+BOILERPLATE_HEADER = "CONFIDENTIAL - MASTER SERVICES AGREEMENT - SUBJECT TO NON-DISCLOSURE"
+BOILERPLATE_CLAUSES = [
+    "Capitalized terms used but not defined herein shall have the meanings given to them in the Agreement.",
+    "Nothing in this Section shall be construed as a waiver of any right or remedy available at law or in equity.",
+    "The headings in this Agreement are for convenience only and shall not affect its interpretation.",
+    "This Agreement may be executed in counterparts, each of which shall be deemed an original.",
+    "Notices shall be given in writing and delivered by hand, courier or registered mail to the addresses set out above.",
+]
+
+FIRST_NAMES = ["John", "Maria", "Wei", "Aisha", "Carlos", "Olga", "Kenji", "Fatima", "Liam", "Priya"]
+LAST_NAMES = ["Smith", "Garcia", "Chen", "Okafor", "Silva", "Ivanova", "Tanaka", "Haddad", "Murphy", "Patel"]
+ORGANIZATIONS = ["Acme Corp", "Globex LLC", "Initech Inc", "Umbrella Holdings", "Stark Industries", "Wayne Enterprises"]
+PLACES = ["New York", "Delaware", "California", "Texas", "London", "Singapore"]
+LAWS = ["Section 2-207 of the Uniform Commercial Code", "the Securities Act of 1933", "the Sherman Act", "Regulation S-K"]
+
+def _unique_sentence(rng: random.Random) -> str:
+    party = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    return (
+        f"On {rng.randint(1, 28)} {rng.choice(['January', 'April', 'July', 'October'])} {rng.randint(1990, 2030)}, "
+        f"{party} of {rng.choice(ORGANIZATIONS)} agreed to pay ${rng.randint(1, 99999) * 100:,} under "
+        f"{rng.choice(LAWS)} in {rng.choice(PLACES)}, reference {rng.getrandbits(40):x}."
+    )
+
+def synthetic_corpus(pages: int, kind: str, seed: int = 0) -> str:
+    """
+    Generate a legal-looking document of a given number of pages
+
+    Args:
+        pages: Number of pages, each LINES_PER_PAGE lines long
+        kind: "boilerplate" (mostly repeated clauses) or "unique" (no repeated sentences)
+        seed: Random seed
+
+    Returns:
+        Document text with pages separated by blank lines
+    """
+    rng = random.Random(f"{seed}:{kind}:{pages}")
+    page_texts = []
+    for page in range(pages):
+        lines = [BOILERPLATE_HEADER]
+        for _ in range(LINES_PER_PAGE - 2):
+            if kind == "boilerplate" and rng.random() < 0.8:
+                lines.append(rng.choice(BOILERPLATE_CLAUSES))
+            else:
+                lines.append(_unique_sentence(rng))
+        lines.append(f"Page {page + 1} of {pages}")
+        page_texts.append("\n".join(lines))
+    return "\n\n".join(page_texts)
+
+def synthetic_entities(pages: int, kind: str, seed: int = 0) -> List[Tuple[str, str, int]]:
+    """Generate (text, label, offset) entity mentions, as extract_entities returns them"""
+    rng = random.Random(f"{seed}:{kind}:{pages}:entities")
+    vocabulary = {
+        "PERSON": [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES],
+        "ORG": ORGANIZATIONS,
+        "GPE": PLACES,
+        "LAW": LAWS,
+    }
+    entities = []
+    for i in range(pages * ENTITIES_PER_PAGE):
+        if kind == "unique" and rng.random() < 0.5:
+            label = rng.choice(["DATE", "MONEY"])
+            text = f"{rng.randint(1, 28)} June {rng.randint(1900, 2100)}" if label == "DATE" else f"${rng.randint(1, 10 ** 7):,}"
+        else:
+            label = rng.choice(list(vocabulary))
+            text = rng.choice(vocabulary[label])
+        entities.append((text, label, i * 120))
+    return entities
+
+class Benchmarks:
+    """Benchmark setups; each returns the zero-argument call to measure and a cleanup"""
+
+    def __init__(self, workdir: str):
+        self.workdir = workdir
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'benchmark.db')}")
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        with self.Session() as db:
+            user = User(email="bench@example.com", username="bench", hashed_password="x")
+            db.add(user)
+            db.commit()
+            self.user_id = user.id
+
+    def chunk_text(self, pages: int, kind: str):
+        text = synthetic_corpus(pages, kind)
+        return lambda: chunk_text(text), None
+
+    def categorize_legal_entities(self, pages: int, kind: str):
+        entities = synthetic_entities(pages, kind)
+        return lambda: categorize_legal_entities(entities), None
+
+    def search_similar_chunks(self, pages: int, kind: str):
+        chunks = chunk_text(synthetic_corpus(pages, kind))
+        rng = np.random.default_rng(pages)
+        index = faiss.IndexFlatL2(EMBEDDING_DIMENSION)
+        index.add(rng.standard_normal((len(chunks), EMBEDDING_DIMENSION), dtype=np.float32))
+        query_embedding = rng.standard_normal(EMBEDDING_DIMENSION, dtype=np.float32).tolist()
+        return lambda: search_similar_chunks("termination notice", index, chunks, query_embedding=query_embedding), None
+
+    def extract_text_from_pdf(self, pages: int, kind: str):
+        path = os.path.join(self.workdir, f"{kind}_{pages}.pdf")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(make_pdf(synthetic_corpus(pages, kind), lines_per_page=LINES_PER_PAGE))
+        return lambda: extract_text_from_pdf(path), None
+
+    def store_document_entities(self, pages: int, kind: str):
+        entities = aggregate_legal_entities(synthetic_entities(pages, kind))
+        db = self.Session()
+        document_id = str(uuid.uuid4())
+        db.add(Document(id=document_id, owner_id=self.user_id, filename="bench.pdf", status="processing"))
+        db.commit()
+        return lambda: store_document_entities(db, document_id, entities), db.close
+
+BENCHMARKS = [
+    "chunk_text",
+    "categorize_legal_entities",
+    "search_similar_chunks",
+    "extract_text_from_pdf",
+    "store_document_entities",
+]
+
+def measure(setup: Callable, repeat: int) -> Dict[str, float]:
+    """
+    Measure one benchmark case
+
+    Timed runs happen without tracemalloc, which slows allocation-heavy code;
+    a final traced run records peak and retained memory.
+    """
+    times = []
+    for _ in range(repeat):
+        call, cleanup = setup()
+        gc.collect()
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+        if cleanup:
+            cleanup()
+
+    call, cleanup = setup()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = call()
+    _, peak = tracemalloc.get_traced_memory()
+    diff = tracemalloc.take_snapshot().compare_to(before, "filename")
+    tracemalloc.stop()
+    del result
+    if cleanup:
+        cleanup()
+
+    return {
+        "median_s": round(statistics.median(times), 6),
+        "min_s": round(min(times), 6),
+        "peak_kb": round(peak / 1024, 1),
+        "retained_kb": round(sum(stat.size_diff for stat in diff) / 1024, 1),
+        "retained_blocks": sum(stat.count_diff for stat in diff),
+    }
+
+def compare(results: Dict[str, dict], baselines: Dict[str, dict], threshold: float) -> List[str]:
+    """List the cases that regressed past the threshold"""
+    regressions = []
+    for case, result in results.items():
+        baseline = baselines.get(case)
+        if not baseline:
+            continue
+        for metric in ("median_s", "peak_kb"):
+            # Ignore noise on cases too small to measure reliably
+            floor = 0.001 if metric == "median_s" else 64
+            if baseline[metric] >= floor and result[metric] > baseline[metric] * (1 + threshold):
+                regressions.append(
+                    f"{case}: {metric} {result[metric]} vs baseline {baseline[metric]} "
+                    f"(+{100 * (result[metric] / baseline[metric] - 1):.1f}%)"
+                )
+    return regressions
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Ingestion and retrieval micro-benchmarks")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 100, 1000, 5000])
+    parser.add_argument("--kinds", nargs="+", default=["boilerplate", "unique"], choices=["boilerplate", "unique"])
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="Run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown or memory growth, as a fraction")
+    parser.add_argument("--baselines", default=DEFAULT_BASELINES)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baselines")
+    parser.add_argument("--output", help="Also write results to this JSON file")
+    return parser.parse_args()
+
+def main() -> int:
+    args = parse_args()
+    logging.disable(logging.INFO)  # The functions under test log every call
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f).get("results", {})
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        benchmarks = Benchmarks(workdir)
+        for name in args.only or BENCHMARKS:
+            for kind in args.kinds:
+                for pages in args.pages:
+                    case = f"{name}[{kind},{pages}p]"
+                    results[case] = measure(lambda: getattr(benchmarks, name)(pages, kind), args.repeat)
+                    stats = results[case]
+                    print(
+                        f"{case:<48}{stats['median_s'] * 1000:>12.2f} ms{stats['peak_kb']:>12.1f} KB peak"
+                        f"{stats['retained_kb']:>12.1f} KB retained"
+                    )
+
+    report = {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        # Keep baselines of cases that were not run this time
+        baselines.update(results)
+        with open(args.baselines, "w") as f:
+            json.dump({"commit": report["commit"], "results": dict(sorted(baselines.items()))}, f, indent=2)
+        print(f"\nSaved baselines to {args.baselines}")
+        return 0
+
+    if not baselines:
+        print(f"\nNo baselines at {args.baselines}; run with --save-baseline to record them")
+        return 0
+
+    regressions = compare(results, baselines, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+
+    print(f"\nNo regressions over {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
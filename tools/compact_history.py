@@ -0,0 +1,27 @@
+# tools/compact_history.py — Archive activities and questions older than their retention
+"""
+The app runs this every HISTORY_COMPACTION_INTERVAL_HOURS; run it by hand
+when that is disabled, or to compact with a different retention.
+
+    python tools/compact_history.py
+    ACTIVITY_RETENTION_DAYS=30 python tools/compact_history.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.history_archive import compact_history
+
+def main() -> None:
+    db = SessionLocal()
+    try:
+        archived = compact_history(db)
+        for table, count in archived.items():
+            print(f"Archived {count} row(s) of {table}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
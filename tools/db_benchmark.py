@@ -0,0 +1,200 @@
+# tools/db_benchmark.py — Query latency with and without the SQLite profile and indexes
+"""
+Builds a scratch database with the app schema and a large activity log
+(1M rows by default), then times the app's hot queries twice:
+
+  before: default SQLite connection settings and the pre-migration schema
+  after:  connection pragmas from app/database.py and all migrations applied
+
+    python tools/db_benchmark.py
+    python tools/db_benchmark.py --activities 200000 --iterations 100 --output results.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, text
+
+from app.database import Base, configure_sqlite_connection
+from app.migrations import MIGRATIONS, run_migrations
+
+ACTIVITY_TYPES = ["question", "document_upload", "document_delete", "login", "password_change"]
+
+QUERIES = {
+    "recent_activity": (
+        "SELECT id, activity_type, description, created_at FROM user_activities "
+        "WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 50"
+    ),
+    "activity_by_type": (
+        "SELECT id, description, created_at FROM user_activities "
+        "WHERE user_id = :user_id AND activity_type = 'question' ORDER BY created_at DESC LIMIT 50"
+    ),
+    "questions_asked_count": (
+        "SELECT COUNT(*) FROM user_activities WHERE user_id = :user_id AND activity_type = 'question'"
+    ),
+    "documents_by_owner": (
+        "SELECT id, original_filename, status, created_at FROM documents "
+        "WHERE owner_id = :user_id ORDER BY created_at DESC"
+    ),
+    "questions_by_document": (
+        "SELECT id, question_text, created_at FROM questions WHERE document_id = :document_id"
+    ),
+    "questions_by_user_on_document": (
+        "SELECT id FROM questions WHERE document_id = :document_id AND user_id = :user_id ORDER BY id"
+    ),
+    "entities_by_document": (
+        "SELECT category, text FROM document_entities WHERE document_id = :document_id"
+    ),
+}
+
+# Indexes added by migrations, dropped to reproduce the schema of existing databases
+MIGRATION_INDEXES = [
+    "ix_document_entities_document", "ix_documents_owner_created", "ix_questions_document_user",
+    "ix_questions_user_created", "ix_user_activities_user_created", "ix_user_activities_user_type_created",
+    "ix_user_payments_user", "ix_questions_document_id",
+]
+
+def populate(engine, args: argparse.Namespace) -> None:
+    """Fill the database with users, documents, questions, entities and activity"""
+    rng = random.Random(args.seed)
+    start = datetime(2024, 1, 1)
+    batch_size = 50000
+
+    def timestamp() -> str:
+        return (start + timedelta(seconds=rng.randint(0, 365 * 86400))).isoformat(" ")
+
+    def insert(sql: str, rows) -> None:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                with engine.begin() as conn:
+                    conn.execute(text(sql), batch)
+                batch = []
+        if batch:
+            with engine.begin() as conn:
+                conn.execute(text(sql), batch)
+
+    insert(
+        "INSERT INTO users (id, email, username, hashed_password, is_active, is_admin, created_at) "
+        "VALUES (:id, :email, :username, 'x', 1, 0, :created_at)",
+        ({"id": i, "email": f"user{i}@example.com", "username": f"user{i}", "created_at": timestamp()}
+         for i in range(1, args.users + 1))
+    )
+    insert(
+        "INSERT INTO documents (id, owner_id, original_filename, status, created_at) "
+        "VALUES (:id, :owner_id, :name, 'complete', :created_at)",
+        ({"id": f"doc-{i}", "owner_id": rng.randint(1, args.users), "name": f"contract_{i}.pdf", "created_at": timestamp()}
+         for i in range(args.documents))
+    )
+    insert(
+        "INSERT INTO questions (document_id, user_id, question_text, answer_text, created_at) "
+        "VALUES (:document_id, :user_id, 'What is the term?', 'Three years.', :created_at)",
+        ({"document_id": f"doc-{rng.randrange(args.documents)}", "user_id": rng.randint(1, args.users), "created_at": timestamp()}
+         for _ in range(args.questions))
+    )
+    insert(
+        "INSERT INTO document_entities (document_id, category, text, mention_count) "
+        "VALUES (:document_id, :category, :text, 1)",
+        ({"document_id": f"doc-{rng.randrange(args.documents)}", "category": "ORGANIZATION", "text": f"Company {i % 5000}"}
+         for i in range(args.entities))
+    )
+    insert(
+        "INSERT INTO user_activities (user_id, activity_type, description, created_at) "
+        "VALUES (:user_id, :activity_type, 'benchmark activity', :created_at)",
+        ({"user_id": rng.randint(1, args.users), "activity_type": rng.choice(ACTIVITY_TYPES), "created_at": timestamp()}
+         for _ in range(args.activities))
+    )
+
+def measure(engine, args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    """Time each query over random users and documents"""
+    rng = random.Random(args.seed + 1)
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            statement = text(sql)
+            latencies: List[float] = []
+            for _ in range(args.iterations):
+                params = {"user_id": rng.randint(1, args.users), "document_id": f"doc-{rng.randrange(args.documents)}"}
+                started = time.perf_counter()
+                conn.execute(statement, params).fetchall()
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            results[name] = {
+                "p50_ms": round(statistics.median(latencies) * 1000, 3),
+                "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+            }
+    return results
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="SQLite query latency benchmark")
+    parser.add_argument("--activities", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--questions", type=int, default=200000)
+    parser.add_argument("--entities", type=int, default=500000)
+    parser.add_argument("--iterations", type=int, default=200, help="Executions per query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    return parser.parse_args()
+
+def main() -> None:
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        url = f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+
+        # Pre-migration database with default connection settings
+        engine = create_engine(url)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for index_name in MIGRATION_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+        print(f"Populating {args.activities:,} activity rows...")
+        started = time.perf_counter()
+        populate(engine, args)
+        print(f"Populated in {time.perf_counter() - started:.1f}s")
+
+        before = measure(engine, args)
+        engine.dispose()
+
+        # Same data with the connection profile and migrations applied
+        engine = create_engine(url)
+        event.listen(engine, "connect", configure_sqlite_connection)
+        started = time.perf_counter()
+        version = run_migrations(engine)
+        print(f"Migrated to schema version {version} in {time.perf_counter() - started:.1f}s")
+
+        after = measure(engine, args)
+        engine.dispose()
+
+    print(f"\n{'query':<32}{'before p50':>12}{'after p50':>12}{'before p95':>12}{'after p95':>12}{'speedup':>10}")
+    for name in QUERIES:
+        speedup = before[name]["p50_ms"] / max(after[name]["p50_ms"], 1e-6)
+        print(
+            f"{name:<32}{before[name]['p50_ms']:>12.3f}{after[name]['p50_ms']:>12.3f}"
+            f"{before[name]['p95_ms']:>12.3f}{after[name]['p95_ms']:>12.3f}{speedup:>9.1f}x"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "config": vars(args),
+                "schema_version": version,
+                "migrations": [description for _, description, _ in MIGRATIONS],
+                "before": before,
+                "after": after,
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+# tools/load_test.py — End-to-end load generator for the Legal Document AI Assistant
+"""
+Drives realistic user sessions over HTTP against a running app:
+register and log in, upload a mix of PDF/DOCX/TXT documents, poll their
+status until processing finishes, then ask bursts of questions.
+
+Run the app against the local model stand-in so no API credits are used:
+
+    python tools/openai_stub_server.py --port 8100 &
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=stub MAX_FREE_CHATS=100000 python run.py &
+    python tools/load_test.py --base-url http://localhost:5000 --users 20 --server-pid $!
+
+Results are written as JSON (and a per-endpoint CSV) to --output-dir, named
+by git commit and timestamp. Pass --baseline to compare against an earlier run.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+import uuid
+import zipfile
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+CLAUSES = [
+    "The Supplier shall deliver the Goods to the Customer on or before {date}.",
+    "This Agreement shall be governed by the laws of the State of {state}.",
+    "Either party may terminate this Agreement upon {days} days written notice.",
+    "The Customer shall pay {amount} within thirty days of receipt of a valid invoice.",
+    "{party} shall indemnify and hold harmless the other party from any third party claims.",
+    "Confidential Information shall not be disclosed to any third party without prior written consent.",
+    "This Agreement commences on {date} and continues for an initial term of {years} years.",
+    "Any dispute arising under this Agreement shall be settled by arbitration in {state}.",
+]
+
+QUESTIONS = [
+    "Who are the parties to this agreement?",
+    "What is the effective date?",
+    "What is the term of the agreement?",
+    "How can the agreement be terminated?",
+    "Which law governs the agreement?",
+    "What are the payment terms?",
+    "Is there an indemnification clause?",
+    "How are disputes resolved?",
+]
+
+def synthetic_contract(rng: random.Random, paragraphs: int) -> str:
+    """Generate contract-like text"""
+    lines = [f"MASTER SERVICES AGREEMENT {rng.randint(1000, 9999)}"]
+    for i in range(paragraphs):
+        clause = rng.choice(CLAUSES).format(
+            date=f"{rng.randint(1, 28)} {rng.choice(['January', 'March', 'June', 'October'])} 202{rng.randint(0, 9)}",
+            state=rng.choice(["New York", "Delaware", "California", "Texas"]),
+            days=rng.choice([15, 30, 60, 90]),
+            amount=f"${rng.randint(1, 900) * 1000:,}",
+            party=rng.choice(["Acme Corp", "Globex LLC", "Initech Inc"]),
+            years=rng.randint(1, 5)
+        )
+        lines.append(f"{i + 1}. {clause}")
+    return "\n\n".join(lines)
+
+def make_pdf(text: str, lines_per_page: int = 45) -> bytes:
+    """Build a minimal single-font PDF containing the text"""
+    def escape(line: str) -> str:
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    lines = [line for line in text.split("\n") if line.strip()]
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page_lines in pages:
+        content = "BT /F1 10 Tf 50 800 Td 14 TL " + " ".join(f"({escape(line[:100])}) '" for line in page_lines) + " ET"
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        output.write(f"{offset:010d} 00000 n \n".encode())
+    output.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return output.getvalue()
+
+def make_docx(text: str) -> bytes:
+    """Build a minimal DOCX containing the text"""
+    def escape(line: str) -> str:
+        return line.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+    body = "".join(
+        f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(line)}</w:t></w:r></w:p>"
+        for line in text.split("\n") if line.strip()
+    )
+    files = {
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/></Relationships>'
+        ),
+        "word/document.xml": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'
+        ),
+    }
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return output.getvalue()
+
+class Recorder:
+    """Collects per-endpoint latencies and outcomes"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.documents_completed = 0
+        self.documents_failed = 0
+        self.ingestion_seconds: List[float] = []
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            self.statuses[name][str(response.status_code)] += 1
+            return response
+        except httpx.HTTPError as e:
+            self.statuses[name][type(e).__name__] += 1
+            return None
+        finally:
+            self.latencies[name].append(time.perf_counter() - start)
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    low, high = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+class ResourceSampler:
+    """Samples CPU time and RSS of a server process from /proc (Linux only)"""
+
+    def __init__(self, pid: Optional[int], interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Tuple[float, float, int]] = []  # (time, cpu seconds, rss bytes)
+        self._task = None
+
+    def _read(self) -> Optional[Tuple[float, int]]:
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+            with open(f"/proc/{self.pid}/status") as f:
+                rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+            return cpu_seconds, rss_kb * 1024
+        except (OSError, StopIteration, IndexError, ValueError):
+            return None
+
+    async def _run(self):
+        while True:
+            reading = self._read()
+            if reading:
+                self.samples.append((time.perf_counter(), *reading))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.pid:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Optional[dict]:
+        if not self._task:
+            return None
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        if len(self.samples) < 2:
+            return None
+        (t0, cpu0, _), (t1, cpu1, _) = self.samples[0], self.samples[-1]
+        rss = [sample[2] for sample in self.samples]
+        return {
+            "server_pid": self.pid,
+            "cpu_percent_avg": round(100 * (cpu1 - cpu0) / max(t1 - t0, 1e-9), 1),
+            "rss_mb_max": round(max(rss) / 2 ** 20, 1),
+            "rss_mb_avg": round(statistics.mean(rss) / 2 ** 20, 1),
+        }
+
+async def run_user(user_number: int, args: argparse.Namespace, recorder: Recorder):
+    """One virtual user session"""
+    rng = random.Random(args.seed * 100003 + user_number)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.request_timeout) as client:
+        username = f"load_{uuid.uuid4().hex[:10]}"
+        password = "load-test-password"
+        await recorder.request(client, "register", "POST", "/api/auth/register", json={
+            "email": f"{username}@example.com", "username": username, "password": password
+        })
+        response = await recorder.request(client, "login", "POST", "/api/auth/token", data={
+            "username": username, "password": password
+        })
+        if response is None or response.status_code != 200:
+            return
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+        for _ in range(args.documents_per_user):
+            file_type = rng.choices(["pdf", "docx", "txt"], weights=args.file_mix)[0]
+            text = synthetic_contract(rng, rng.randint(*args.paragraphs))
+            content = {"pdf": make_pdf, "docx": make_docx}.get(file_type, lambda t: t.encode("utf-8"))(text)
+
+            upload_start = time.perf_counter()
+            response = await recorder.request(
+                client, "upload", "POST", "/api/upload/",
+                files={"file": (f"contract.{file_type}", content)}
+            )
+            if response is None or response.status_code != 201:
+                recorder.documents_failed += 1
+                continue
+            document_id = response.json()["document_id"]
+
+            # Poll until processing finishes
+            status = "processing"
+            deadline = time.perf_counter() + args.processing_timeout
+            while status not in ("complete", "error") and time.perf_counter() < deadline:
+                await asyncio.sleep(args.poll_interval)
+                response = await recorder.request(client, "status", "GET", f"/api/document/{document_id}/status")
+                if response is not None and response.status_code == 200:
+                    status = response.json()["status"]
+
+            if status != "complete":
+                recorder.documents_failed += 1
+                continue
+            recorder.documents_completed += 1
+            recorder.ingestion_seconds.append(time.perf_counter() - upload_start)
+
+            await recorder.request(client, "analysis", "GET", f"/api/document/{document_id}/analysis")
+
+            # Ask a burst of questions concurrently
+            endpoint = "/api/ask/stream" if args.stream else "/api/ask/"
+            await asyncio.gather(*(
+                recorder.request(client, "ask", "POST", endpoint, data={
+                    "document_id": document_id, "question": rng.choice(QUESTIONS)
+                })
+                for _ in range(args.questions_per_document)
+            ))
+
+        await recorder.request(client, "documents", "GET", "/api/documents/")
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def build_report(args: argparse.Namespace, recorder: Recorder, elapsed: float, resources: Optional[dict]) -> dict:
+    endpoints = {}
+    for name, latencies in sorted(recorder.latencies.items()):
+        statuses = dict(recorder.statuses[name])
+        errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+        endpoints[name] = {
+            "requests": len(latencies),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "max_ms": round(max(latencies) * 1000, 1),
+            "error_rate": round(errors / len(latencies), 4),
+            "statuses": statuses,
+        }
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("baseline", "output_dir")},
+        "elapsed_seconds": round(elapsed, 2),
+        "ingestion": {
+            "documents_completed": recorder.documents_completed,
+            "documents_failed": recorder.documents_failed,
+            "documents_per_minute": round(60 * recorder.documents_completed / elapsed, 2) if elapsed else 0,
+            "p50_seconds": round(percentile(recorder.ingestion_seconds, 50), 2),
+            "p95_seconds": round(percentile(recorder.ingestion_seconds, 95), 2),
+        },
+        "endpoints": endpoints,
+        "resources": resources,
+    }
+
+def print_report(report: dict, baseline: Optional[dict]):
+    print(f"\nCommit {report['commit']}  elapsed {report['elapsed_seconds']}s")
+    ingestion = report["ingestion"]
+    print(
+        f"Ingestion: {ingestion['documents_completed']} complete, {ingestion['documents_failed']} failed, "
+        f"{ingestion['documents_per_minute']} docs/min, p95 {ingestion['p95_seconds']}s"
+    )
+    print(f"\n{'endpoint':<12}{'requests':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for name, stats in report["endpoints"].items():
+        line = (
+            f"{name:<12}{stats['requests']:>9}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+            f"{stats['p99_ms']:>10}{stats['error_rate']:>9.2%}"
+        )
+        previous = (baseline or {}).get("endpoints", {}).get(name)
+        if previous and previous["p95_ms"]:
+            line += f"   p95 {100 * (stats['p95_ms'] / previous['p95_ms'] - 1):+.1f}% vs {baseline['commit']}"
+        print(line)
+    if report["resources"]:
+        print(f"\nServer resources: {report['resources']}")
+
+def save_report(report: dict, output_dir: str) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"load_{report['commit']}_{report['timestamp'].replace(':', '')}")
+    with open(base + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+    with open(base + ".csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["endpoint", "requests", "p50_ms", "p95_ms", "p99_ms", "max_ms", "error_rate"])
+        for name, stats in report["endpoints"].items():
+            writer.writerow([name] + [stats[key] for key in ("requests", "p50_ms", "p95_ms", "p99_ms", "max_ms", "error_rate")])
+    return base + ".json"
+
+async def main(args: argparse.Namespace):
+    recorder = Recorder()
+    sampler = ResourceSampler(args.server_pid)
+    sampler.start()
+
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(user_number: int):
+        async with semaphore:
+            await run_user(user_number, args, recorder)
+
+    await asyncio.gather(*(limited(i) for i in range(args.users)))
+    elapsed = time.perf_counter() - start
+
+    report = build_report(args, recorder, elapsed, await sampler.stop())
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+    print(f"\nSaved {save_report(report, args.output_dir)}")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="End-to-end load test")
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--users", type=int, default=10, help="Total virtual users")
+    parser.add_argument("--concurrency", type=int, default=10, help="Virtual users running at once")
+    parser.add_argument("--documents-per-user", type=int, default=2)
+    parser.add_argument("--questions-per-document", type=int, default=5)
+    parser.add_argument("--file-mix", type=float, nargs=3, default=[0.4, 0.3, 0.3], metavar=("PDF", "DOCX", "TXT"))
+    parser.add_argument("--paragraphs", type=int, nargs=2, default=[20, 200], metavar=("MIN", "MAX"))
+    parser.add_argument("--stream", action="store_true", help="Ask through /api/ask/stream")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--processing-timeout", type=float, default=300.0)
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--server-pid", type=int, help="Server process to sample CPU and memory from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default="data/load_tests")
+    parser.add_argument("--baseline", help="Earlier report JSON to compare against")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
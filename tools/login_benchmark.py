@@ -0,0 +1,106 @@
+# tools/login_benchmark.py — Login throughput and event loop stalls under concurrent password checks
+"""
+Runs bursts of concurrent logins' password checks in one event loop, the
+way a worker sees them, and reports logins per second, login latency and
+the longest stall of a ticker task standing in for every other request on
+the worker. Two modes are compared:
+
+    inline    bcrypt.checkpw on the event loop (how logins used to run)
+    executor  averify_password on the bounded password hashing threads
+
+    python tools/login_benchmark.py
+    python tools/login_benchmark.py --logins 200 --concurrency 50 --rounds 12
+    PASSWORD_HASH_WORKERS=8 python tools/login_benchmark.py --modes executor
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+
+from app.auth import verify_password, averify_password
+from app.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT
+
+PASSWORD = "correct horse battery staple"
+TICK_SECONDS = 0.01
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def run_mode(mode: str, hashed: str, logins: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    max_stall = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal max_stall
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(TICK_SECONDS)
+            max_stall = max(max_stall, time.perf_counter() - started - TICK_SECONDS)
+
+    async def client(count: int):
+        # Each client sends its next login once the previous one is answered
+        for _ in range(count):
+            started = time.perf_counter()
+            # Hand back to the loop like an arriving request, so time spent
+            # waiting for other logins' inline hashing counts as latency
+            await asyncio.sleep(0)
+            if mode == "inline":
+                ok = verify_password(PASSWORD, hashed)
+            else:
+                ok = await averify_password(PASSWORD, hashed)
+            assert ok
+            latencies.append(time.perf_counter() - started)
+
+    counts = [logins // concurrency + (1 if i < logins % concurrency else 0) for i in range(concurrency)]
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK_SECONDS * 2)
+    started = time.perf_counter()
+    await asyncio.gather(*(client(count) for count in counts if count))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await tick_task
+
+    return {
+        "logins_per_second": logins / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_loop_stall_ms": max_stall * 1000,
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=args.rounds)).decode("utf-8")
+    print(
+        f"{args.logins} logins, {args.concurrency} concurrent, bcrypt cost {args.rounds}, "
+        f"{os.cpu_count()} CPU(s), {PASSWORD_HASH_WORKERS} hashing threads"
+    )
+    if args.concurrency > PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT:
+        print("Concurrency exceeds PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT; executor logins will get 503s")
+
+    print(f"{'mode':<10}{'logins/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max stall ms':>14}")
+    for mode in args.modes:
+        result = await run_mode(mode, hashed, args.logins, args.concurrency)
+        print(
+            f"{mode:<10}{result['logins_per_second']:>10.1f}{result['p50_ms']:>10.0f}{result['p95_ms']:>10.0f}"
+            f"{result['p99_ms']:>10.0f}{result['max_loop_stall_ms']:>14.0f}"
+        )
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Login password check benchmark")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20, help="Clients logging in at once")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost of the stored hash")
+    parser.add_argument("--modes", nargs="+", choices=["inline", "executor"], default=["inline", "executor"])
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,228 @@
+# tools/openai_stub_server.py — Local OpenAI-compatible stand-in for load and integration testing
+"""
+Serves the subset of the OpenAI API used by app/embeddings.py and app/qa_engine.py:
+
+- POST /v1/embeddings
+- POST /v1/chat/completions (including stream=True)
+
+Outputs are deterministic for a given input and seed. Embeddings are built by
+feature-hashing the input words, so texts that share words get similar vectors
+and retrieval and the semantic answer cache behave realistically.
+
+Usage:
+    python tools/openai_stub_server.py --port 8100 --chat-latency lognormal:0.8,0.5 --error-rate 0.02
+
+Then point the app at it:
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=stub python run.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+import uuid
+from typing import List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORD_PATTERN = re.compile(r"\w+")
+
+class LatencyDistribution:
+    """
+    Samples latencies in seconds from a spec such as:
+    fixed:0.2, uniform:0.1,0.5, normal:0.5,0.1, lognormal:0.8,0.5 (median, sigma), exp:0.3 (mean)
+    """
+
+    def __init__(self, spec: str, rng: random.Random):
+        self.spec = spec
+        self.rng = rng
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+        if expected.get(kind) != len(self.params):
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = self.rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = self.rng.gauss(*self.params)
+        elif self.kind == "lognormal":
+            median, sigma = self.params
+            value = self.rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        else:
+            value = self.rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        return max(0.0, value)
+
+class StubSettings:
+    def __init__(self, args: argparse.Namespace):
+        self.rng = random.Random(args.seed)
+        self.seed = args.seed
+        self.embedding_dim = args.embedding_dim
+        self.embedding_latency = LatencyDistribution(args.embedding_latency, self.rng)
+        self.chat_latency = LatencyDistribution(args.chat_latency, self.rng)
+        self.token_interval = LatencyDistribution(args.token_interval, self.rng)
+        self.completion_words = args.completion_words
+        self.error_rate = args.error_rate
+        self.error_codes = [int(code) for code in args.error_codes.split(",") if code]
+        self.hang_rate = args.hang_rate
+        self.hang_seconds = args.hang_seconds
+
+def stable_hash(text: str, seed: int) -> int:
+    return int.from_bytes(hashlib.sha256(f"{seed}\0{text}".encode("utf-8")).digest()[:8], "big")
+
+def embed(text: str, settings: StubSettings) -> List[float]:
+    """Deterministic feature-hashed bag-of-words embedding, L2-normalized"""
+    vector = np.zeros(settings.embedding_dim, dtype=np.float32)
+    for word in WORD_PATTERN.findall(text.lower()):
+        h = stable_hash(word, settings.seed)
+        vector[h % settings.embedding_dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[stable_hash(text, settings.seed) % settings.embedding_dim] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+def completion_text(messages: List[dict], max_tokens: Optional[int], settings: StubSettings) -> str:
+    """Deterministic answer built from words of the last user message"""
+    prompt = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    words = WORD_PATTERN.findall(prompt) or ["stub"]
+    rng = random.Random(stable_hash(prompt, settings.seed))
+    limit = settings.completion_words if max_tokens is None else min(settings.completion_words, max_tokens)
+    body = " ".join(rng.choice(words) for _ in range(max(1, limit)))
+    return f"[stub {hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:8]}] {body}."
+
+def count_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+def create_app(settings: StubSettings) -> FastAPI:
+    app = FastAPI(title="OpenAI stub server")
+
+    async def injected_failure() -> Optional[JSONResponse]:
+        """Apply hang and error injection; returns an error response when one is injected"""
+        if settings.hang_rate and settings.rng.random() < settings.hang_rate:
+            await asyncio.sleep(settings.hang_seconds)
+        if settings.error_rate and settings.error_codes and settings.rng.random() < settings.error_rate:
+            code = settings.rng.choice(settings.error_codes)
+            return JSONResponse(
+                status_code=code,
+                content={"error": {"message": f"Injected error {code}", "type": "stub_error", "code": code}}
+            )
+        return None
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        payload = await request.json()
+        await asyncio.sleep(settings.embedding_latency.sample())
+        failure = await injected_failure()
+        if failure:
+            return failure
+
+        inputs = payload.get("input", "")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+
+        return {
+            "object": "list",
+            "model": payload.get("model", "stub-embedding"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": embed(text, settings)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {
+                "prompt_tokens": sum(count_tokens(text) for text in inputs),
+                "total_tokens": sum(count_tokens(text) for text in inputs)
+            }
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        messages = payload.get("messages", [])
+        model = payload.get("model", "stub-chat")
+        text = completion_text(messages, payload.get("max_tokens"), settings)
+        prompt_tokens = sum(count_tokens(m.get("content", "")) for m in messages)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        # Chat latency is time to first token for streams, and the full response time otherwise
+        await asyncio.sleep(settings.chat_latency.sample())
+        failure = await injected_failure()
+        if failure:
+            return failure
+
+        if not payload.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": count_tokens(text),
+                    "total_tokens": prompt_tokens + count_tokens(text)
+                }
+            }
+
+        def chunk(delta: dict, finish_reason: Optional[str] = None) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def stream():
+            yield chunk({"role": "assistant", "content": ""})
+            for i, word in enumerate(text.split(" ")):
+                if i:
+                    await asyncio.sleep(settings.token_interval.sample())
+                yield chunk({"content": word if i == 0 else " " + word})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server")
+    parser.add_argument("--host", default=os.getenv("STUB_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("STUB_PORT", 8100)))
+    parser.add_argument("--seed", type=int, default=int(os.getenv("STUB_SEED", 0)))
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--embedding-latency", default=os.getenv("STUB_EMBEDDING_LATENCY", "uniform:0.02,0.08"))
+    parser.add_argument("--chat-latency", default=os.getenv("STUB_CHAT_LATENCY", "lognormal:0.6,0.4"))
+    parser.add_argument("--token-interval", default=os.getenv("STUB_TOKEN_INTERVAL", "fixed:0.02"))
+    parser.add_argument("--completion-words", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=float(os.getenv("STUB_ERROR_RATE", 0)))
+    parser.add_argument("--error-codes", default="429,500,503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests delayed by --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    uvicorn.run(create_app(StubSettings(args)), host=args.host, port=args.port, log_level="warning")
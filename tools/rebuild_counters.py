@@ -0,0 +1,35 @@
+# tools/rebuild_counters.py — Rebuild the per-user usage counters from the source tables
+"""
+Counters are kept up to date with the writes they count; run this if they
+ever drift (e.g. after editing the database by hand).
+
+    python tools/rebuild_counters.py
+    python tools/rebuild_counters.py --user-id 42
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.user_counters import rebuild_user_counters
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild per-user usage counters")
+    parser.add_argument("--user-id", type=int, help="Only rebuild this user's counters")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rebuilt = rebuild_user_counters(db, args.user_id)
+        db.commit()
+        print(f"Rebuilt counters for {rebuilt} user(s)")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()